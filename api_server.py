@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from aiohttp import web
+
+from data_loader import (CATEGORIES_FILE, HISTORY_DATASET, dataset_signature, file_signature,
+                         load_ranking_index, load_table_with_metrics, ranked_view, time_slice)
+from data_plane import plane_signature
+from metrics import MARKET_CAP_METRICS
+from spot_prices import TICKS_SNAPSHOT
+
+# Read-only HTTP API over the stored market cap history, for consumers that
+# used to scrape the dashboards or download the Excel export. It reads the
+# same datasets as the dashboards (run it from the repository root), through
+# the same process-wide cache and shared data plane.
+#
+#     GET /coins                                     latest value and rank of every coin
+#     GET /history?coin=&from=&to=&resample=         history of one or more coins
+#     GET /dominance?from=&to=&resample=             Bitcoin / Ethereum dominance (%)
+#     GET /coverage?from=&to=&resample=              stablecoin backup ratios
+#
+# Responses are JSON (gzip-compressed when the client accepts it) or, with
+# format=arrow or an Accept: application/vnd.apache.arrow.stream header, an
+# Arrow IPC stream. Every response carries an ETag derived from the
+# dataset's signature, so unchanged data is revalidated with a 304.
+
+# stream_1 table holding the dominance and stablecoin coverage metrics
+STREAM_1_DATASET = os.path.join("stream_1", HISTORY_DATASET)
+
+DOMINANCE_COLUMNS = ["Bitcoin Dominance (%)", "Ethereum Dominance (%)"]
+COVERAGE_COLUMNS = [
+    "Stablecoin Backup (Bitcoin)",
+    "Stablecoin Backup (Altcoins + Ethereum)",
+    "Stablecoin Backup (Bitcoin + Altcoins + Ethereum)",
+]
+
+# resample= values (pandas frequencies, with the period-end aliases pandas
+# 3 requires); each bucket keeps its last value
+RESAMPLE_RULES = {
+    "daily": "D",
+    "weekly": "W",
+    "monthly": "ME",
+    "quarterly": "QE",
+    "yearly": "YE",
+}
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+# Responses with more rows than this are streamed in chunks of this many
+# rows instead of being encoded in one piece (and are not kept in the
+# response cache)
+STREAM_ROWS = 50000
+
+# Encoded responses kept in memory, keyed by ETag and encoding, so repeated
+# requests for unchanged data skip the encoding entirely
+RESPONSE_CACHE_SIZE = 256
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+# Invalid query parameters or unknown coins, answered with a JSON error
+class QueryError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# Frame -> JSON array of records (ISO timestamps, NaN as null)
+def _json_records(df):
+    return df.to_json(orient="records", date_format="iso", date_unit="s").encode()
+
+
+def _arrow_batches(df, chunk_rows=STREAM_ROWS):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.schema, table.to_batches(max_chunksize=chunk_rows)
+
+
+def _arrow_stream(schema, batches):
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def _wants_arrow(request):
+    return request.query.get("format") == "arrow" or ARROW_CONTENT_TYPE in request.headers.get("Accept", "")
+
+
+def _wants_gzip(request):
+    return "gzip" in request.headers.get("Accept-Encoding", "")
+
+
+# from/to bound as a naive UTC timestamp, like the stored ones; bounds with
+# a time zone (2024-01-01T00:00:00Z, ...+02:00) are converted to UTC
+def _parse_time(request, name):
+    value = request.query.get(name)
+    if not value:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except ValueError:
+        raise QueryError(f"Invalid {name}: {value!r}")
+    if pd.isna(timestamp):
+        raise QueryError(f"Invalid {name}: {value!r}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
+
+
+def _resample_rule(request):
+    value = request.query.get("resample")
+    if not value:
+        return None
+    if value not in RESAMPLE_RULES:
+        raise QueryError(f"resample must be one of {', '.join(RESAMPLE_RULES)}")
+    return RESAMPLE_RULES[value]
+
+
+# Last value of every column per resampling bucket, for a frame sorted by Timestamp
+def _resample(df, rule):
+    if rule is None or df.empty:
+        return df
+    resampled = df.set_index("Timestamp").resample(rule).last().dropna(how="all")
+    return resampled.reset_index()
+
+
+# Latest value, rank and category of every coin
+def query_coins(request):
+    ranking = load_ranking_index()
+    if ranking.empty:
+        return pd.DataFrame(columns=["Rank", "Coin", "Category", "Timestamp", "Market Cap (USD)"])
+    latest = ranking.latest.reset_index(drop=True)
+    return latest[["Rank", "Coin", "Category", "Timestamp", "Market Cap (USD)"]].assign(Coin=lambda df: df["Coin"].astype(str))
+
+
+# History of the requested coins, in rank order
+def query_history(request):
+    coins = [coin for value in request.query.getall("coin", []) for coin in value.split(",") if coin]
+    if not coins:
+        raise QueryError("coin is required (repeat it or separate coins with commas)")
+    start, end, rule = _parse_time(request, "from"), _parse_time(request, "to"), _resample_rule(request)
+    ranking = load_ranking_index()
+    unknown = [coin for coin in coins if coin not in ranking.ranks]
+    if unknown:
+        raise QueryError(f"Unknown coins: {', '.join(unknown)}", status=404)
+
+    frames = []
+    for coin in ranking.order(coins):
+        rows = time_slice(ranking.rows(coin), start, end)[["Timestamp", "Market Cap (USD)"]]
+        frames.append(_resample(rows, rule).assign(Coin=coin))
+    return pd.concat(frames, ignore_index=True)[["Timestamp", "Coin", "Market Cap (USD)"]]
+
+
+def _query_metrics(request, columns):
+    start, end, rule = _parse_time(request, "from"), _parse_time(request, "to"), _resample_rule(request)
+    table = load_table_with_metrics(STREAM_1_DATASET, MARKET_CAP_METRICS, columns=["Timestamp"] + columns, time_index=True)
+    if table.empty:
+        return pd.DataFrame(columns=["Timestamp"] + columns)
+    return _resample(time_slice(table, start, end).reset_index(drop=True), rule)
+
+
+def query_dominance(request):
+    return _query_metrics(request, DOMINANCE_COLUMNS)
+
+
+def query_coverage(request):
+    return _query_metrics(request, COVERAGE_COLUMNS)
+
+
+# Signature of the data behind each endpoint (part of the ETag)
+def _history_signature():
+    return (dataset_signature(HISTORY_DATASET), plane_signature(ranked_view(HISTORY_DATASET)),
+            file_signature(TICKS_SNAPSHOT), file_signature(CATEGORIES_FILE))
+
+
+def _stream_1_signature():
+    return dataset_signature(STREAM_1_DATASET)
+
+
+def _cache_get(key):
+    with _responses_lock:
+        body = _responses.get(key)
+        if body is not None:
+            _responses.move_to_end(key)
+        return body
+
+
+def _cache_put(key, body):
+    with _responses_lock:
+        _responses[key] = body
+        _responses.move_to_end(key)
+        while len(_responses) > RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+
+
+async def _stream(request, df, arrow, headers):
+    response = web.StreamResponse(headers=headers)
+    if _wants_gzip(request) and not arrow:
+        response.enable_compression()
+    await response.prepare(request)
+    if arrow:
+        # Arrow IPC stream: schema message, one message per batch, end marker
+        schema, batches = _arrow_batches(df)
+        await response.write(schema.serialize().to_pybytes())
+        for batch in batches:
+            await response.write(batch.serialize().to_pybytes())
+        await response.write(ARROW_END_OF_STREAM)
+    else:
+        await response.write(b"[")
+        for start in range(0, len(df), STREAM_ROWS):
+            chunk = _json_records(df.iloc[start:start + STREAM_ROWS])[1:-1]
+            await response.write((b"," if start else b"") + chunk)
+        await response.write(b"]")
+    await response.write_eof()
+    return response
+
+
+def _encode(df, arrow, gzipped):
+    if arrow:
+        return _arrow_stream(*_arrow_batches(df))
+    body = _json_records(df)
+    return gzip.compress(body, compresslevel=5) if gzipped else body
+
+
+# Handler for a query: answers 304 when the client's ETag is current, serves
+# cached encodings, and otherwise runs the query off the event loop and
+# encodes (or streams) the result
+def endpoint(query, signature):
+    async def handler(request):
+        arrow = _wants_arrow(request)
+        gzipped = _wants_gzip(request) and not arrow
+        version = repr((signature(), request.path, sorted(request.query.items()), arrow, gzipped))
+        etag = '"' + hashlib.sha1(version.encode()).hexdigest()[:20] + '"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+            "Content-Type": ARROW_CONTENT_TYPE if arrow else "application/json",
+        }
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+
+        body = _cache_get((etag, gzipped))
+        if body is None:
+            loop = asyncio.get_running_loop()
+            try:
+                df = await loop.run_in_executor(None, query, request)
+            except QueryError as error:
+                return web.json_response({"error": str(error)}, status=error.status)
+            if len(df) > STREAM_ROWS:
+                return await _stream(request, df, arrow, headers)
+            body = await loop.run_in_executor(None, _encode, df, arrow, gzipped)
+            _cache_put((etag, gzipped), body)
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, headers=headers)
+    return handler
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get("/coins", endpoint(query_coins, _history_signature))
+    app.router.add_get("/history", endpoint(query_history, _history_signature))
+    app.router.add_get("/dominance", endpoint(query_dominance, _stream_1_signature))
+    app.router.add_get("/coverage", endpoint(query_coverage, _stream_1_signature))
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the stored market cap history over a read-only HTTP API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("API_PORT", "8080")))
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
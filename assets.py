@@ -0,0 +1,57 @@
+import json
+import os
+
+# Small files a dashboard paints before loading its data: static assets such
+# as the HTML header, and the summary a fetcher writes next to its dataset.
+# Only json and os are imported here, so a page can import this module (and
+# paint) before pandas, numpy or pyarrow are loaded.
+
+# path -> (signature, contents), shared by every session of the process
+_cache = {}
+
+
+# Path of the JSON summary of a dataset (name without extension)
+def meta_path(name):
+    return name + ".meta.json"
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Contents of a file, read once per process and again only after it changes
+def _cached(path, load):
+    signature = _signature(path)
+    entry = _cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    value = load()
+    _cache[path] = (signature, value)
+    return value
+
+
+# Contents of a static text file (e.g. a dashboard's HTML header)
+def load_asset(path):
+    def load():
+        with open(path, "r") as f:
+            return f.read()
+    return _cached(path, load)
+
+
+# Summary written by a dataset's fetcher (storage.write_dataset_meta), or {}
+# before the first run. Reading it costs a few hundred bytes, so pages can
+# paint their title and last-update banner before the dataset is loaded.
+def load_dataset_meta(name):
+    path = meta_path(name)
+
+    def load():
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    return _cached(path, load)
@@ -0,0 +1,205 @@
+import argparse
+
+import pandas as pd
+import requests
+
+from checkpoint import FetchCheckpoint
+from coingecko import fetch_concurrently, get_client
+from history import normalize_series
+from instrumentation import finish_run, format_summary, start_run, timed
+from partitioned_store import PartitionedStore
+from rolling import update_rolling_stats
+from storage import read_dataset, write_dataset
+from universe import discover_universe
+
+# Backfill of the market cap history beyond the 365 days the daily fetcher
+# keeps: each coin's lifetime is split into fixed windows fetched from
+# /market_chart/range in parallel (under the client's shared rate limit),
+# and every window is written to the store as soon as it arrives, so memory
+# stays bounded by the windows in flight. An interrupted backfill resumes
+# with the windows still missing.
+#
+#     python backfill.py                    coins of the last daily run, back to 2013
+#     python backfill.py --coin-ids bitcoin,ethereum --since 2017-01-01
+
+# Datasets written by get_crypto_data.py
+HISTORY_DATASET = "crypto_market_cap_history"
+ROLLING_DATASET = "crypto_market_cap_rolling"
+
+# CoinGecko has no market data before this date
+BACKFILL_START = "2013-04-28"
+
+# Length of a window in days. CoinGecko answers ranges longer than 90 days
+# with daily points and shorter ones with hourly points, so no request
+# covers less than MIN_WINDOW_DAYS.
+WINDOW_DAYS = 365
+MIN_WINDOW_DAYS = 91
+
+# History does not go stale, so an unfinished backfill (interrupted, or with
+# failed windows) is resumed for this long (seconds), across days
+BACKFILL_CHECKPOINT_AGE = 30 * 86400
+
+
+# Windows (start, end) covering `since` to `until`, newest first. Window
+# boundaries are multiples of window_days counted from BACKFILL_START, so a
+# window keeps its start (and its checkpoint item) from one day to the
+# next; only the newest one ends early, at `until`.
+def backfill_windows(since, until, window_days=WINDOW_DAYS):
+    origin, length = pd.Timestamp(BACKFILL_START), pd.Timedelta(days=window_days)
+    start = origin + (pd.Timestamp(since) - origin) // length * length
+    windows = []
+    while start < pd.Timestamp(until):
+        windows.append((start, min(start + length, pd.Timestamp(until))))
+        start += length
+    return windows[::-1]
+
+
+# Coin id -> name of the coins to backfill: the given ids, else the top n
+# coins by market cap of the last daily run (from the store's metadata),
+# else the top n coins of the market
+def backfill_coins(store, coin_ids=None, n=50):
+    metadata = store.metadata()
+    known = metadata.get("coin_ids") or {}
+    ranked = [coin_id for coin_id in metadata.get("ranked_coin_ids") or [] if coin_id in known]
+    if (coin_ids and not set(coin_ids) <= set(known)) or (not coin_ids and len(ranked) < n):
+        universe = discover_universe(max(n, 250))
+        known = dict(known, **{coin["id"]: coin["name"] for coin in universe})
+        if len(ranked) < n:
+            ranked = [coin["id"] for coin in universe]
+    if coin_ids:
+        missing = [coin_id for coin_id in coin_ids if coin_id not in known]
+        if missing:
+            raise ValueError(f"Unknown coin ids: {', '.join(missing)}")
+        return {coin_id: known[coin_id] for coin_id in coin_ids}
+    return {coin_id: known[coin_id] for coin_id in ranked[:n]}
+
+
+def backfill(coin_ids=None, n=50, since=BACKFILL_START, window_days=WINDOW_DAYS, full=False):
+    if window_days < MIN_WINDOW_DAYS:
+        raise ValueError(f"Windows must be at least {MIN_WINDOW_DAYS} days long to get daily points")
+    run = start_run("backfill")
+    store = PartitionedStore(HISTORY_DATASET)
+    client = get_client()
+    since = pd.Timestamp(since)
+
+    # The coin list is saved in the checkpoint, so a resumed backfill keeps
+    # its coins even if the daily run's universe has changed since
+    checkpoint = FetchCheckpoint("backfill", {
+        "coins": coin_ids or n,
+        "since": since,
+        "window_days": window_days,
+        "full": full,
+    }, max_age=BACKFILL_CHECKPOINT_AGE)
+    coin_names = dict(checkpoint.plan(lambda: backfill_coins(store, coin_ids, n).items()))
+
+    # Windows end at yesterday's midnight: the current day is left to the
+    # daily fetcher, whose freshest point would otherwise be replaced
+    until = pd.Timestamp.now("UTC").tz_localize(None).floor("D") - pd.Timedelta(days=1)
+    windows = backfill_windows(since, until, window_days)
+
+    # Items are "<coin id>@<window start>", ordered window by window so the
+    # recent windows of every coin are fetched first
+    items, bounds = [], {}
+    for start, end in windows:
+        for coin_id in coin_names:
+            item = f"{coin_id}@{start:%Y-%m-%d}"
+            items.append(item)
+            bounds[item] = (coin_id, start, end)
+
+    if checkpoint.resumed:
+        print(f"Resuming the previous backfill: {len(checkpoint.completed())} of {len(items)} windows done")
+    elif not full:
+        # Windows already covered by the store are skipped, so a coin's
+        # backfill starts at the window holding its earliest stored point
+        earliest = store.earliest_timestamps()
+        covered = [
+            item for item, (coin_id, start, end) in bounds.items()
+            if coin_names[coin_id] in earliest and max(start, since) >= earliest[coin_names[coin_id]]
+        ]
+        checkpoint.skip(covered)
+    pending = checkpoint.pending(items)
+    print(f"Backfilling {len(coin_names)} coins since {since:%Y-%m-%d}: {len(pending)} windows of {window_days} days to fetch")
+
+    # Start of the newest window that came back empty, per coin: the coin
+    # was listed after it, so older windows are skipped without a request
+    listed = {}
+
+    def fetch_window(item):
+        coin_id, start, end = bounds[item]
+        if start <= listed.get(coin_id, pd.Timestamp.min):
+            return None
+        # The newest window may be shorter than MIN_WINDOW_DAYS; its request
+        # starts earlier so it still comes back as daily points
+        request_start = min(start, end - pd.Timedelta(days=MIN_WINDOW_DAYS))
+        timestamps, market_caps = client.get_market_chart_range(coin_id, request_start, end)["market_caps"]
+        if not len(timestamps):
+            return None
+        series = normalize_series(pd.Series(market_caps, index=pd.DatetimeIndex(timestamps)))
+        series = series[(series.index >= max(start, since)) & (series.index <= end)]
+        return pd.DataFrame({
+            "Timestamp": series.index,
+            "Market Cap (USD)": series.to_numpy(),
+            "Coin": coin_names[coin_id],
+        })
+
+    backfilled = set()
+    with timed("fetch"):
+        for item, df, error in fetch_concurrently(fetch_window, pending):
+            coin_id, start, end = bounds[item]
+            if isinstance(error, requests.exceptions.RequestException):
+                print(f"Request error occurred for {coin_id} ({start:%Y-%m-%d} to {end:%Y-%m-%d}): {error}")
+            elif error is not None:
+                raise error
+            elif df is None:
+                listed[coin_id] = max(start, listed.get(coin_id, start))
+                checkpoint.save(item)
+            else:
+                # Overlapping window edges land on the same day, and rows
+                # with a stored (Coin, Timestamp) replace it, so nothing is
+                # stored twice. The store's lock is taken per window, so the
+                # daily fetcher can commit between two windows.
+                with timed("store"):
+                    store.append(df)
+                backfilled.add(coin_names[coin_id])
+                checkpoint.save(item)
+
+    # Windows older than a coin's listing date are marked done, so a resumed
+    # backfill does not request them again; newer windows that failed stay
+    # pending and are retried
+    checkpoint.skip(
+        item for item in checkpoint.pending(items)
+        if bounds[item][1] <= listed.get(bounds[item][0], pd.Timestamp.min)
+    )
+    failed = checkpoint.pending(items)
+
+    # Recompute the rolling stats of the backfilled coins from their first
+    # point; the stats of the other coins are kept as they are. The store's
+    # lock keeps the daily fetcher from updating them in between.
+    if backfilled:
+        with store.locked():
+            rolling_df = read_dataset(ROLLING_DATASET)
+            if rolling_df is not None:
+                rolling_df = rolling_df[~rolling_df["Coin"].isin(backfilled)]
+            with timed("rolling_stats"):
+                rolling_df = update_rolling_stats(store.read(coins=backfilled), rolling_df)
+            write_dataset(rolling_df, ROLLING_DATASET)
+        print(f"Backfilled {len(backfilled)} coins into {HISTORY_DATASET}/ and recomputed {ROLLING_DATASET}")
+
+    if failed:
+        print(f"{len(failed)} windows failed; run the backfill again to retry them")
+    else:
+        checkpoint.clear()
+    print(format_summary(finish_run(run)))
+    return backfilled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the market cap history beyond 365 days from /market_chart/range.")
+    parser.add_argument("--coins", type=int, default=50, help="Number of coins to backfill when --coin-ids is not given")
+    parser.add_argument("--coin-ids", help="Comma-separated CoinGecko ids of the coins to backfill")
+    parser.add_argument("--since", default=BACKFILL_START, help="Earliest date to backfill (YYYY-MM-DD)")
+    parser.add_argument("--window-days", type=int, default=WINDOW_DAYS, help=f"Days per request (at least {MIN_WINDOW_DAYS})")
+    parser.add_argument("--full", action="store_true", help="Refetch the windows already covered by the store")
+    args = parser.parse_args()
+    coin_ids = [coin_id for coin_id in args.coin_ids.split(",") if coin_id] if args.coin_ids else None
+    backfill(coin_ids, args.coins, args.since, args.window_days, args.full)
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from coingecko import CoinGeckoClient, TokenBucket, fetch_concurrently, parse_market_chart
+from data_loader import invalidate, load_market_cap_long, load_table_with_metrics, time_slice
+from downsampling import downsample_arrays
+from history import CORE_COIN_COLUMNS, build_market_cap_table, merge_history, normalize_series
+from metrics import MARKET_CAP_METRICS, apply_metrics
+from mock_coingecko import DAY_MS, MockCoinGecko, coin_at, market_caps, market_chart_payload
+from partitioned_store import PartitionedStore
+from ranking import RankingIndex
+from storage import write_dataset
+
+# Pipeline stages, timed separately and in this order
+STAGES = ["fetch", "parse", "merge", "store", "load", "filter", "figure"]
+
+# A stage is a regression when its median is this much slower than the
+# baseline's (0.25 = 25%) and slower by more than NOISE_FLOOR seconds
+REGRESSION_THRESHOLD = 0.25
+NOISE_FLOOR = 0.005
+
+# Coins drawn by the figure and filter stages, as on the dashboards
+TOP_COINS = 50
+
+
+# Synthetic long (Timestamp, Coin, Market Cap (USD)) history of n coins over
+# the last d days, with the same values the mock server returns
+def synthetic_history(n, d):
+    end_ms = int(time.time() * 1000)
+    timestamps_ms = (end_ms - end_ms % DAY_MS) - DAY_MS * np.arange(d - 1, -1, -1, dtype=np.int64)
+    caps = np.concatenate([market_caps(index, timestamps_ms) for index in range(n)])
+    return pd.DataFrame({
+        "Timestamp": np.tile(timestamps_ms.astype("datetime64[ms]").astype("datetime64[ns]"), n),
+        "Coin": np.repeat([coin_at(index)[1] for index in range(n)], d),
+        "Market Cap (USD)": caps,
+    })
+
+
+# Everything the stages share: the synthetic inputs, built once per run and
+# never timed, and a scratch directory for the stores
+class Workload:
+    def __init__(self, coins, days, fetch_coins):
+        self.coins = coins
+        self.days = days
+        self.fetch_coins = min(fetch_coins, coins)
+        self.scratch = tempfile.mkdtemp(prefix="racecap-bench-")
+        self.history = synthetic_history(coins, days)
+        self.coin_ids = {coin_at(index)[1]: coin_at(index)[0] for index in range(coins)}
+        self.payload = json.dumps(market_chart_payload(0, days)).encode()
+        self.parsed = {}
+        self.wide = None
+        self.ranking = None
+        self.table = None
+
+    def path(self, name):
+        return os.path.join(self.scratch, name)
+
+    def close(self):
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+# market_chart requests for fetch_coins coins against the local mock server,
+# through the real client (no rate limit, no HTTP cache)
+def stage_fetch(work, server):
+    client = CoinGeckoClient(base_url=server.url, bucket=TokenBucket(rate=1e9, capacity=1e9), cache_dir=None)
+    params = {"vs_currency": "usd", "days": work.days, "interval": "daily"}
+    coin_ids = [coin_at(index)[0] for index in range(work.fetch_coins)]
+    for coin_id, _, error in fetch_concurrently(lambda coin_id: client.get_market_chart(coin_id, params), coin_ids):
+        if error is not None:
+            raise error
+    client.session.close()
+
+
+# Parsing one market_chart response per coin
+def stage_parse(work, server):
+    for index in range(work.coins):
+        work.parsed[coin_at(index)[0]] = parse_market_chart(work.payload)["market_caps"]
+
+
+# Building the stream_1 table with its own build_market_cap_table (normalize,
+# align, totals, metrics) and merging a refetched window into the long
+# history, as the two fetchers do
+def stage_merge(work, server):
+    history = work.history
+    series_by_coin = {}
+    for coin, rows in history.groupby("Coin", sort=False):
+        coin_id = work.coin_ids[coin]
+        series = pd.Series(rows["Market Cap (USD)"].to_numpy(), index=pd.DatetimeIndex(rows["Timestamp"]), name=coin_id)
+        series_by_coin[coin_id] = normalize_series(series)
+    altcoin_ids = [coin_id for coin_id in series_by_coin if coin_id not in CORE_COIN_COLUMNS]
+    work.wide = apply_metrics(build_market_cap_table(series_by_coin, altcoin_ids), MARKET_CAP_METRICS)
+
+    refetched = history[history["Timestamp"] >= history["Timestamp"].max() - pd.Timedelta(days=1)]
+    merge_history(history, refetched)
+
+
+# Writing the long history to a fresh partitioned store and the stream_1
+# table to a single-file dataset
+def stage_store(work, server):
+    shutil.rmtree(work.path("store"), ignore_errors=True)
+    PartitionedStore(work.path("store")).append(work.history)
+    write_dataset(work.wide, work.path("stream_1_history"))
+
+
+# Cold loads, as on a dashboard's first run: the long history with its
+# ranking index, and the stream_1 table indexed by Timestamp
+def stage_load(work, server):
+    invalidate()
+    work.ranking = RankingIndex(load_market_cap_long(work.path("store")))
+    work.table = load_table_with_metrics(work.path("stream_1_history"), MARKET_CAP_METRICS, time_index=True)
+
+
+# Top-N selection and the date-range filters of the dashboards
+def stage_filter(work, server):
+    selected = work.ranking.select(work.ranking.top(TOP_COINS))
+    end = work.table.index.max()
+    for days in (7, 30, 90, 365):
+        time_slice(work.table, end - pd.Timedelta(days=days), end)
+    timestamps = selected["Timestamp"]
+    selected[timestamps >= timestamps.max() - pd.Timedelta(days=365)]
+
+
+# Downsampled traces of the top coins, built into a figure and serialized
+# as Streamlit sends it to the browser
+def stage_figure(work, server):
+    fig = go.Figure()
+    for coin in work.ranking.top(TOP_COINS):
+        rows = work.ranking.rows(coin)
+        x, y = downsample_arrays(rows["Timestamp"].to_numpy(), rows["Market Cap (USD)"].to_numpy())
+        fig.add_trace(go.Scattergl(x=x, y=y, mode="lines", name=coin))
+    fig.to_json()
+
+
+STAGE_FUNCTIONS = {
+    "fetch": stage_fetch,
+    "parse": stage_parse,
+    "merge": stage_merge,
+    "store": stage_store,
+    "load": stage_load,
+    "filter": stage_filter,
+    "figure": stage_figure,
+}
+
+
+# Run every stage `repeat` times (each repetition runs the whole pipeline,
+# since later stages use earlier stages' output) and return the timings
+def run(coins, days, repeat=3, fetch_coins=100):
+    work = Workload(coins, days, fetch_coins)
+    timings = {stage: [] for stage in STAGES}
+    try:
+        with MockCoinGecko(coins=coins) as server:
+            for _ in range(repeat):
+                for stage in STAGES:
+                    started = time.perf_counter()
+                    STAGE_FUNCTIONS[stage](work, server)
+                    timings[stage].append(time.perf_counter() - started)
+    finally:
+        invalidate()
+        work.close()
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"coins": coins, "days": days, "repeat": repeat, "fetch_coins": work.fetch_coins},
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "stages": {
+            stage: {"median": statistics.median(runs), "min": min(runs), "runs": runs}
+            for stage, runs in timings.items()
+        },
+    }
+
+
+# Stages whose median got slower than the baseline's by more than threshold,
+# as (stage, baseline seconds, current seconds)
+def find_regressions(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for stage, timing in results["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if previous is None:
+            continue
+        before, after = previous["median"], timing["median"]
+        if after > before * (1 + threshold) and after - before > NOISE_FLOOR:
+            regressions.append((stage, before, after))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    config = results["config"]
+    print(f"{config['coins']} coins x {config['days']} days, median of {config['repeat']} runs")
+    for stage, timing in results["stages"].items():
+        line = f"  {stage:<8} {timing['median'] * 1000:10.1f} ms"
+        previous = baseline["stages"].get(stage) if baseline else None
+        if previous and previous["median"] > 0:
+            line += f"  ({timing['median'] / previous['median'] - 1:+.0%} vs baseline)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and dashboard pipelines on synthetic data.")
+    parser.add_argument("--coins", type=int, default=200, help="Number of synthetic coins (4 to 5000)")
+    parser.add_argument("--days", type=int, default=365, help="Days of history per coin (up to 3650)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the median is reported")
+    parser.add_argument("--fetch-coins", type=int, default=100, help="Coins requested from the mock server in the fetch stage")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown (fraction of the baseline median) reported as a regression")
+    args = parser.parse_args()
+    if args.coins < len(CORE_COIN_COLUMNS):
+        parser.error(f"--coins must be at least {len(CORE_COIN_COLUMNS)} (the stream_1 table's core coins)")
+
+    results = run(args.coins, args.days, args.repeat, args.fetch_coins)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = find_regressions(results, baseline, args.threshold) if baseline else []
+    for stage, before, after in regressions:
+        print(f"Regression in {stage}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+    sys.exit(1 if regressions else 0)
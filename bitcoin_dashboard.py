@@ -1,8 +1,13 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import pandas as pd
-import plotly.graph_objects as go
-import os
+
+# Only lightweight modules (json, os) before the first paint
+from assets import load_asset, load_dataset_meta
+from instrumentation import show_debug_panel, start_run, timed
+
+# Above this many plotted points the chart is drawn with WebGL (Scattergl)
+# traces instead of SVG, which keeps browser frame times low with many coins
+WEBGL_POINT_THRESHOLD = 10000
 
 # Set up Streamlit page configuration with an icon
 st.set_page_config(
@@ -11,76 +16,48 @@ st.set_page_config(
     page_icon="icon.png"
 )
 
-# Load the external HTML file for the header
-with open("header.html", "r") as f:
-    header_html = f.read()
-
-# Display the HTML header
-components.html(header_html, height=80)
-
-# File paths for data
-excel_file = "crypto_market_cap_history.xlsx"
-categories_file = "crypto_categories.xlsx"
-
-# Define a function to load market cap data from the Excel file
-def load_market_cap_data():
-    if os.path.exists(excel_file):
-        market_cap_df = pd.read_excel(excel_file, sheet_name="Market Cap Data")
-        if 'Timestamp' in market_cap_df.columns:
-            market_cap_df['Timestamp'] = pd.to_datetime(market_cap_df['Timestamp'])
-            # Melt the DataFrame from wide format to long format
-            melted_df = market_cap_df.melt(
-                id_vars=["Timestamp"], 
-                var_name="Coin", 
-                value_name="Market Cap (USD)"
-            )
-            # Remove rows with no market cap data
-            melted_df.dropna(subset=["Market Cap (USD)"], inplace=True)
-            
-            # Display the last update date
-            if not melted_df.empty:
-                last_update_date = melted_df['Timestamp'].max()
-                st.info(f"Last update on {last_update_date:%Y-%m-%d}")
-            
-            return melted_df
-        else:
-            return pd.DataFrame()
-    else:
-        return pd.DataFrame(columns=["Timestamp", "Coin", "Market Cap (USD)"])
-
-# Define a function to load category data from the Excel file
-def load_category_data():
-    if os.path.exists(categories_file):
-        categories_df = pd.read_excel(categories_file)
-        # Ensure the columns are named as expected
-        if "Coin" in categories_df.columns and "Category" in categories_df.columns:
-            return categories_df
-        else:
-            return pd.DataFrame(columns=["Coin", "Category"])
-    else:
-        return pd.DataFrame(columns=["Coin", "Category"])
-
-# Load market cap data and categories data
-market_cap_df = load_market_cap_data()
-categories_df = load_category_data()
-
-# Merge market cap data with categories if both are available
-if not market_cap_df.empty and not categories_df.empty:
-    market_cap_df = pd.merge(market_cap_df, categories_df, on="Coin", how="left")
-    market_cap_df["Category"].fillna("Top 50 Coins", inplace=True)
-else:
-    market_cap_df["Category"] = "Top 50 Coins"
-
-# Filter to only show the top 50 coins by latest market cap
-latest_data = market_cap_df.groupby('Coin').apply(lambda x: x.iloc[-1])
-top_50_coins = latest_data.nlargest(50, 'Market Cap (USD)')['Coin'].tolist()
-filtered_df = market_cap_df[market_cap_df['Coin'].isin(top_50_coins)]
+# Timings of this rerun, shown in the debug panel (open the page with ?debug=1)
+run = start_run("bitcoin_dashboard")
+
+# Display the HTML header (read from disk once per process)
+components.html(load_asset("header.html"), height=80)
 
 # Title of the dashboard
 st.title("Cryptocurrency Market Cap Dashboard")
 
+# First paint: the last update date comes from the small summary the
+# fetcher writes next to the data, before the data itself is touched
+last_update_banner = st.empty()
+last_update = load_dataset_meta("crypto_market_cap_history").get("last_update")
+if last_update:
+    last_update_banner.info(f"Last update on {last_update[:10]}")
+
+# Heavier modules (pandas, numpy, pyarrow, plotly and the data loader) are
+# imported after the first paint; Python keeps them for the rest of the
+# process, so only the first run of a fresh dyno pays for them
+import pandas as pd  # noqa: E402
+import plotly.graph_objects as go  # noqa: E402
+
+from data_loader import load_ranking_index, load_rolling_stats  # noqa: E402
+from downsampling import downsample_arrays  # noqa: E402
+from rolling import OVERLAYS, stat_column  # noqa: E402
+
+# Load the ranking index over the market cap data merged with categories
+# (latest row per coin ranked by market cap, see ranking.py). It comes from
+# the shared process-wide cache in data_loader.py, so it is only rebuilt
+# after the fetcher has written new data.
+with timed("load_data"), st.spinner("Loading market data..."):
+    ranking = load_ranking_index()
+
+# Display the last update date, including the latest intraday ticks
+if not ranking.empty:
+    last_update_banner.info(f"Last update on {ranking.last_update:%Y-%m-%d}")
+
+# Only show the top 50 coins by latest market cap
+candidate_coins = ranking.top(50)
+
 # Display a warning if no data is loaded
-if filtered_df.empty:
+if not candidate_coins:
     st.warning("No data available. Please ensure the data files exist and contain valid data.")
     st.stop()
 
@@ -96,11 +73,10 @@ show_top_10 = st.sidebar.checkbox(
 
 # Apply top 10 filter if selected
 if show_top_10:
-    top_10_coins = latest_data.nlargest(10, 'Market Cap (USD)')['Coin'].tolist()
-    filtered_df = filtered_df[filtered_df['Coin'].isin(top_10_coins)]
+    candidate_coins = ranking.top(10)
 
 # Filter by category within the top 50, with categories hidden by default
-available_categories = sorted(filtered_df['Category'].dropna().unique().tolist())
+available_categories = sorted(ranking.latest.loc[candidate_coins, 'Category'].dropna().unique().tolist())
 with st.sidebar.expander("Select categories to display", expanded=False):
     selected_categories = st.multiselect(
         "Choose Categories",
@@ -109,10 +85,10 @@ with st.sidebar.expander("Select categories to display", expanded=False):
         help="Filter cryptocurrencies by category.",
         label_visibility="collapsed"
     )
-filtered_df = filtered_df[filtered_df['Category'].isin(selected_categories)]
+candidate_coins = ranking.coins_in_categories(selected_categories, candidate_coins)
 
 # Filter by coin within the top 50
-available_coins = sorted(filtered_df['Coin'].unique().tolist())
+available_coins = sorted(candidate_coins)
 with st.sidebar.expander("Select coins to display", expanded=False):
     selected_coins = st.multiselect(
         "Choose Coins",
@@ -127,13 +103,11 @@ if not selected_coins:
     st.warning("No data to display. Please select at least one coin.")
     st.stop()
 
-# Filter data based on selected coins
-filtered_df = filtered_df[filtered_df['Coin'].isin(selected_coins)]
-
-# Determine the latest market cap for each coin to order them in the chart
-latest_data = filtered_df.groupby('Coin').apply(lambda x: x.iloc[-1])
-latest_data.sort_values(by='Market Cap (USD)', ascending=False, inplace=True)
-ordered_coins = latest_data.index.tolist()
+# Order the selected coins by their latest market cap and take their rows
+# straight from the ranking index
+with timed("filter"):
+    ordered_coins = ranking.order(selected_coins)
+    filtered_df = ranking.select(ordered_coins)
 
 # User-adjustable chart dimensions
 vertical_size = st.sidebar.slider(
@@ -153,42 +127,117 @@ horizontal_size = st.sidebar.slider(
     help="Adjust the width of the chart."
 )
 
-# Create the Plotly figure
-fig = go.Figure()
-
-# Plot data for each selected coin, ordered by their latest market cap (descending)
-for i, coin in enumerate(ordered_coins, start=1):
-    if coin in selected_coins:
-        coin_data = filtered_df[filtered_df['Coin'] == coin].sort_values(by="Timestamp")
-        fig.add_trace(
-            go.Scatter(
-                x=coin_data['Timestamp'],
-                y=coin_data['Market Cap (USD)'],
-                mode='lines+markers',
-                name=f"#{i} {coin}"
-            )
-        )
-
-# Update layout with logarithmic Y-axis scale and user-adjustable chart size
-fig.update_layout(
-    title="Cryptocurrency Market Cap Over Time (Log Scale)",
-    xaxis_title="<b>Date</b>",
-    yaxis_title="<b>Market Cap (USD)</b>",
-    xaxis=dict(
-        title_font=dict(size=16, color='black')
-    ),
-    yaxis=dict(
-        title_font=dict(size=16, color='black'),
-        type="log"  # Apply logarithmic scale to the Y-axis
-    ),
-    height=vertical_size,
-    width=horizontal_size,
-    template="plotly_white",
-    legend_title="Coin (Ordered by Market Cap)"
+# Rolling stats drawn on top of each coin's market cap (precomputed by the
+# fetcher, see rolling.py)
+selected_overlays = st.sidebar.multiselect(
+    "Overlays",
+    options=list(OVERLAYS),
+    default=[],
+    help="Moving averages share the market cap axis; volatility and drawdown (%) use the right axis."
 )
 
+# Date range to display. Each trace is downsampled to about one point per
+# pixel of chart width within this range, so zooming in on a shorter range
+# brings back full resolution.
+first_date = filtered_df['Timestamp'].min().date()
+last_date = filtered_df['Timestamp'].max().date()
+if first_date < last_date:
+    zoom_start, zoom_end = st.sidebar.slider(
+        "Zoom to Dates",
+        min_value=first_date,
+        max_value=last_date,
+        value=(first_date, last_date),
+        format="YYYY-MM-DD",
+        help="Narrow the date range to see the chart at full resolution."
+    )
+    with timed("filter"):
+        filtered_df = filtered_df[
+            (filtered_df['Timestamp'] >= pd.Timestamp(zoom_start)) &
+            (filtered_df['Timestamp'] < pd.Timestamp(zoom_end) + pd.Timedelta(days=1))
+        ]
+
+# Split the rows by coin once (the ranking index keeps each coin's rows
+# sorted by Timestamp) and build each trace from numpy arrays, downsampled
+# to about one point per pixel of chart width
+with timed("traces"):
+    timestamps = filtered_df['Timestamp'].to_numpy()
+    market_caps = filtered_df['Market Cap (USD)'].to_numpy()
+    coin_positions = filtered_df.groupby('Coin', observed=True, sort=False).indices
+    trace_arrays = []
+    for i, coin in enumerate(ordered_coins, start=1):
+        if coin in coin_positions:
+            positions = coin_positions[coin]
+            x, y = downsample_arrays(timestamps[positions], market_caps[positions], points=horizontal_size)
+            trace_arrays.append((f"#{i} {coin}", x, y))
+
+# Overlay traces: (name, x, y, stat) for each selected coin and overlay
+with timed("overlays"):
+    overlay_arrays = []
+    if selected_overlays:
+        rolling_df = load_rolling_stats()
+        rolling_df = rolling_df[
+            rolling_df['Coin'].isin(ordered_coins) &
+            (rolling_df['Timestamp'] >= filtered_df['Timestamp'].min()) &
+            (rolling_df['Timestamp'] <= filtered_df['Timestamp'].max())
+        ]
+        rolling_positions = rolling_df.groupby('Coin', sort=False).indices
+        rolling_timestamps = rolling_df['Timestamp'].to_numpy()
+        for coin in ordered_coins:
+            if coin not in rolling_positions:
+                continue
+            positions = rolling_positions[coin]
+            for overlay in selected_overlays:
+                stat, window = OVERLAYS[overlay]
+                values = rolling_df[stat_column(stat, window)].to_numpy()[positions]
+                x, y = downsample_arrays(rolling_timestamps[positions], values, points=horizontal_size)
+                overlay_arrays.append((f"{coin} {overlay}", x, y, stat))
+
+# Switch to WebGL traces when there are too many points for SVG
+plotted_points = sum(len(x) for _, x, _ in trace_arrays) + sum(len(x) for _, x, _, _ in overlay_arrays)
+trace_type = go.Scattergl if plotted_points > WEBGL_POINT_THRESHOLD else go.Scatter
+
+# Create the Plotly figure with one trace per selected coin, ordered by
+# their latest market cap (descending), followed by the overlays
+with timed("figure"):
+    fig = go.Figure(data=[
+        trace_type(x=x, y=y, mode='lines+markers', name=name)
+        for name, x, y in trace_arrays
+    ] + [
+        trace_type(x=x, y=y, mode='lines', name=name, line=dict(dash='dot'), yaxis='y' if stat == 'MA' else 'y2')
+        for name, x, y, stat in overlay_arrays
+    ])
+
+    # Update layout with logarithmic Y-axis scale and user-adjustable chart size
+    fig.update_layout(
+        title="Cryptocurrency Market Cap Over Time (Log Scale)",
+        xaxis_title="<b>Date</b>",
+        yaxis_title="<b>Market Cap (USD)</b>",
+        xaxis=dict(
+            title_font=dict(size=16, color='black')
+        ),
+        yaxis=dict(
+            title_font=dict(size=16, color='black'),
+            type="log"  # Apply logarithmic scale to the Y-axis
+        ),
+        yaxis2=dict(
+            title="<b>Volatility / Drawdown (%)</b>",
+            overlaying="y",
+            side="right",
+            showgrid=False,
+            visible=any(stat != 'MA' for _, _, _, stat in overlay_arrays)
+        ),
+        height=vertical_size,
+        width=horizontal_size,
+        template="plotly_white",
+        legend_title="Coin (Ordered by Market Cap)"
+    )
+
 # Display the chart on the main page without the subtitle list of coins
-st.plotly_chart(fig, use_container_width=(horizontal_size == 2000))
+with timed("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=(horizontal_size == 2000))
+
+# Log this rerun's timings (and show them when debugging)
+show_debug_panel(run)
 
 
 # import streamlit as st
@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from storage import BACKENDS, STORAGE_FORMAT, read_table, write_json, write_table
+
+# Directory holding the checkpoints of interrupted fetch runs
+CHECKPOINT_DIR = os.environ.get("RACECAP_CHECKPOINT_DIR", ".fetch_checkpoints")
+
+# Checkpoints older than this (seconds) are discarded instead of resumed, so
+# a run never finishes with data fetched on an earlier day
+MAX_CHECKPOINT_AGE = 12 * 3600
+
+
+def _normalize(value):
+    return json.loads(json.dumps(value, sort_keys=True, default=str))
+
+
+# Checkpoint of a fetch run: every item's result is written to its own file
+# as soon as it arrives, and a manifest records the planned and completed
+# items. A run restarted with the same fingerprint (the run's parameters)
+# resumes with the pending items only; a different fingerprint starts a
+# fresh run.
+#
+#     <directory>/<name>/manifest.json
+#     <directory>/<name>/<item>.parquet
+class FetchCheckpoint:
+    def __init__(self, name, fingerprint, directory=CHECKPOINT_DIR, fmt=None, max_age=MAX_CHECKPOINT_AGE):
+        self.root = os.path.join(directory, name)
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        self.extension = BACKENDS[fmt or STORAGE_FORMAT].extension
+        self.fingerprint = _normalize(fingerprint)
+        self.lock = threading.Lock()
+        self.manifest = self._load(max_age)
+
+    def _load(self, max_age):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+        if (manifest is not None and manifest.get("fingerprint") == self.fingerprint
+                and time.time() - manifest.get("started_at", 0) < max_age):
+            return manifest
+        shutil.rmtree(self.root, ignore_errors=True)
+        return {"fingerprint": self.fingerprint, "started_at": time.time(), "completed": {}}
+
+    # Items of the run: built by make_items() on the first attempt and saved
+    # in the manifest, so a resumed run works on the same items even if the
+    # list they came from changed in between (e.g. the coin universe was
+    # re-resolved after its cache expired)
+    def plan(self, make_items):
+        with self.lock:
+            if "items" not in self.manifest:
+                self.manifest["items"] = _normalize(list(make_items()))
+                os.makedirs(self.root, exist_ok=True)
+                write_json(self.manifest, self.manifest_path)
+            return self.manifest["items"]
+
+    # True if items were already completed by an earlier, interrupted run
+    @property
+    def resumed(self):
+        return bool(self.manifest["completed"])
+
+    def completed(self):
+        return list(self.manifest["completed"])
+
+    # Items not completed yet, in their original order
+    def pending(self, items):
+        return [item for item in items if item not in self.manifest["completed"]]
+
+    # Record an item's result (a DataFrame, or None for "nothing to store")
+    def save(self, item, df=None):
+        filename = None
+        if df is not None:
+            os.makedirs(self.root, exist_ok=True)
+            filename = str(item).replace(os.sep, "_") + self.extension
+            write_table(df, os.path.join(self.root, filename))
+        with self.lock:
+            self.manifest["completed"][item] = filename
+            os.makedirs(self.root, exist_ok=True)
+            write_json(self.manifest, self.manifest_path)
+
+    # Mark items as completed without a result, with a single manifest write
+    def skip(self, items):
+        with self.lock:
+            for item in items:
+                self.manifest["completed"][item] = None
+            os.makedirs(self.root, exist_ok=True)
+            write_json(self.manifest, self.manifest_path)
+
+    # item -> stored DataFrame (or None) for every completed item
+    def results(self):
+        return {
+            item: read_table(os.path.join(self.root, filename)) if filename else None
+            for item, filename in self.manifest["completed"].items()
+        }
+
+    # Remove the checkpoint once the run's results have been committed
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
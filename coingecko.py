@@ -0,0 +1,269 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import HTTP_CACHE_DIR, ResponseCache, cache_ttl
+from instrumentation import count, in_current_run, instrumented, timed
+
+# orjson is optional: it decodes JSON several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# CoinGecko API base URL (can be pointed at a mirror or a local mock server)
+API_BASE_URL = os.environ.get("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+
+# CoinGecko API endpoints (relative to the base URL)
+COIN_MARKETS_ENDPOINT = "/coins/markets"
+COIN_MARKET_CHART_ENDPOINT = "/coins/{id}/market_chart"
+COIN_MARKET_CHART_RANGE_ENDPOINT = "/coins/{id}/market_chart/range"
+SIMPLE_PRICE_ENDPOINT = "/simple/price"
+
+# Request budget shared by every worker. The public API allows roughly
+# 30 calls per minute, so refill one token every two seconds by default.
+REQUESTS_PER_SECOND = float(os.environ.get("COINGECKO_RATE", "0.5"))
+BURST_SIZE = int(os.environ.get("COINGECKO_BURST", "5"))
+MAX_WORKERS = int(os.environ.get("COINGECKO_WORKERS", "4"))
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 30
+
+# Wait used when a 429 response does not carry a Retry-After header
+DEFAULT_RETRY_AFTER = 60
+
+# Series returned by the market_chart endpoints
+MARKET_CHART_SERIES = ("prices", "market_caps", "total_volumes")
+_ARRAY_END = re.compile(rb"\]\s*\]")
+
+
+# Token bucket shared between threads: each request takes one token, tokens
+# refill at a fixed rate, and a 429 pauses the whole bucket so every worker
+# backs off together instead of hammering the API in parallel.
+class TokenBucket:
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST_SIZE, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    # Block until a token is available, then take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    # Stop handing out tokens for the given number of seconds
+    def pause(self, seconds):
+        with self.lock:
+            now = self.clock()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0.0
+            self.updated_at = self.paused_until
+
+
+# Convert a Retry-After header (delta seconds or HTTP date) into seconds
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Decode a JSON response body
+def decode_json(content):
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+# Numbers of one [[timestamp_ms, value], ...] array of a market_chart payload
+# as a flat float64 array, parsed from the raw bytes with a single
+# np.fromstring call. Returns None if the series is missing.
+def _series_numbers(content, name):
+    match = re.search(b'"' + name.encode() + rb'"\s*:\s*\[\s*', content)
+    if match is None:
+        return None
+    start = match.end()
+    if content[start:start + 1] == b"]":
+        return np.empty(0)
+    end = _ARRAY_END.search(content, start)
+    if end is None:
+        raise ValueError(f"Unterminated {name} array")
+    points = content[start:end.start()]
+    body = points.translate(None, b"[] \t\r\n").replace(b"null", b"nan")
+    numbers = np.fromstring(body.decode("ascii"), sep=",")
+    # Every point must be a [timestamp, value] pair
+    if len(numbers) != body.count(b",") + 1 or len(numbers) != 2 * points.count(b"["):
+        raise ValueError(f"Unexpected {name} array")
+    return numbers
+
+
+# Decode the requested series of a market_chart payload into
+# {series: (datetime64[ns] timestamps, float64 values)} without building
+# nested Python lists. Payloads that do not have the expected shape go
+# through the JSON decoder instead.
+@instrumented("parse_market_chart")
+def parse_market_chart(content, series=("market_caps",)):
+    try:
+        numbers = {name: _series_numbers(content, name) for name in series}
+    except ValueError:
+        data = decode_json(content)
+        numbers = {name: np.array([point[:2] for point in data.get(name) or []], dtype=np.float64).ravel() for name in series}
+    chart = {}
+    for name, values in numbers.items():
+        if values is None:
+            values = np.empty(0)
+        timestamps = values[0::2].astype(np.int64).astype("datetime64[ms]").astype("datetime64[ns]")
+        chart[name] = (timestamps, values[1::2].copy())
+    return chart
+
+
+# Thin CoinGecko client: every call goes through the shared token bucket and
+# 429 responses are retried after the delay the server asks for. Requests
+# share one pooled keep-alive Session, and successful responses go through
+# the on-disk cache (http_cache.py): fresh entries are served without a
+# request, stale ones are revalidated with ETag / If-Modified-Since.
+class CoinGeckoClient:
+    def __init__(self, base_url=API_BASE_URL, bucket=None, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT,
+                 cache_dir=HTTP_CACHE_DIR):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(MAX_WORKERS, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, endpoint):
+        if endpoint.startswith("http://") or endpoint.startswith("https://"):
+            return endpoint
+        return self.base_url + endpoint
+
+    @staticmethod
+    def _from_cache(entry, url):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response._content = entry.content
+        response.headers["Content-Type"] = "application/json"
+        return response
+
+    def get(self, endpoint, params=None):
+        url = self.url(endpoint)
+        ttl = cache_ttl(url) if self.cache else 0
+        entry = self.cache.get(url, params) if ttl > 0 else None
+        if entry is not None and entry.age < ttl:
+            count("http_cache_hits")
+            return self._from_cache(entry, url)
+        headers = entry.validators() if entry is not None else {}
+
+        for attempt in range(self.max_retries + 1):
+            with timed("rate_limit_wait"):
+                self.bucket.acquire()
+            with timed("api_request"):
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            count("api_calls")
+            count("bytes_downloaded", len(response.content))
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            count("rate_limited")
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            print(f"Rate limit exceeded for {url}. Retrying in {delay:.0f} seconds.")
+            self.bucket.pause(delay)
+
+        if response.status_code == 304 and entry is not None:
+            count("http_cache_revalidated")
+            self.cache.touch(entry)
+            return self._from_cache(entry, url)
+        response.raise_for_status()
+        if ttl > 0:
+            self.cache.put(url, params, response)
+        return response
+
+    def get_json(self, endpoint, params=None):
+        return decode_json(self.get(endpoint, params=params).content)
+
+    # market_chart series of one coin as numpy arrays (see parse_market_chart)
+    def get_market_chart(self, coin_id, params, series=("market_caps",)):
+        response = self.get(COIN_MARKET_CHART_ENDPOINT.format(id=coin_id), params=params)
+        return parse_market_chart(response.content, series)
+
+    # market_chart series of one coin between two UTC datetimes. CoinGecko
+    # returns daily points for ranges longer than 90 days, hourly below.
+    def get_market_chart_range(self, coin_id, start, end, series=("market_caps",), vs_currency="usd"):
+        params = {
+            "vs_currency": vs_currency,
+            "from": int(start.replace(tzinfo=timezone.utc).timestamp()),
+            "to": int(end.replace(tzinfo=timezone.utc).timestamp()),
+        }
+        response = self.get(COIN_MARKET_CHART_RANGE_ENDPOINT.format(id=coin_id), params=params)
+        return parse_market_chart(response.content, series)
+
+
+# Run fetch(item) for every item on a bounded thread pool. Yields
+# (item, result, error) tuples as soon as each call finishes, so callers can
+# report progress and keep going when a single coin fails. The workers
+# record their timings and counters into the caller's run (instrumentation.py).
+def fetch_concurrently(fetch, items, max_workers=MAX_WORKERS):
+    items = list(items)
+    if not items:
+        return
+    fetch = in_current_run(fetch)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = {executor.submit(fetch, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as error:
+                yield item, None, error
+
+
+# Shared client for scripts that just want the default budget
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = CoinGeckoClient()
+        return _default_client
@@ -0,0 +1,257 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from data_plane import (DATA_PLANE_DIR, PLANE_CHECK_TTL, attach, is_published, plane_signature, publish_frame,
+                        source_signature)
+from instrumentation import count, timed
+from metrics import apply_metrics, metric_columns
+from partitioned_store import MANIFEST_FILE, PartitionedStore, wide_to_long
+from ranking import RankingIndex, rank_frame
+from spot_prices import TICKS_SNAPSHOT, read_spot_ticks
+from storage import find_dataset, read_dataset, read_table
+
+# Seconds a cached entry is trusted before its source signature is checked
+# again; a changed file is picked up on the next check.
+CACHE_TTL = float(os.environ.get("RACECAP_CACHE_TTL", "300"))
+
+# Default datasets shared by the dashboards
+HISTORY_DATASET = "crypto_market_cap_history"
+ROLLING_DATASET = "crypto_market_cap_rolling"
+CATEGORIES_FILE = "crypto_categories.xlsx"
+DEFAULT_CATEGORY = "Top 50 Coins"
+
+# Process-wide cache: Streamlit imports this module once per process, so every
+# session and rerun shares the same frames instead of parsing its own copy.
+# Cached frames are shared, so callers must not modify them in place.
+_cache = {}
+_cache_lock = threading.Lock()
+_key_locks = {}
+
+
+class _Entry:
+    def __init__(self, signature, value):
+        self.signature = signature
+        self.value = value
+        self.checked_at = time.monotonic()
+
+
+def _key_lock(key):
+    with _cache_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+# Return the cached value for key, reloading it with load() when the entry is
+# missing, or older than ttl and its source signature has changed.
+# signature is a callable so it is only evaluated when the TTL has expired.
+# Loads are timed as "load:<first part of the key>".
+def cached(key, load, signature=lambda: None, ttl=None):
+    ttl = CACHE_TTL if ttl is None else ttl
+    with _key_lock(key):
+        entry = _cache.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < ttl:
+            count("data_cache_hits")
+            return entry.value
+        current = signature()
+        if entry is not None and current is not None and current == entry.signature:
+            entry.checked_at = time.monotonic()
+            count("data_cache_hits")
+            return entry.value
+        count("data_cache_misses")
+        with timed(f"load:{key[0] if isinstance(key, tuple) else key}"):
+            value = load()
+        _cache[key] = _Entry(current, value)
+        return value
+
+
+# Drop one cached entry, or the whole cache
+def invalidate(key=None):
+    with _cache_lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
+
+
+# Signature of a file (mtime and size), or None if it does not exist
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+# Signature of a dataset: its partitioned store manifest, else its single
+# file, and its version pointer in the shared data plane (data_plane.py)
+def dataset_signature(name):
+    return (file_signature(os.path.join(name, MANIFEST_FILE)), file_signature(find_dataset(name)), plane_signature(name))
+
+
+# Published datasets have their version pointer checked every few seconds,
+# so every worker switches to a new version at about the same time
+def dataset_ttl(name):
+    return PLANE_CHECK_TTL if is_published(name) else None
+
+
+# A dataset's table, mapped from the shared data plane when the refresher has
+# published its current version, otherwise read from disk
+def read_shared_dataset(name, columns=None):
+    df = attach(name, columns=columns)
+    if df is not None:
+        count("data_plane_attached")
+        return df
+    return read_dataset(name, columns=columns)
+
+
+# Raw table of a single-file dataset (e.g. the stream_1 history), with an
+# optional column projection
+def load_table(name, columns=None):
+    key = ("table", name, tuple(columns) if columns else None)
+    return cached(key, lambda: read_shared_dataset(name, columns=columns), lambda: dataset_signature(name), dataset_ttl(name))
+
+
+# Single-file dataset with its derived metric columns (see metrics.py).
+# Files written before a metric was declared get it computed once per load.
+# With time_index, rows are sorted by Timestamp and indexed by it, ready for
+# time_slice.
+def load_table_with_metrics(name, metrics, columns=None, time_index=False):
+    def load():
+        df = None
+        if columns:
+            try:
+                df = read_shared_dataset(name, columns=columns)
+            except (KeyError, ValueError):
+                df = None  # some requested metrics are not in the file yet
+        if df is None:
+            df = read_shared_dataset(name)
+            if df is None:
+                return pd.DataFrame(columns=columns or ["Timestamp"])
+            df = apply_metrics(df, [metric for metric in metrics if not set(metric.names) <= set(df.columns)])
+        df = df[columns] if columns else df
+        if time_index:
+            df = df.sort_values("Timestamp", kind="stable")
+            df.index = pd.DatetimeIndex(df["Timestamp"]).rename(None)
+        return df
+    key = ("table_with_metrics", name, tuple(metric_columns(metrics)), tuple(columns) if columns else None, time_index)
+    return cached(key, load, lambda: dataset_signature(name), dataset_ttl(name))
+
+
+# Rows of a frame sorted by Timestamp between start and end (inclusive, either
+# may be None). The bounds are found by binary search on the DatetimeIndex
+# (or the Timestamp column) and the rows are returned as a positional slice,
+# so the cost does not depend on the size of the history.
+def time_slice(df, start=None, end=None):
+    index = df.index if isinstance(df.index, pd.DatetimeIndex) else pd.DatetimeIndex(df["Timestamp"])
+    first = 0 if start is None else index.searchsorted(pd.Timestamp(start), side="left")
+    last = len(df) if end is None else index.searchsorted(pd.Timestamp(end), side="right")
+    return df.iloc[first:last]
+
+
+# Long (Timestamp, Coin, Market Cap (USD)) history: mapped from the shared
+# data plane when published, else read from the partitioned store when
+# present, otherwise melted from the single-file wide history
+def read_market_cap_long(name=HISTORY_DATASET):
+    wide_df = attach(name)
+    if wide_df is not None:
+        count("data_plane_attached")
+        # A partitioned store is published in long format, a single-file
+        # history as it is stored (wide, like the stream_1 table)
+        if "Coin" in wide_df.columns:
+            return wide_df
+    else:
+        store = PartitionedStore(name)
+        if store.exists():
+            return store.read(coins=store.metadata().get("universe"))
+        wide_df = read_dataset(name)
+    if wide_df is None or "Timestamp" not in wide_df.columns:
+        return pd.DataFrame(columns=["Timestamp", "Coin", "Market Cap (USD)"])
+    wide_df["Timestamp"] = pd.to_datetime(wide_df["Timestamp"])
+    return wide_to_long(wide_df).reset_index(drop=True)
+
+
+# Cached long history, for callers that need the raw frame (the ranking
+# index reads its own, see load_ranking_index)
+def load_market_cap_long(name=HISTORY_DATASET):
+    return cached(("long", name), lambda: read_market_cap_long(name), lambda: dataset_signature(name), dataset_ttl(name))
+
+
+# Intraday ticks written by the spot price ingestor (spot_prices.py)
+def load_spot_ticks(root="."):
+    path = os.path.join(root, TICKS_SNAPSHOT)
+    return cached(("spot_ticks", root), lambda: read_spot_ticks(root), lambda: file_signature(path))
+
+
+# Rolling stats of every coin (see rolling.py), one row per stored
+# Timestamp; empty until the fetcher has written them
+def load_rolling_stats(name=ROLLING_DATASET):
+    def load():
+        rolling_df = read_shared_dataset(name)
+        if rolling_df is None:
+            return pd.DataFrame(columns=["Timestamp", "Coin"])
+        return rolling_df.sort_values(["Coin", "Timestamp"]).reset_index(drop=True)
+    return cached(("rolling", name), load, lambda: dataset_signature(name), dataset_ttl(name))
+
+
+# Coin -> Category table (empty without a categories file)
+def read_categories(path=CATEGORIES_FILE):
+    if os.path.exists(path):
+        categories_df = read_table(path)
+        if "Coin" in categories_df.columns and "Category" in categories_df.columns:
+            return categories_df[["Coin", "Category"]]
+    return pd.DataFrame(columns=["Coin", "Category"])
+
+
+def load_categories(path=CATEGORIES_FILE):
+    return cached(("categories", path), lambda: read_categories(path), lambda: file_signature(path))
+
+
+# Long history with each coin's category (coins without one get the default)
+def with_categories(market_cap_df, categories_df):
+    if not market_cap_df.empty and not categories_df.empty:
+        merged_df = pd.merge(market_cap_df, categories_df, on="Coin", how="left")
+        merged_df["Category"] = merged_df["Category"].fillna(DEFAULT_CATEGORY)
+        return merged_df
+    return market_cap_df.assign(Category=DEFAULT_CATEGORY)
+
+
+# Plane name of the ranked view of a history: the history with categories,
+# laid out by ranking.rank_frame
+def ranked_view(name=HISTORY_DATASET):
+    return name + ".ranked"
+
+
+# Publish the ranked view of a history to the shared data plane, so every
+# dashboard worker maps the frame its ranking index uses instead of building
+# (and keeping) its own merged and sorted copy. Categories are stored
+# dictionary-encoded like the coins. Returns the new version, or None if the
+# history does not exist yet.
+def publish_ranked_view(name=HISTORY_DATASET, categories_path=CATEGORIES_FILE, directory=DATA_PLANE_DIR):
+    source = source_signature(name, categories_path)
+    if not PartitionedStore(name).exists() and find_dataset(name) is None:
+        return None
+    frame = rank_frame(with_categories(read_market_cap_long(name), read_categories(categories_path)))
+    frame = frame.assign(Category=frame["Category"].astype("category"))
+    return publish_frame(ranked_view(name), frame, source, directory)
+
+
+# Ranking index (latest row per coin, categorical coin order, per-coin row
+# ranges) over the long history with categories and the intraday ticks; see
+# ranking.py. Only the index is cached: it maps the published ranked view
+# when there is one, otherwise it holds the one merged and sorted copy of
+# the history in this process.
+def load_ranking_index(name=HISTORY_DATASET, categories_path=CATEGORIES_FILE):
+    view = ranked_view(name)
+
+    def load():
+        ticks_df = load_spot_ticks()
+        frame = attach(view, source=source_signature(name, categories_path))
+        if frame is not None:
+            count("data_plane_attached")
+            return RankingIndex(frame, presorted=True, ticks=ticks_df)
+        return RankingIndex(with_categories(read_market_cap_long(name), read_categories(categories_path)), ticks=ticks_df)
+    signature = lambda: (dataset_signature(name), plane_signature(view), file_signature(TICKS_SNAPSHOT), file_signature(categories_path))
+    ttl = PLANE_CHECK_TTL if is_published(name) or is_published(view) else None
+    return cached(("ranking", name, categories_path), load, signature, ttl)
@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from partitioned_store import MANIFEST_FILE, PartitionedStore
+from storage import find_dataset, read_dataset, write_json, write_table
+
+# Directory of the shared data plane: the refresher publishes each dataset
+# there as an uncompressed Arrow IPC (Feather) file, and every dashboard
+# process on the machine memory-maps the same file instead of parsing its
+# own copy. Processes only share it when they share a filesystem (the
+# workers of one dyno, not separate dynos).
+DATA_PLANE_DIR = os.environ.get(
+    "RACECAP_DATA_PLANE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data_plane")
+)
+
+# Published versions kept per dataset, so readers still mapping the previous
+# version are not cut off mid-read
+KEEP_VERSIONS = 2
+
+# How often (seconds) a dashboard checks the version pointer of a published
+# dataset; all workers switch to a new version within this delay
+PLANE_CHECK_TTL = float(os.environ.get("RACECAP_PLANE_CHECK_TTL", "5"))
+
+
+# File name prefix of a dataset in the plane: its base name plus a hash of
+# its absolute path, so the two histories named crypto_market_cap_history
+# (root and stream_1) do not collide
+def _plane_key(name):
+    path = os.path.abspath(name)
+    return f"{os.path.basename(path)}-{hashlib.sha1(path.encode()).hexdigest()[:10]}"
+
+
+def pointer_path(name, directory=DATA_PLANE_DIR):
+    return os.path.join(directory, _plane_key(name) + ".json")
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# Signature of the dataset on disk (partitioned store manifest, else its
+# single file), plus that of any other files a derived frame was built from.
+# A published version is only used while it matches, so a fetcher run by
+# hand is never hidden by an older published copy.
+def source_signature(name, *paths):
+    path = os.path.abspath(name)
+    return [_stat(os.path.join(path, MANIFEST_FILE)), _stat(find_dataset(path))] + [_stat(extra) for extra in paths]
+
+
+# Version pointer of a published dataset ({version, file, source, ...}), or None
+def read_pointer(name, directory=DATA_PLANE_DIR):
+    try:
+        with open(pointer_path(name, directory)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Signature of the version pointer, for cache invalidation
+def plane_signature(name, directory=DATA_PLANE_DIR):
+    return _stat(pointer_path(name, directory))
+
+
+def is_published(name, directory=DATA_PLANE_DIR):
+    return os.path.exists(pointer_path(name, directory))
+
+
+# Frame published for a dataset: the partitioned store's current universe
+# (long format), or the single-file dataset
+def _read_source(name):
+    store = PartitionedStore(name)
+    if store.exists():
+        return store.read(coins=store.metadata().get("universe"))
+    return read_dataset(name)
+
+
+# Publish the current contents of a dataset as a new version. Coin names
+# are stored dictionary-encoded so they map as small integer codes. Returns
+# the new version, or None if the dataset does not exist yet.
+def publish(name, directory=DATA_PLANE_DIR):
+    source = source_signature(name)
+    df = _read_source(name)
+    if df is None:
+        return None
+    if "Coin" in df.columns:
+        df = df.assign(Coin=df["Coin"].astype("category"))
+    return publish_frame(name, df, source, directory)
+
+
+# Publish a frame under a name as a new version: write the Arrow file, then
+# atomically swap the version pointer to it. source is the signature the
+# frame was built from (see source_signature); attach only returns the frame
+# while it still matches. Returns the new version.
+def publish_frame(name, df, source, directory=DATA_PLANE_DIR):
+    pointer = read_pointer(name, directory)
+    version = (pointer["version"] if pointer else 0) + 1
+    filename = f"{_plane_key(name)}.v{version}.feather"
+    os.makedirs(directory, exist_ok=True)
+    write_table(df, os.path.join(directory, filename))
+    write_json({
+        "version": version,
+        "file": filename,
+        "source": source,
+        "rows": int(len(df)),
+        "published_at": datetime.now(timezone.utc).isoformat(),
+    }, pointer_path(name, directory))
+
+    # Drop versions older than the last KEEP_VERSIONS. Readers that still
+    # map a removed file keep their pages (on Windows the removal fails and
+    # is retried on the next publish).
+    prefix = _plane_key(name) + ".v"
+    for entry in os.listdir(directory):
+        if entry.startswith(prefix) and entry.endswith(".feather"):
+            old_version = entry[len(prefix):-len(".feather")]
+            if old_version.isdigit() and int(old_version) <= version - KEEP_VERSIONS:
+                try:
+                    os.remove(os.path.join(directory, entry))
+                except OSError:
+                    pass
+    return version
+
+
+# Frame of the published version of a dataset, memory-mapped: the file's
+# pages are shared by every process on the machine, and numeric columns
+# without nulls are zero-copy views on them. Returns None when nothing
+# matching the dataset on disk (or the given source signature) is published.
+def attach(name, columns=None, directory=DATA_PLANE_DIR, source=None):
+    import pyarrow.feather as feather
+    pointer = read_pointer(name, directory)
+    source = source_signature(name) if source is None else source
+    if pointer is None or pointer.get("source") != source:
+        return None
+    try:
+        table = feather.read_table(os.path.join(directory, pointer["file"]), columns=columns, memory_map=True)
+    except OSError:
+        return None
+    return table.to_pandas(split_blocks=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish datasets to the shared data plane.")
+    parser.add_argument("datasets", nargs="+", help="Dataset names (partitioned store directory or file without extension)")
+    args = parser.parse_args()
+    for dataset in args.datasets:
+        version = publish(dataset)
+        print(f"Published {dataset} as version {version}" if version else f"{dataset} does not exist yet")
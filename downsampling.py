@@ -0,0 +1,112 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Target points per trace when the chart width is not known
+DEFAULT_POINTS = 1200
+
+# Downsampled index arrays kept between dashboard reruns, keyed on the
+# method, the threshold and a digest of the series
+INDEX_CACHE_SIZE = 512
+_index_cache = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+# Largest-Triangle-Three-Buckets: keeps the first and last point and, for each
+# bucket in between, the point forming the largest triangle with the previous
+# pick and the average of the next bucket. Preserves the visual shape of the
+# series with `threshold` points. Returns the positions of the kept points.
+def lttb_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _as_float(x)
+    y = _as_float(y)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+# Min/max buckets: keeps the lowest and highest point of each bucket (in time
+# order), so spikes survive. Returns the positions of the kept points.
+def minmax_indices(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    y = _as_float(y)
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(np.int64)
+    picks = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            bucket = y[start:end]
+            picks.extend((start + int(np.argmin(bucket)), start + int(np.argmax(bucket))))
+    return np.unique(np.array(picks, dtype=np.int64))
+
+
+METHODS = {
+    "lttb": lttb_indices,
+    "minmax": minmax_indices,
+}
+
+
+def _digest(values):
+    return hashlib.blake2b(np.ascontiguousarray(_as_float(values)).tobytes(), digest_size=16).digest()
+
+
+# Positions kept by METHODS[method] for the series. A Streamlit rerun plots
+# the same series again, so results are cached and only a changed series or
+# chart width pays for the bucket loop again.
+def downsample_indices(x, y, points=DEFAULT_POINTS, method="lttb"):
+    key = (method, points, len(x), _digest(x), _digest(y))
+    with _index_cache_lock:
+        indices = _index_cache.get(key)
+        if indices is not None:
+            _index_cache.move_to_end(key)
+            return indices
+    indices = METHODS[method](x, y, points)
+    indices.setflags(write=False)
+    with _index_cache_lock:
+        _index_cache[key] = indices
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return indices
+
+
+# Reduce x/y arrays (sorted by x) to about `points` points for plotting
+def downsample_arrays(x, y, points=DEFAULT_POINTS, method="lttb"):
+    if len(x) <= points:
+        return x, y
+    indices = downsample_indices(x, y, points, method)
+    return x[indices], y[indices]
+
+
+# Reduce a frame (sorted by x_column) to about `points` rows for plotting
+def downsample_frame(df, x_column, y_column, points=DEFAULT_POINTS, method="lttb"):
+    if len(df) <= points:
+        return df
+    indices = downsample_indices(df[x_column].to_numpy(), df[y_column].to_numpy(), points, method)
+    return df.iloc[indices]
@@ -1,116 +1,172 @@
+import sys
 import requests
 import pandas as pd
-import time
 from datetime import datetime
 
+from checkpoint import FetchCheckpoint
+from coingecko import fetch_concurrently, get_client
+from history import days_to_fetch
+from instrumentation import finish_run, format_summary, start_run, timed
+from partitioned_store import PartitionedStore, long_to_wide, wide_to_long
+from rolling import WINDOWS, update_rolling_stats
+from storage import dataset_path, read_dataset, write_dataset, write_dataset_meta, write_table
+from universe import discover_universe
+
 # Parameter: Number of top coins to fetch
 NUMBER_OF_COINS = 50
 
-# File path for storing data (Excel file)
-excel_file = "crypto_market_cap_history.xlsx"
+# Partitioned store (one directory per coin, one file per month) for the data
+history_dataset = "crypto_market_cap_history"
+store = PartitionedStore(history_dataset)
 
-# CoinGecko API endpoints
-COIN_MARKETS_ENDPOINT = "https://api.coingecko.com/api/v3/coins/markets"
-COIN_MARKET_CHART_ENDPOINT = "https://api.coingecko.com/api/v3/coins/{id}/market_chart"
+# Rolling moving averages, volatility and drawdown of every coin (rolling.py)
+rolling_dataset = "crypto_market_cap_rolling"
 
-# Parameters for fetching market data
-MARKET_PARAMS = {
+# Parameters for fetching historical market cap data
+CHART_PARAMS = {
     "vs_currency": "usd",
-    "order": "market_cap_desc",
-    "per_page": NUMBER_OF_COINS,
-    "page": 1,
-    "sparkline": "false"
+    "days": "365",      # Number of days to fetch (full refresh)
+    "interval": "daily" # Fetch daily data
 }
 
-# Fetch the top N coins by market capitalization from CoinGecko
-response = requests.get(COIN_MARKETS_ENDPOINT, params=MARKET_PARAMS)
-response.raise_for_status()
-
-top_coins_data = response.json()
-
-# Extract a list of coin IDs and names
-top_coin_ids = [coin["id"] for coin in top_coins_data]
-top_coin_names = {coin["id"]: coin["name"] for coin in top_coins_data}
-
-# Initialize a list to store DataFrames for each coin
-coin_data_frames = []
-
-# Fetch historical market cap data for each of the top N coins
-for coin_id in top_coin_ids:
-    # Get the human-readable coin name
-    coin_name = top_coin_names[coin_id]
-
-    # Fetch historical market cap data
-    try:
-        parameters = {
-            "vs_currency": "usd",
-            "days": "365",      # Number of days to fetch
-            "interval": "daily" # Fetch daily data
-        }
-
-        coin_chart_response = requests.get(COIN_MARKET_CHART_ENDPOINT.format(id=coin_id), params=parameters)
-        coin_chart_response.raise_for_status()
-
-        # Parse the JSON data from the response
-        chart_data = coin_chart_response.json()
-
-        # Check if 'market_caps' data is available and non-empty
-        if 'market_caps' in chart_data and chart_data['market_caps']:
-            timestamps = [entry[0] for entry in chart_data['market_caps']]
-            market_caps = [entry[1] for entry in chart_data['market_caps']]
-
-            # Create a DataFrame for this coin's market cap history
-            df = pd.DataFrame({
-                "Timestamp": pd.to_datetime(timestamps, unit='ms'),
-                "Market Cap (USD)": market_caps,
-                "Coin": coin_name
-            })
-
-            # Add this coin's DataFrame to the list
-            coin_data_frames.append(df)
-            print(f"Data collected for {coin_name}")
-        else:
+# Only fetch the days missing since the last run unless --full is passed
+FULL_REFRESH = "--full" in sys.argv
+
+# Also write an Excel copy of the data when --export-xlsx is passed
+EXPORT_FORMATS = ["xlsx"] if "--export-xlsx" in sys.argv else []
+
+# Timings and API counters of this run, printed and logged at the end
+# (see instrumentation.py)
+run = start_run("get_crypto_data")
+
+# Seed the store from the single-file history (xlsx/parquet) on the first run
+if not store.exists():
+    legacy_df = read_dataset(history_dataset)
+    if legacy_df is not None:
+        store.append(wide_to_long(legacy_df))
+        print(f"Imported the existing history into {history_dataset}/")
+
+# Rate-limited CoinGecko client shared by all requests in this run
+client = get_client()
+
+# Checkpoint of this run: each coin is saved as soon as it arrives, so a run
+# that dies halfway resumes with the coins that are still missing. Writes to
+# the store in between (a backfill, a metadata update) do not discard it:
+# re-appending the saved coins with replace_tail is idempotent.
+checkpoint = FetchCheckpoint("get_crypto_data", {
+    "number_of_coins": NUMBER_OF_COINS,
+    "chart_params": CHART_PARAMS,
+    "full_refresh": FULL_REFRESH,
+})
+
+# Fetch the top N coins by market capitalization from CoinGecko (paged
+# above 250 coins, and cached for the other jobs; see universe.py) as
+# [id, name] pairs. The list is saved in the checkpoint, so a resumed run
+# keeps the coins it started with even if the universe has changed since.
+def discover_top_coins():
+    return [[coin["id"], coin["name"]] for coin in discover_universe(NUMBER_OF_COINS, client=client)]
+
+with timed("universe"):
+    top_coins = checkpoint.plan(discover_top_coins)
+top_coin_ids = [coin_id for coin_id, _ in top_coins]
+top_coin_names = dict(top_coins)
+
+# Latest stored point per coin decides how many days each coin still needs
+latest_stored = {} if FULL_REFRESH else store.latest_timestamps()
+
+# Function to fetch the market cap history of a single coin
+def fetch_coin_history(coin_id):
+    params = dict(CHART_PARAMS)
+    params["days"] = str(days_to_fetch(latest_stored.get(top_coin_names[coin_id]), max_days=int(CHART_PARAMS["days"])))
+    # market_caps is decoded straight into numpy arrays
+    timestamps, market_caps = client.get_market_chart(coin_id, params)['market_caps']
+
+    # Check if 'market_caps' data is available and non-empty
+    if not len(timestamps):
+        return None
+
+    # Create a DataFrame for this coin's market cap history
+    return pd.DataFrame({
+        "Timestamp": timestamps,
+        "Market Cap (USD)": market_caps,
+        "Coin": top_coin_names[coin_id]
+    })
+
+pending_coin_ids = checkpoint.pending(top_coin_ids)
+if checkpoint.resumed:
+    print(f"Resuming the previous run: {len(top_coin_ids) - len(pending_coin_ids)} of {len(top_coin_ids)} coins already fetched")
+
+# Fetch historical market cap data for the pending coins concurrently. The
+# client's token bucket paces the requests, so no fixed sleep is needed.
+with timed("fetch"):
+    for coin_id, df, error in fetch_concurrently(fetch_coin_history, pending_coin_ids):
+        # Get the human-readable coin name
+        coin_name = top_coin_names[coin_id]
+
+        if isinstance(error, requests.exceptions.HTTPError):
+            print(f"HTTP error occurred for {coin_name}: {error}")
+        elif isinstance(error, requests.exceptions.RequestException):
+            print(f"Request error occurred for {coin_name}: {error}")
+        elif error is not None:
+            raise error
+        elif df is None:
             print(f"Market cap data not found or empty for {coin_name}")
+            checkpoint.save(coin_id)
+        else:
+            # Save this coin's DataFrame to the checkpoint
+            checkpoint.save(coin_id, df)
+            print(f"Data collected for {coin_name}")
 
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred for {coin_name}: {http_err}")
-    except requests.exceptions.RequestException as req_err:
-        print(f"Request error occurred for {coin_name}: {req_err}")
-
-    # Pause to respect API rate limits 
-    time.sleep(15)  # Adjust as necessary
+# DataFrames of every coin collected by this run (and the interrupted ones)
+coin_data_frames = [df for df in checkpoint.results().values() if df is not None]
 
-# Combine all coin DataFrames if any data was collected
+# Append the new rows to the store if any data was collected. Only the
+# coin/month partitions touched by the new rows are rewritten.
 if coin_data_frames:
-    full_df = pd.concat(coin_data_frames, ignore_index=True)
-    
-    # Sort the DataFrame by Coin name and Timestamp for clarity
-    full_df.sort_values(by=['Coin', 'Timestamp'], inplace=True)
-    full_df.reset_index(drop=True, inplace=True)
-    
-    # Pivot the DataFrame so that each coin's market cap is in its own column
-    pivot_df = full_df.pivot_table(
-        index="Timestamp",
-        columns="Coin",
-        values="Market Cap (USD)"
-    )
-
-    # Sort columns by coin name
-    pivot_df = pivot_df.reindex(sorted(pivot_df.columns), axis=1)
-
-    # Save data to an Excel file
-    with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-        pivot_df.to_excel(writer, sheet_name="Market Cap Data")
-
-    print(f"\nMarket cap data saved to {excel_file} in the sheet: 'Market Cap Data'")
+    new_df = pd.concat(coin_data_frames, ignore_index=True)
+    with timed("store"):
+        written = store.append(new_df, replace_tail=True)
+    # coin_ids is written with sorted keys, so the market cap order of the
+    # coins is kept in its own list (backfill.py takes its top coins from it)
+    store.update_metadata(universe=sorted(top_coin_names.values()), coin_ids=top_coin_names, ranked_coin_ids=top_coin_ids)
+    print(f"\nMarket cap data saved to {len(written)} partitions of {history_dataset}/")
+
+    # Summary the dashboard paints before loading the data
+    last_update = max(store.latest_timestamps().values())
+    write_dataset_meta(history_dataset, last_update=last_update.isoformat(), coins=len(top_coin_names))
+
+    # Update the rolling stats from the rows each coin's windows still need
+    # (its last stats row onwards plus one window before it); coins without
+    # stats yet need their whole history. The store's lock is held so a
+    # running backfill (backfill.py) does not rewrite them at the same time.
+    with store.locked():
+        rolling_df = None if FULL_REFRESH else read_dataset(rolling_dataset)
+        rolling_start = None
+        if rolling_df is not None and set(top_coin_names.values()) <= set(rolling_df["Coin"]):
+            rolling_start = rolling_df.groupby("Coin")["Timestamp"].max().min() - pd.Timedelta(days=max(WINDOWS) + 1)
+        with timed("rolling_stats"):
+            recent_df = store.read(coins=top_coin_names.values(), start=rolling_start)
+            rolling_df = update_rolling_stats(recent_df, rolling_df)
+        write_dataset(rolling_df, rolling_dataset)
+    print(f"Rolling stats saved to {rolling_dataset}")
+
+    # Optional Excel export of the full history in the sheet 'Market Cap Data'
+    for fmt in EXPORT_FORMATS:
+        pivot_df = long_to_wide(store.read(coins=top_coin_names.values()))
+        export_path = write_table(pivot_df, dataset_path(history_dataset, fmt), sheet_name="Market Cap Data")
+        print(f"Market cap data exported to {export_path}")
 
     # Confirm the data collected for each coin
-    coin_counts = full_df['Coin'].value_counts()
+    coin_counts = new_df['Coin'].value_counts()
     print("\nData rows for each coin:")
     print(coin_counts)
 else:
     print("No data was collected.")
 
+# The results are in the store now, so the next run starts from scratch
+checkpoint.clear()
+print(format_summary(finish_run(run)))
+
 
 # import requests
 # import pandas as pd
@@ -0,0 +1,99 @@
+import math
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# Longest window requested from market_chart when a coin has no stored history
+DEFAULT_HISTORY_DAYS = 365
+
+# Timestamp buckets a fetched series can be normalized to (pandas frequencies)
+TIMESTAMP_BUCKETS = {
+    "daily": "D",
+    "hourly": "h",
+}
+
+
+# Coins with their own columns in the stream_1 market cap table (CoinGecko
+# id -> column); they are excluded from the altcoin total
+CORE_COIN_COLUMNS = {
+    "bitcoin": "Bitcoin Market Cap",
+    "ethereum": "Ethereum Market Cap",
+    "tether": "USDT Market Cap",
+    "usd-coin": "USDC Market Cap",
+}
+STABLECOINS = ["tether", "usd-coin"]
+
+# Columns of the stream_1 table built from the fetched coins; the derived
+# columns (totals, dominance, stablecoin coverage) are declared in metrics.py
+BASE_COLUMNS = [
+    "Timestamp", "Bitcoin Market Cap", "Ethereum Market Cap", "USDT Market Cap",
+    "USDC Market Cap", "Stablecoin Total Market Cap", "Altcoins Market Cap"
+]
+
+
+# Latest stored Timestamp for each coin of a long (Timestamp, Coin, value) frame
+def latest_timestamps(long_df, coin_column="Coin"):
+    if long_df is None or long_df.empty:
+        return {}
+    return long_df.groupby(coin_column)["Timestamp"].max().to_dict()
+
+
+# Floor the Timestamp index of a series to the bucket and keep the last
+# (freshest) value of each bucket, so the series of different coins line up
+# exactly and the current, still-changing point is kept rather than dropped
+def normalize_series(series, bucket="daily"):
+    series = series.sort_index()
+    floored = series.index.floor(TIMESTAMP_BUCKETS[bucket])
+    keep = ~floored.duplicated(keep="last")
+    return pd.Series(series.to_numpy()[keep], index=floored[keep], name=series.name)
+
+
+# Align Timestamp-indexed series (one per coin) into a block with one column
+# per series, in a single concat; missing values count as zero
+def align_series(series_list):
+    return pd.concat(series_list, axis=1).sort_index().fillna(0)
+
+
+# Align every coin's series (normalized, keyed by CoinGecko id) on one
+# Timestamp index (a single concat instead of one merge per coin) and
+# compute the stablecoin and altcoin totals of the stream_1 table from that
+# block. Missing values count as zero.
+def build_market_cap_table(series_by_coin, altcoin_ids):
+    block = align_series([series_by_coin[coin_id] for coin_id in list(CORE_COIN_COLUMNS) + list(altcoin_ids)])
+
+    final_df = block[list(CORE_COIN_COLUMNS)].rename(columns=CORE_COIN_COLUMNS)
+    final_df["Stablecoin Total Market Cap"] = block[STABLECOINS].to_numpy().sum(axis=1)
+    final_df["Altcoins Market Cap"] = block[list(altcoin_ids)].to_numpy().sum(axis=1)
+    return final_df.reset_index()[BASE_COLUMNS]
+
+
+# Number of days to ask market_chart for so the window covers everything
+# after the latest stored point. The day containing the latest point is
+# requested again because CoinGecko keeps updating the current day's value.
+def days_to_fetch(latest_timestamp, now=None, max_days=DEFAULT_HISTORY_DAYS):
+    if latest_timestamp is None or pd.isna(latest_timestamp):
+        return max_days
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    missing_days = (pd.Timestamp(now) - pd.Timestamp(latest_timestamp)) / pd.Timedelta(days=1)
+    return int(min(max_days, max(1, math.ceil(missing_days) + 1)))
+
+
+# Merge freshly fetched rows into the stored history. The fetched window
+# replaces the stored tail of each coin (so the previous run's intraday point
+# is dropped), and everything older is kept, so history can grow beyond the
+# fetch window. Pass coin_column=None for wide frames with one row per Timestamp.
+def merge_history(existing_df, new_df, coin_column="Coin"):
+    if existing_df is None or existing_df.empty:
+        merged = new_df
+    elif new_df is None or new_df.empty:
+        merged = existing_df
+    else:
+        if coin_column is None:
+            keep = existing_df["Timestamp"] < new_df["Timestamp"].min()
+        else:
+            cutoffs = new_df.groupby(coin_column)["Timestamp"].min()
+            cutoff = existing_df[coin_column].map(cutoffs)
+            keep = cutoff.isna() | (existing_df["Timestamp"] < cutoff)
+        merged = pd.concat([existing_df[keep], new_df], ignore_index=True)
+    sort_columns = ["Timestamp"] if coin_column is None else [coin_column, "Timestamp"]
+    return merged.sort_values(sort_columns).reset_index(drop=True)
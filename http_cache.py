@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlencode
+
+from storage import atomic_write, write_json
+
+# Directory of the on-disk HTTP response cache, shared by every script in the
+# repository (an empty value disables the cache)
+HTTP_CACHE_DIR = os.environ.get(
+    "RACECAP_HTTP_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".http_cache")
+)
+
+# Seconds a cached response is served without asking the server, by URL path
+# pattern (first match wins). Live prices are never cached; past
+# /market_chart/range windows do not change.
+CACHE_TTLS = [
+    (r"/simple/price$", 0),
+    (r"/market_chart/range$", 7 * 24 * 3600),
+    (r"/market_chart$", 30 * 60),
+    (r"/coins/markets$", 10 * 60),
+]
+DEFAULT_TTL = 5 * 60
+
+# Expired entries are kept this long past their TTL, so they can still be
+# revalidated with a conditional request, then deleted. Writers prune the
+# directory at most once per PRUNE_INTERVAL seconds.
+STALE_GRACE = 24 * 3600
+PRUNE_INTERVAL = 10 * 60
+
+
+# Seconds a response for the URL path may be served from the cache
+def cache_ttl(url):
+    path = url.split("?", 1)[0]
+    for pattern, ttl in CACHE_TTLS:
+        if re.search(pattern, path):
+            return ttl
+    return DEFAULT_TTL
+
+
+# A cached response: body bytes plus the validators (ETag, Last-Modified)
+# used to revalidate it once its TTL has expired
+class CachedResponse:
+    def __init__(self, key, meta, content):
+        self.key = key
+        self.meta = meta
+        self.content = content
+
+    @property
+    def age(self):
+        return time.time() - self.meta["fetched_at"]
+
+    # Headers for a conditional request (empty if the server sent no validators)
+    def validators(self):
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+# On-disk response cache keyed by URL and query parameters. Each entry is a
+# body file plus a JSON metadata file, both written atomically, so a crash
+# mid-write never leaves a half-written entry behind. Entries older than
+# their TTL plus STALE_GRACE are pruned as new ones are written, so every
+# distinct days= or range URL does not stay on disk forever.
+class ResponseCache:
+    def __init__(self, directory=HTTP_CACHE_DIR, prune_interval=PRUNE_INTERVAL):
+        self.directory = directory
+        self.prune_interval = prune_interval
+        self.pruned_at = None
+        self.prune_lock = threading.Lock()
+
+    @staticmethod
+    def key(url, params=None):
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        return hashlib.sha256(f"{url}?{query}".encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".json", base + ".body"
+
+    # Cached entry for the request, or None
+    def get(self, url, params=None):
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if len(content) != meta.get("size"):
+            return None
+        return CachedResponse(key, meta, content)
+
+    # Store a successful response
+    def put(self, url, params, response):
+        key = self.key(url, params)
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+        def write_body(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(response.content)
+        atomic_write(body_path, write_body)
+        write_json({
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "size": len(response.content),
+        }, meta_path)
+        self._maybe_prune()
+
+    # Mark an entry as fresh again after a 304 Not Modified
+    def touch(self, entry):
+        meta_path, _ = self._paths(entry.key)
+        entry.meta["fetched_at"] = time.time()
+        write_json(entry.meta, meta_path)
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if not self.prune_lock.acquire(blocking=False):
+            return
+        try:
+            if self.pruned_at is None or now - self.pruned_at >= self.prune_interval:
+                self.pruned_at = now
+                self.prune()
+        finally:
+            self.prune_lock.release()
+
+    # Delete entries older than their TTL plus STALE_GRACE. Returns the
+    # number of entries deleted.
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        removed = 0
+        for directory, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                # Skip other files, and temporary files being written
+                if not filename.endswith(".json") or filename.startswith("."):
+                    continue
+                meta_path = os.path.join(directory, filename)
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    if now - meta["fetched_at"] <= cache_ttl(meta["url"]) + STALE_GRACE:
+                        continue
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                for path in (meta_path, meta_path[:-len(".json")] + ".body"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                removed += 1
+        return removed
@@ -0,0 +1,249 @@
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# JSON Lines log: one record (timings and counters) per fetcher run, and per
+# dashboard rerun while debugging. An empty value disables it. Once the log
+# grows past METRICS_LOG_MAX_BYTES it is moved to <log>.1 (replacing the
+# previous one) and a new log is started.
+METRICS_LOG = os.environ.get(
+    "RACECAP_METRICS_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "racecap_metrics.jsonl")
+)
+METRICS_LOG_MAX_BYTES = int(os.environ.get("RACECAP_METRICS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Optional profiler wrapped around every run: "cprofile" or "pyinstrument"
+# (falls back to cProfile when it is not installed); empty to disable.
+# Profiles are written to PROFILE_DIR, one file per run.
+PROFILER = os.environ.get("RACECAP_PROFILE", "").lower()
+PROFILE_DIR = os.environ.get(
+    "RACECAP_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".profiles")
+)
+
+# Show the dashboards' debug panel without ?debug=1 in the URL
+DEBUG_PANEL = os.environ.get("RACECAP_DEBUG", "") not in ("", "0")
+
+_local = threading.local()
+
+
+# Timings and counters of one run (a fetcher run, a dashboard rerun). A run
+# is active in the thread that started it, and in the workers of
+# fetch_concurrently; timed() and count() outside a run cost next to nothing.
+class Run:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.timings = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            total, calls, longest = self.timings.get(name, (0.0, 0, 0.0))
+            self.timings[name] = (total + seconds, calls + 1, max(longest, seconds))
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    # JSON-ready record of the run. Timings of nested stages overlap (a
+    # stage's time includes the stages it calls).
+    def summary(self):
+        with self.lock:
+            timings = {
+                name: {"seconds": round(total, 6), "calls": calls, "max": round(longest, 6)}
+                for name, (total, calls, longest) in self.timings.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration": round(time.perf_counter() - self.started, 6),
+            "pid": os.getpid(),
+            "timings": timings,
+            "counters": counters,
+        }
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+def _activate(run):
+    previous = current_run()
+    _local.run = run
+    return previous
+
+
+# Start a run in this thread and the optional profiler. A previous run of
+# the thread that was never finished (a dashboard rerun that ended with
+# st.stop()) is finished first, without a log record.
+def start_run(name):
+    previous = current_run()
+    if previous is not None:
+        finish_run(previous, log_path=None)
+    run = Run(name)
+    _activate(run)
+    if PROFILER:
+        run.profiler = _start_profiler()
+    return run
+
+
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; profiling with cProfile instead")
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as error:
+        print(f"Profiling disabled for this run: {error}")
+        return None
+    return profiler
+
+
+def _save_profile(run):
+    profiler, run.profiler = run.profiler, None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{run.name}-{run.started_at:%Y%m%dT%H%M%S}-{os.getpid()}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path = stem + ".prof"
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = stem + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+
+# End a run: stop the profiler, append the run's record to the JSON log and
+# return the record
+def finish_run(run, log_path=METRICS_LOG):
+    if run.profiler is not None:
+        run.count("profile_saved")
+        print(f"Profile of {run.name} saved to {_save_profile(run)}")
+    if current_run() is run:
+        _local.run = None
+    summary = run.summary()
+    if log_path:
+        try:
+            _rotate_log(log_path)
+            with open(log_path, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+        except OSError as error:
+            print(f"Could not write the metrics log {log_path}: {error}")
+    return summary
+
+
+def _rotate_log(log_path):
+    try:
+        if os.path.getsize(log_path) < METRICS_LOG_MAX_BYTES:
+            return
+        os.replace(log_path, log_path + ".1")
+    except FileNotFoundError:
+        pass  # no log yet, or another process just rotated it
+
+
+# Time a block under `name` in the active run
+@contextmanager
+def timed(name):
+    run = current_run()
+    if run is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_time(name, time.perf_counter() - started)
+
+
+# Decorator form of timed(); the name defaults to the function's name
+def instrumented(name=None):
+    def decorate(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Add to a counter of the active run
+def count(name, value=1):
+    run = current_run()
+    if run is not None:
+        run.count(name, value)
+
+
+# Wrap a function so it records into the caller's run when it is called
+# from a worker thread
+def in_current_run(function):
+    run = current_run()
+    if run is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = _activate(run)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.run = previous
+    return wrapper
+
+
+# One-line summary of a run for the fetchers' output
+def format_summary(summary):
+    counters = ", ".join(f"{name}={value}" for name, value in sorted(summary["counters"].items()))
+    timings = ", ".join(f"{name} {timing['seconds']:.2f}s" for name, timing in summary["timings"].items())
+    return f"{summary['run']} took {summary['duration']:.2f}s ({timings}) [{counters}]"
+
+
+def _debug_requested(st):
+    if DEBUG_PANEL:
+        return True
+    if hasattr(st, "query_params"):
+        value = st.query_params.get("debug")
+    else:
+        value = (st.experimental_get_query_params().get("debug") or [None])[0]
+    return value not in (None, "", "0", "false")
+
+
+# Finish a dashboard run and, when the page was opened with ?debug=1 (or
+# RACECAP_DEBUG is set), log it and show its timings and counters in the
+# sidebar. Reruns without debugging are not logged, so the log does not
+# grow with every session's traffic.
+def show_debug_panel(run):
+    import streamlit as st
+    debug = _debug_requested(st)
+    summary = finish_run(run, log_path=METRICS_LOG if debug else None)
+    if not debug:
+        return
+    with st.sidebar.expander("Debug: timings", expanded=True):
+        st.caption(f"Rerun took {summary['duration'] * 1000:.0f} ms")
+        rows = [
+            {"stage": name, "ms": timing["seconds"] * 1000, "calls": timing["calls"], "max ms": timing["max"] * 1000}
+            for name, timing in sorted(summary["timings"].items(), key=lambda item: -item[1]["seconds"])
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+        st.json(summary["counters"])
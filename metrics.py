@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from rolling import WINDOWS, RollingStats, rolling_stats, rows_per_day
+
+
+# A derived metric: a formula over the base columns of a Timestamp-sorted
+# frame. Pointwise formulas (sums, ratios) only need the row itself;
+# windowed ones (rolling stats) need the `lookback` rows before it.
+# formula(df) returns one value per row of df, or, when name is a list of
+# column names, one row of values per row of df.
+class Metric:
+    def __init__(self, name, formula, lookback=0):
+        self.name = name
+        self.names = [name] if isinstance(name, str) else list(name)
+        self.formula = formula
+        self.lookback = lookback
+
+
+# Values of a column, or the row-wise sum of several columns
+def _total(df, columns):
+    if isinstance(columns, str):
+        return df[columns].to_numpy(dtype=np.float64)
+    return sum(df[column].to_numpy(dtype=np.float64) for column in columns)
+
+
+# Sum of one or more columns
+def total(name, columns):
+    return Metric(name, lambda df: _total(df, columns))
+
+
+# numerator / denominator * scale, each side a column or a list of columns
+def ratio(name, numerator, denominator, scale=100):
+    def formula(df):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return _total(df, numerator) / _total(df, denominator) * scale
+    return Metric(name, formula)
+
+
+# Rolling moving average, volatility and drawdown of a column (see
+# rolling.py) for every window, computed in one O(1)-per-row pass over a
+# frame with one row per `bucket`
+def rolling(column, windows=WINDOWS, bucket="daily"):
+    return Metric(
+        RollingStats(windows, bucket).columns(column),
+        lambda df: rolling_stats(df[column].to_numpy(dtype=np.float64), windows, bucket),
+        lookback=max(windows) * rows_per_day(bucket)
+    )
+
+
+# Fill in the metric columns of a Timestamp-sorted frame. Rows before
+# `first_new` already hold their metric values and are kept; only the rows
+# from first_new on are computed, each metric reading just its lookback
+# before them. Metrics the frame does not have yet are computed for every
+# row. Metrics are applied in order, so later ones can use earlier ones.
+def apply_metrics(df, metrics, first_new=0):
+    df = df.copy()
+    for metric in metrics:
+        start = first_new if all(name in df.columns for name in metric.names) else 0
+        if start >= len(df):
+            continue
+        window_start = max(0, start - metric.lookback)
+        values = np.asarray(metric.formula(df.iloc[window_start:]), dtype=np.float64)
+        values = values.reshape(len(df) - window_start, len(metric.names))
+        for position, name in enumerate(metric.names):
+            if name in df.columns and start > 0:
+                column = df[name].to_numpy(dtype=np.float64, copy=True)
+            else:
+                column = np.full(len(df), np.nan)
+            column[start:] = values[start - window_start:, position]
+            df[name] = column
+    return df
+
+
+# Column names of a list of metrics
+def metric_columns(metrics):
+    return [name for metric in metrics for name in metric.names]
+
+
+# Position of the first row at or after `timestamp` in a Timestamp-sorted frame
+def first_row_after(df, timestamp):
+    return int(pd.Index(df["Timestamp"]).searchsorted(timestamp, side="left"))
+
+
+# Metrics stored with the stream_1 history: totals and dominance excluding
+# stablecoins, how much stablecoin liquidity backs each market segment, and
+# the rolling stats of those coverage ratios, with windows sized for the
+# history's timestamp bucket
+def market_cap_metrics(bucket="daily"):
+    return [
+        total("Total Market Cap Excluding Stablecoins",
+              ["Bitcoin Market Cap", "Ethereum Market Cap", "Altcoins Market Cap"]),
+        ratio("Bitcoin Dominance (%)", "Bitcoin Market Cap", "Total Market Cap Excluding Stablecoins"),
+        ratio("Ethereum Dominance (%)", "Ethereum Market Cap", "Total Market Cap Excluding Stablecoins"),
+        ratio("Stablecoin Backup (Bitcoin)", "Stablecoin Total Market Cap", "Bitcoin Market Cap"),
+        ratio("Stablecoin Backup (Altcoins + Ethereum)", "Stablecoin Total Market Cap",
+              ["Ethereum Market Cap", "Altcoins Market Cap"]),
+        ratio("Stablecoin Backup (Bitcoin + Altcoins + Ethereum)", "Stablecoin Total Market Cap",
+              ["Bitcoin Market Cap", "Ethereum Market Cap", "Altcoins Market Cap"]),
+        rolling("Stablecoin Backup (Bitcoin)", bucket=bucket),
+        rolling("Stablecoin Backup (Altcoins + Ethereum)", bucket=bucket),
+        rolling("Stablecoin Backup (Bitcoin + Altcoins + Ethereum)", bucket=bucket),
+    ]
+
+
+# Metrics of the daily history, read by the dashboards and the API
+MARKET_CAP_METRICS = market_cap_metrics()
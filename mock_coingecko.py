@@ -0,0 +1,195 @@
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DAY_MS = 86400 * 1000
+
+# Core coins listed first, as on CoinGecko, followed by synthetic ones
+CORE_COINS = [
+    ("bitcoin", "Bitcoin"),
+    ("ethereum", "Ethereum"),
+    ("tether", "Tether"),
+    ("usd-coin", "USDC"),
+]
+
+
+# id and name of the i-th coin of the synthetic universe
+def coin_at(index):
+    if index < len(CORE_COINS):
+        return CORE_COINS[index]
+    return f"coin-{index}", f"Coin {index}"
+
+
+# Position of a coin in the synthetic universe, or None for ids it does not
+# know
+def coin_index(coin_id):
+    for index, (core_id, _) in enumerate(CORE_COINS):
+        if coin_id == core_id:
+            return index
+    prefix, _, number = coin_id.rpartition("-")
+    if prefix != "coin" or not number.isdigit() or int(number) < len(CORE_COINS):
+        return None
+    return int(number)
+
+
+# Deterministic synthetic market cap series of a coin: a random walk around
+# a size that decreases with rank
+def market_caps(index, timestamps_ms):
+    rng = np.random.default_rng(index)
+    days = (np.asarray(timestamps_ms) // DAY_MS).astype(np.int64)
+    steps = rng.normal(0, 0.03, 4096)
+    walk = np.cumsum(steps)[days % 4096]
+    return 1e12 / (index + 1) * np.exp(walk)
+
+
+# market_chart payload for `days` daily points ending at end_ms (plus the
+# current, intraday point, as CoinGecko returns it)
+def market_chart_payload(index, days, end_ms=None):
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    midnight = end_ms - end_ms % DAY_MS
+    timestamps = [midnight - DAY_MS * k for k in range(days - 1, -1, -1)]
+    if end_ms != midnight:
+        timestamps.append(end_ms)
+    return range_payload(index, timestamps)
+
+
+def range_payload(index, timestamps):
+    caps = market_caps(index, timestamps)
+    return {
+        "prices": [[t, c / 1e7] for t, c in zip(timestamps, caps)],
+        "market_caps": [[t, c] for t, c in zip(timestamps, caps)],
+        "total_volumes": [[t, c / 20] for t, c in zip(timestamps, caps)],
+    }
+
+
+# Local stand-in for the CoinGecko endpoints used by the fetchers: a
+# universe of `coins` coins with synthetic histories. Responses carry an
+# ETag (conditional requests get a 304), and the first `rate_limited`
+# requests get a 429 with Retry-After, to exercise the client's backoff.
+class MockCoinGecko:
+    def __init__(self, coins=1000, rate_limited=0, host="127.0.0.1", port=0):
+        self.coins = coins
+        self.rate_limited = rate_limited
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v3"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Coins outside the universe get a 404, as unknown ids do on CoinGecko
+    def known(self, coin_id):
+        index = coin_index(coin_id)
+        return index is not None and index < self.coins
+
+    def respond(self, path, query):
+        if path.endswith("/coins/markets"):
+            per_page = int(query.get("per_page", ["100"])[0])
+            page = int(query.get("page", ["1"])[0])
+            start = (page - 1) * per_page
+            return [
+                dict(zip(["id", "name"], coin_at(i)), symbol=coin_at(i)[0][:4],
+                     market_cap=float(market_caps(i, [time.time() * 1000])[0]), market_cap_rank=i + 1)
+                for i in range(start, min(start + per_page, self.coins))
+            ]
+        if path.endswith("/market_chart/range"):
+            coin_id = path.split("/")[-3]
+            if not self.known(coin_id):
+                return None
+            index = coin_index(coin_id)
+            start_ms = int(float(query["from"][0]) * 1000)
+            end_ms = int(float(query["to"][0]) * 1000)
+            first = start_ms - start_ms % DAY_MS + (DAY_MS if start_ms % DAY_MS else 0)
+            return range_payload(index, list(range(first, end_ms + 1, DAY_MS)))
+        if path.endswith("/market_chart"):
+            coin_id = path.split("/")[-2]
+            if not self.known(coin_id):
+                return None
+            index = coin_index(coin_id)
+            days = query.get("days", ["365"])[0]
+            return market_chart_payload(index, 3650 if days == "max" else int(days))
+        if path.endswith("/simple/price"):
+            now = time.time() * 1000
+            quotes = {}
+            for coin_id in query["ids"][0].split(","):
+                if not self.known(coin_id):
+                    continue
+                cap = float(market_caps(coin_index(coin_id), [now])[0])
+                quotes[coin_id] = {"usd": cap / 1e7, "usd_market_cap": cap}
+            return quotes
+        return None
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with mock.lock:
+                    mock.requests += 1
+                    limited = mock.requests <= mock.rate_limited
+                if limited:
+                    return self._send(429, headers=[("Retry-After", "1")])
+                url = urlparse(self.path)
+                try:
+                    data = mock.respond(url.path, parse_qs(url.query))
+                except (KeyError, ValueError, IndexError):
+                    return self._send(400)
+                if data is None:
+                    return self._send(404)
+                body = json.dumps(data).encode()
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self._send(304, headers=[("ETag", etag)])
+                self._send(200, body, [("Content-Type", "application/json"), ("ETag", etag)])
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local mock of the CoinGecko API (point COINGECKO_API_URL at it).")
+    parser.add_argument("--coins", type=int, default=1000, help="Size of the synthetic coin universe")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    mock = MockCoinGecko(coins=args.coins, port=args.port)
+    print(f"Mock CoinGecko API on {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from storage import BACKENDS, STORAGE_FORMAT, read_table, write_json, write_table
+
+MANIFEST_FILE = "manifest.json"
+
+# Lock file taken while a writer updates the store (see PartitionedStore.locked)
+LOCK_FILE = ".lock"
+
+# Locks held by this thread: store root -> (open lock file, depth)
+_held = threading.local()
+
+# Partition period formats
+PARTITION_FORMATS = {
+    "month": "%Y-%m",
+    "day": "%Y-%m-%d",
+}
+
+
+# Directory-safe name for a coin ("Bitcoin Cash" -> "Bitcoin_Cash")
+def partition_slug(coin):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(coin)).strip("_") or "_"
+
+
+# Long-format (Timestamp, Coin, values...) time-series store partitioned by
+# coin and month (or day, for high-frequency data):
+#
+#     <root>/<coin>/<YYYY-MM>.parquet
+#     <root>/manifest.json
+#
+# Appending rows only rewrites the partitions they fall into. Every file,
+# including the manifest, is written to a temporary file and renamed into
+# place, so concurrent readers never see a half-written partition. The
+# manifest records each partition's row count and time range, plus a version
+# number that increases with every commit. Writers (the daily fetcher, the
+# backfill, the spot price ingestor's daily rollup) hold an exclusive file lock while they
+# read, change and commit the manifest, so concurrent writers never drop
+# each other's partitions.
+class PartitionedStore:
+    def __init__(self, root, fmt=None, partition_by="month"):
+        self.root = root
+        self.extension = BACKENDS[fmt or STORAGE_FORMAT].extension
+        self.period_format = PARTITION_FORMATS[partition_by]
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.lock_path = os.path.join(root, LOCK_FILE)
+
+    # Exclusive lock on the store, shared with other processes and threads.
+    # Blocks until the lock is free; re-entrant within a thread, so callers
+    # can hold it around several appends and their own derived datasets.
+    @contextmanager
+    def locked(self):
+        if not hasattr(_held, "locks"):
+            _held.locks = {}
+        held = _held.locks
+        key = os.path.abspath(self.root)
+        if key in held:
+            lock_file, depth = held[key]
+            held[key] = (lock_file, depth + 1)
+            try:
+                yield
+            finally:
+                held[key] = (lock_file, depth)
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        time.sleep(1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            held[key] = (lock_file, 1)
+            try:
+                yield
+            finally:
+                del held[key]
+        finally:
+            lock_file.close()
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def load_manifest(self):
+        if not self.exists():
+            return {"version": 0, "coins": {}, "partitions": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    @property
+    def version(self):
+        return self.load_manifest()["version"]
+
+    def partition_path(self, key):
+        return os.path.join(self.root, key + self.extension)
+
+    # Append rows to the store. Rows with the same coin and Timestamp as a
+    # stored row replace it. With replace_tail=True the new rows also replace
+    # every stored row of the coin from their first Timestamp on (used when a
+    # refetched window supersedes the previous run's intraday point).
+    # Returns the partition keys that were written.
+    def append(self, df, replace_tail=False):
+        if df is None or df.empty:
+            return []
+        with self.locked():
+            return self._append(df, replace_tail)
+
+    def _append(self, df, replace_tail):
+        manifest = self.load_manifest()
+        df = df.copy()
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        periods = df["Timestamp"].dt.strftime(self.period_format)
+        first_new = df.groupby("Coin")["Timestamp"].min()
+
+        written = []
+        for (coin, period), rows in df.groupby([df["Coin"], periods], sort=False):
+            slug = partition_slug(coin)
+            key = f"{slug}/{period}"
+            path = self.partition_path(key)
+            if key in manifest["partitions"] and os.path.exists(path):
+                stored = read_table(path)
+                stored = stored[~stored["Timestamp"].isin(rows["Timestamp"])]
+                if replace_tail:
+                    stored = stored[stored["Timestamp"] < first_new[coin]]
+                rows = pd.concat([stored, rows], ignore_index=True)
+            rows = rows.drop_duplicates(subset=["Timestamp"], keep="last").sort_values("Timestamp")
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_table(rows.reset_index(drop=True), path)
+            manifest["coins"][slug] = coin
+            manifest["partitions"][key] = {
+                "coin": coin,
+                "period": period,
+                "rows": int(len(rows)),
+                "start": rows["Timestamp"].iloc[0].isoformat(),
+                "end": rows["Timestamp"].iloc[-1].isoformat(),
+            }
+            written.append(key)
+
+        self._commit(manifest)
+        return written
+
+    # Store small dataset-level facts (e.g. the current coin universe) in the manifest
+    def update_metadata(self, **fields):
+        with self.locked():
+            manifest = self.load_manifest()
+            manifest.setdefault("metadata", {}).update(fields)
+            self._commit(manifest)
+
+    def metadata(self):
+        return self.load_manifest().get("metadata", {})
+
+    def _commit(self, manifest):
+        manifest["version"] += 1
+        manifest["updated"] = datetime.now(timezone.utc).isoformat()
+        os.makedirs(self.root, exist_ok=True)
+        write_json(manifest, self.manifest_path)
+
+    # Partition keys matching the coin / time filters, using only the manifest
+    def partitions(self, coins=None, start=None, end=None):
+        manifest = self.load_manifest()
+        coins = None if coins is None else set(coins)
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        keys = []
+        for key, info in sorted(manifest["partitions"].items()):
+            if coins is not None and info["coin"] not in coins:
+                continue
+            if start is not None and pd.Timestamp(info["end"]) < start:
+                continue
+            if end is not None and pd.Timestamp(info["start"]) > end:
+                continue
+            keys.append(key)
+        return keys
+
+    # Read rows for the given coins and time range as one long frame
+    def read(self, coins=None, start=None, end=None, columns=None):
+        if columns is not None:
+            columns = list(dict.fromkeys(["Timestamp", "Coin"] + list(columns)))
+        frames = [read_table(self.partition_path(key), columns=columns)
+                  for key in self.partitions(coins, start, end)]
+        if not frames:
+            return pd.DataFrame(columns=columns or ["Timestamp", "Coin"])
+        df = pd.concat(frames, ignore_index=True)
+        if start is not None:
+            df = df[df["Timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["Timestamp"] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+    # Latest stored Timestamp for each coin, read from the manifest alone
+    def latest_timestamps(self):
+        latest = {}
+        for info in self.load_manifest()["partitions"].values():
+            end = pd.Timestamp(info["end"])
+            if info["coin"] not in latest or end > latest[info["coin"]]:
+                latest[info["coin"]] = end
+        return latest
+
+    # Earliest stored Timestamp for each coin, read from the manifest alone
+    def earliest_timestamps(self):
+        earliest = {}
+        for info in self.load_manifest()["partitions"].values():
+            start = pd.Timestamp(info["start"])
+            if info["coin"] not in earliest or start < earliest[info["coin"]]:
+                earliest[info["coin"]] = start
+        return earliest
+
+
+# Convert a wide (Timestamp + one column per coin) frame to long format.
+# A frame that is already long (it has a Coin column, like the legacy
+# crypto_market_cap_history.csv) is returned as is.
+def wide_to_long(wide_df, value_name="Market Cap (USD)"):
+    if "Coin" in wide_df.columns:
+        return wide_df.dropna(subset=[value_name])
+    long_df = wide_df.melt(id_vars=["Timestamp"], var_name="Coin", value_name=value_name)
+    return long_df.dropna(subset=[value_name])
+
+
+# Pivot a long frame back to the wide layout used by the Excel export
+def long_to_wide(long_df, value_name="Market Cap (USD)"):
+    wide_df = long_df.pivot_table(index="Timestamp", columns="Coin", values=value_name)
+    wide_df = wide_df.reindex(sorted(wide_df.columns), axis=1)
+    wide_df.columns.name = None
+    return wide_df.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a stored history file into a partitioned store.")
+    parser.add_argument("source", help="Existing history file (.xlsx, .csv, .parquet or .feather)")
+    parser.add_argument("root", help="Directory of the partitioned store")
+    parser.add_argument("--wide", action="store_true", help="Source has one column per coin")
+    args = parser.parse_args()
+
+    source_df = read_table(args.source)
+    if args.wide:
+        source_df = wide_to_long(source_df)
+    written = PartitionedStore(args.root).append(source_df)
+    print(f"Imported {len(source_df)} rows from {args.source} into {len(written)} partitions of {args.root}")
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+# Long (Timestamp, Coin, value) history ordered by rank then Timestamp:
+# coins are ranked by their latest value and Coin is stored as an ordered
+# categorical in that order. This is the layout RankingIndex works on; the
+# refresher publishes it to the shared data plane (data_loader.py) so the
+# dashboards map it instead of each sorting its own copy.
+def rank_frame(long_df, value_column="Market Cap (USD)"):
+    df = long_df.sort_values(["Coin", "Timestamp"], kind="stable")
+    latest = df.drop_duplicates("Coin", keep="last")
+    coins = latest.sort_values(value_column, ascending=False, kind="stable")["Coin"].tolist()
+    coin_dtype = pd.CategoricalDtype(categories=coins, ordered=True)
+    frame = df.assign(Coin=df["Coin"].astype(coin_dtype))
+    return frame.sort_values(["Coin", "Timestamp"], kind="stable").reset_index(drop=True)
+
+
+# Row ranges of each category code in a frame sorted by its categorical Coin
+def _offsets(frame, coins):
+    codes = frame["Coin"].cat.codes.to_numpy()
+    return np.searchsorted(codes, np.arange(len(coins) + 1))
+
+
+# Coin (and Category) of a few rows as plain strings
+def _plain(df):
+    return df.astype({column: object for column in ("Coin", "Category")
+                      if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype)})
+
+
+# Ranking index over a long (Timestamp, Coin, value) history, built once per
+# data load. Coins are ranked by their latest value and the start/end row of
+# every coin is kept, so top-N lookups, legend ordering and per-coin slices
+# cost O(coins) instead of a scan over the whole frame.
+#
+# With presorted=True, long_df must already be laid out by rank_frame (for
+# instance mapped from the data plane) and is used as is, without a copy.
+# ticks are intraday rows newer than the history: they are kept apart from
+# the frame, count for the ranking and are appended to the coins' rows when
+# they are selected.
+class RankingIndex:
+    def __init__(self, long_df, value_column="Market Cap (USD)", presorted=False, ticks=None):
+        self.value_column = value_column
+        self.frame = long_df if presorted else rank_frame(long_df, value_column)
+        coin_dtype = self.frame["Coin"].dtype
+        self.blocks = {coin: code for code, coin in enumerate(coin_dtype.categories)}
+        self.offsets = _offsets(self.frame, self.blocks)
+
+        # Latest row per coin: the last row of each coin's block
+        ends = self.offsets[1:]
+        latest = _plain(self.frame.iloc[ends[ends > self.offsets[:-1]] - 1])
+
+        # Ticks newer than each coin's latest stored row, in the frame's layout
+        self.ticks = self.frame.iloc[0:0]
+        if ticks is not None and not ticks.empty and not latest.empty:
+            stored = latest.set_index("Coin")
+            cutoff = ticks["Coin"].map(stored["Timestamp"])
+            ticks = ticks[cutoff.notna() & (ticks["Timestamp"] > cutoff)].dropna(subset=[value_column])
+            if "Category" in self.frame.columns:
+                ticks = ticks.assign(Category=ticks["Coin"].map(stored["Category"]))
+            ticks = ticks.assign(Coin=ticks["Coin"].astype(coin_dtype))[self.frame.columns]
+            self.ticks = ticks.astype(self.frame.dtypes.to_dict()).sort_values(["Coin", "Timestamp"], kind="stable").reset_index(drop=True)
+            latest = pd.concat([latest, _plain(self.ticks.drop_duplicates("Coin", keep="last"))])
+            latest = latest.drop_duplicates("Coin", keep="last")
+        self.tick_offsets = _offsets(self.ticks, self.blocks)
+
+        latest = latest.sort_values(value_column, ascending=False, kind="stable")
+        self.coins = latest["Coin"].tolist()
+        self.ranks = {coin: rank for rank, coin in enumerate(self.coins, start=1)}
+        self.latest = latest.assign(Rank=np.arange(1, len(latest) + 1)).set_index("Coin", drop=False)
+
+    @property
+    def empty(self):
+        return not self.coins
+
+    @property
+    def last_update(self):
+        return self.latest["Timestamp"].max() if self.coins else None
+
+    # The n coins with the largest latest value, in rank order
+    def top(self, n):
+        return self.coins[:n]
+
+    # Sort coins by rank (unknown coins are dropped)
+    def order(self, coins):
+        return sorted((coin for coin in coins if coin in self.ranks), key=self.ranks.get)
+
+    # Coins (of the given subset) whose latest row has one of the categories
+    def coins_in_categories(self, categories, coins=None):
+        latest = self.latest if coins is None else self.latest.loc[self.order(coins)]
+        return latest.index[latest["Category"].isin(categories)].tolist()
+
+    # Rows of a single coin, sorted by Timestamp
+    def rows(self, coin):
+        code = self.blocks[coin]
+        rows = self.frame.iloc[self.offsets[code]:self.offsets[code + 1]]
+        if self.tick_offsets[code] == self.tick_offsets[code + 1]:
+            return rows
+        ticks = self.ticks.iloc[self.tick_offsets[code]:self.tick_offsets[code + 1]]
+        return pd.concat([rows, ticks], ignore_index=True)
+
+    # Rows of the given coins, in rank order, without scanning the frame
+    def select(self, coins):
+        codes = [self.blocks[coin] for coin in self.order(coins)]
+        if not codes:
+            return self.frame.iloc[0:0]
+        if self.ticks.empty:
+            positions = np.concatenate([np.arange(self.offsets[code], self.offsets[code + 1]) for code in codes])
+            return self.frame.iloc[positions]
+        return pd.concat([self.rows(coin) for coin in self.order(coins)], ignore_index=True)
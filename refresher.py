@@ -0,0 +1,254 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Repository root (jobs run their scripts relative to it)
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Lock file that keeps a second refresher from writing at the same time
+LOCK_FILE = os.environ.get("RACECAP_REFRESHER_LOCK", os.path.join(ROOT_DIR, "refresher.lock"))
+
+# Retry policy for failed job runs: exponential backoff plus random jitter
+MAX_ATTEMPTS = 4
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 15 * 60
+
+
+# Minimal cron schedule: "minute hour day-of-month month day-of-week", each
+# field being *, */n, a value, a range a-b (optionally /n) or a comma list.
+# Day of week uses 0 = Sunday.
+class CronSchedule:
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        # As in standard cron, a day field starting with * (including */n)
+        # does not count as restricted for the day-of-month / day-of-week rule
+        self.any_day = fields[2].startswith("*")
+        self.any_weekday = fields[4].startswith("*")
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step = part.split("/")
+                step = int(step)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-"))
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    # First matching minute strictly after dt
+    def next_after(self, dt):
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+# Datasets the dashboards read through the shared data plane
+# (data_plane.py), relative to ROOT_DIR
+SHARED_DATASETS = {
+    "get_crypto_data.py": ["crypto_market_cap_history", "crypto_market_cap_rolling"],
+    os.path.join("stream_1", "get_crypto_data.py"): [os.path.join("stream_1", "crypto_market_cap_history")],
+}
+
+# Histories whose ranked view (the frame behind the dashboards' ranking
+# index, see data_loader.publish_ranked_view) is published with them, and
+# their categories file
+RANKED_DATASETS = {
+    "crypto_market_cap_history": "crypto_categories.xlsx",
+}
+
+
+# Publish datasets to the shared data plane, so every dashboard worker maps
+# the new version instead of reading its own copy
+def publish_datasets(datasets):
+    from data_loader import publish_ranked_view
+    from data_plane import publish
+    for dataset in datasets:
+        version = publish(os.path.join(ROOT_DIR, dataset))
+        if version is not None:
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Published {dataset} (version {version})")
+        if dataset in RANKED_DATASETS:
+            categories_path = os.path.join(ROOT_DIR, RANKED_DATASETS[dataset])
+            version = publish_ranked_view(os.path.join(ROOT_DIR, dataset), categories_path)
+            if version is not None:
+                print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Published the ranked view of {dataset} (version {version})")
+
+
+# Job that runs a fetcher script in its own directory, as it would be run by
+# hand, then publishes the datasets it wrote
+def script_job(script, *args):
+    path = os.path.join(ROOT_DIR, script)
+
+    def run():
+        subprocess.run([sys.executable, path] + list(args), cwd=os.path.dirname(path), check=True)
+        publish_datasets(SHARED_DATASETS.get(script, []))
+    return run
+
+
+# Job that polls live spot prices for every tracked coin. The ingestor (and
+# its in-memory ring buffers) lives for the whole refresher process.
+_spot_ingestor = None
+
+
+def spot_prices_job():
+    global _spot_ingestor
+    from spot_prices import SpotPriceIngestor, bitcoin_store, catch_up_bitcoin_store, seed_bitcoin_store, tracked_coins
+    coins = tracked_coins(os.path.join(ROOT_DIR, "crypto_market_cap_history"))
+    if _spot_ingestor is None:
+        store = bitcoin_store(ROOT_DIR)
+        seed_bitcoin_store(store, root=ROOT_DIR)
+        catch_up_bitcoin_store(store)
+        _spot_ingestor = SpotPriceIngestor(coins, root=ROOT_DIR)
+    else:
+        _spot_ingestor.coin_names = coins
+    _spot_ingestor.poll_once()
+
+
+# Write the ticks the ingestor has buffered since its last flush (it only
+# flushes every few polls), so a run with --once or a stopped refresher
+# does not lose them
+def flush_spot_prices():
+    if _spot_ingestor is not None:
+        _spot_ingestor.flush()
+
+
+# name -> (cron schedule, job, uses the CoinGecko history budget)
+# History jobs share a lock so their bursts never overlap.
+JOBS = {
+    "daily_history": ("15 0 * * *", script_job("get_crypto_data.py"), True),
+    "stream_1_history": ("45 0 * * *", script_job(os.path.join("stream_1", "get_crypto_data.py")), True),
+    "spot_prices": ("* * * * *", spot_prices_job, False),
+}
+
+_history_lock = threading.Lock()
+
+
+# Run a job, retrying failures with jittered exponential backoff
+def run_with_retries(name, job, sleep=time.sleep):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            job()
+            return True
+        except Exception as error:
+            if attempt == MAX_ATTEMPTS:
+                print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {name} failed after {attempt} attempts: {error}")
+                return False
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            delay += random.uniform(0, delay / 2)
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {name} failed ({error}); retrying in {delay:.0f}s")
+            sleep(delay)
+
+
+# Loop of one job: wait for its next scheduled minute, then run it
+def run_schedule(name, cron, job, uses_history_budget, stop_event):
+    schedule = CronSchedule(cron)
+    while not stop_event.is_set():
+        next_run = schedule.next_after(datetime.now())
+        if stop_event.wait(max(0.0, (next_run - datetime.now()).total_seconds())):
+            return
+        print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Running {name}")
+        if uses_history_budget:
+            with _history_lock:
+                run_with_retries(name, job)
+        else:
+            run_with_retries(name, job)
+
+
+# Exclusive, non-blocking lock on the lock file; returns the open file or None
+def acquire_lock(path=LOCK_FILE):
+    lock_file = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh market data on a schedule, decoupled from the dashboards.")
+    parser.add_argument("--only", nargs="+", choices=sorted(JOBS), help="Jobs to run (default: all)")
+    parser.add_argument("--once", action="store_true", help="Run the selected jobs once now and exit")
+    args = parser.parse_args(argv)
+
+    lock = acquire_lock()
+    if lock is None:
+        print(f"Another refresher holds {LOCK_FILE}; exiting.")
+        return 1
+
+    # Publish what is already on disk, so dashboards started before the
+    # first scheduled run share it too
+    publish_datasets([dataset for datasets in SHARED_DATASETS.values() for dataset in datasets])
+
+    jobs = {name: JOBS[name] for name in (args.only or JOBS)}
+    try:
+        if args.once:
+            results = [run_with_retries(name, job) for name, (_, job, _) in jobs.items()]
+            return 0 if all(results) else 1
+
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(target=run_schedule, args=(name, cron, job, uses_budget, stop_event), name=name, daemon=True)
+            for name, (cron, job, uses_budget) in jobs.items()
+        ]
+        for thread in threads:
+            thread.start()
+        print(f"Refresher running jobs: {', '.join(jobs)}")
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop_event.set()
+        return 0
+    finally:
+        flush_spot_prices()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from history import TIMESTAMP_BUCKETS, normalize_series
+
+# Window lengths in days. A series is sized by its timestamp bucket (see
+# history.TIMESTAMP_BUCKETS), so "7D" is 7 daily rows or 168 hourly rows.
+WINDOWS = (7, 30, 90)
+
+# Stats kept per window
+STATS = ("MA", "Volatility", "Drawdown")
+
+# Stats offered as chart overlays: moving averages share the series' axis,
+# volatility and drawdown (in %) go on a secondary axis
+# (label -> (stat, window))
+OVERLAYS = {f"{stat} {window}D": (stat, window) for stat in STATS for window in WINDOWS}
+
+
+# Rows of a series with the given timestamp bucket covering one day
+def rows_per_day(bucket="daily"):
+    return int(pd.Timedelta(days=1) / pd.Timedelta(1, unit=TIMESTAMP_BUCKETS[bucket]))
+
+
+# Name of the stat column for a window, e.g. "MA 30D"; with a series name,
+# "Bitcoin Market Cap MA 30D"
+def stat_column(stat, window, series=None):
+    suffix = " (%)" if stat != "MA" else ""
+    name = f"{stat} {window}D{suffix}"
+    return f"{series} {name}" if series else name
+
+
+# Sliding window over the last `size` (non-missing) values with O(1) updates: running sum
+# and sum of squares for the mean and standard deviation, and a monotonic
+# deque for the maximum. The sums are recomputed from the window every
+# `size` pushes so floating-point drift cannot build up.
+class RollingWindow:
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.maxima = deque()
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.pushes = 0
+
+    def push(self, value):
+        if math.isnan(value):
+            return
+        self.values.append(value)
+        self.total += value
+        self.total_squares += value * value
+        while self.maxima and self.maxima[-1] < value:
+            self.maxima.pop()
+        self.maxima.append(value)
+        if len(self.values) > self.size:
+            dropped = self.values.popleft()
+            self.total -= dropped
+            self.total_squares -= dropped * dropped
+            if self.maxima[0] == dropped:
+                self.maxima.popleft()
+        self.pushes += 1
+        if self.pushes % self.size == 0:
+            self.total = math.fsum(self.values)
+            self.total_squares = math.fsum(v * v for v in self.values)
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else math.nan
+
+    # Sample standard deviation
+    def std(self):
+        n = len(self.values)
+        if n < 2:
+            return math.nan
+        variance = (self.total_squares - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(0.0, variance))
+
+    def max(self):
+        return self.maxima[0] if self.maxima else math.nan
+
+
+# Rolling stats of one series for several windows (in days, over a series
+# with one row per `bucket`): moving average, volatility (standard deviation
+# of the row-to-row change, in %) and drawdown from the window's peak (in %).
+# Each new point costs O(1) per window.
+class RollingStats:
+    def __init__(self, windows=WINDOWS, bucket="daily"):
+        self.windows = windows
+        sizes = [window * rows_per_day(bucket) for window in windows]
+        self.levels = [RollingWindow(size) for size in sizes]
+        self.changes = [RollingWindow(size) for size in sizes]
+        self.last = math.nan
+
+    # Push a value and return its stats, ordered like columns()
+    def update(self, value):
+        value = float(value)
+        if not math.isnan(value) and not math.isnan(self.last) and self.last != 0:
+            change = (value / self.last - 1) * 100
+        else:
+            change = math.nan
+        if not math.isnan(value):
+            self.last = value
+        stats = []
+        for levels, changes in zip(self.levels, self.changes):
+            levels.push(value)
+            changes.push(change)
+            peak = levels.max()
+            stats.append(levels.mean() if levels.full else math.nan)
+            stats.append(changes.std() if changes.full else math.nan)
+            stats.append((self.last / peak - 1) * 100 if levels.full and peak else math.nan)
+        return stats
+
+    def columns(self, series=None):
+        return [stat_column(stat, window, series) for window in self.windows for stat in STATS]
+
+
+# Stats of every value of an array (one row per bucket), pushed in order
+# through one RollingStats
+def rolling_stats(values, windows=WINDOWS, bucket="daily"):
+    stats = RollingStats(windows, bucket)
+    return np.array([stats.update(value) for value in values], dtype=np.float64).reshape(len(values), -1)
+
+
+# Update the rolling stats of a long (Timestamp, Coin, value) history. Each
+# coin's rows are first normalized to the bucket (the stored intraday point
+# becomes the current day's value), so every window counts days rather than
+# rows. The rows of `existing` before each coin's latest stats row are kept;
+# from that row on (it may have been an intraday point since replaced) each
+# coin's RollingStats is seeded with the values just before and fed only the
+# new rows, so an update costs O(window + new rows) per coin. long_df only
+# needs those rows; coins missing from it keep their stats as they are.
+def update_rolling_stats(long_df, existing=None, value_column="Market Cap (USD)", windows=WINDOWS, bucket="daily"):
+    seed = max(windows) * rows_per_day(bucket) + 1
+    columns = RollingStats(windows, bucket).columns()
+    latest = {} if existing is None or existing.empty else existing.groupby("Coin")["Timestamp"].max().to_dict()
+
+    kept, frames = [], []
+    if latest:
+        cutoff = existing["Coin"].map(latest)
+        refreshed = existing["Coin"].isin(long_df["Coin"].unique())
+        kept.append(existing[~refreshed | (existing["Timestamp"] < cutoff)])
+    for coin, rows in long_df.groupby("Coin", sort=False):
+        series = normalize_series(rows.set_index("Timestamp")[value_column], bucket)
+        timestamps = series.index.to_numpy()
+        values = series.to_numpy(dtype=np.float64)
+        start = int(np.searchsorted(timestamps, np.datetime64(latest[coin]))) if coin in latest else 0
+        seed_start = max(0, start - seed)
+        stats = rolling_stats(values[seed_start:], windows, bucket)[start - seed_start:]
+        if len(stats):
+            frame = pd.DataFrame(stats, columns=columns)
+            frame.insert(0, "Coin", coin)
+            frame.insert(0, "Timestamp", timestamps[start:])
+            frames.append(frame)
+    result = pd.concat(kept + frames, ignore_index=True) if kept or frames else pd.DataFrame(columns=["Timestamp", "Coin"] + columns)
+    return result.sort_values(["Coin", "Timestamp"]).reset_index(drop=True)
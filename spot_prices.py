@@ -0,0 +1,247 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from coingecko import SIMPLE_PRICE_ENDPOINT, get_client
+from history import days_to_fetch, normalize_series
+from partitioned_store import PartitionedStore
+from storage import read_table, write_table
+
+# Store holding the Bitcoin daily history shown by web_dash.py, and the
+# legacy CSV history used to seed it
+BITCOIN_STORE = "bitcoin_market_cap_history"
+BITCOIN_CSV = "bitcoin_market_cap_365_days.csv"
+BITCOIN_NAME = "Bitcoin"
+
+# Live ticks: snapshot of the in-memory ring buffers that the dashboards read
+# for intraday data. Older ticks are not kept; each day's last Bitcoin tick
+# is rolled into the Bitcoin daily history instead.
+TICKS_SNAPSHOT = "spot_ticks_latest.parquet"
+
+# Ticks kept in memory per coin (one day at one tick per minute, the
+# refresher's polling cadence) and number of polls between flushes to disk
+BUFFER_CAPACITY = 1440
+FLUSH_EVERY = 5
+
+# Longest query string used for the batched ids parameter
+MAX_URL_LENGTH = 2000
+
+# Coins always tracked, on top of the history universe
+ALWAYS_TRACKED = {"bitcoin": BITCOIN_NAME}
+
+
+def bitcoin_store(root="."):
+    return PartitionedStore(os.path.join(root, BITCOIN_STORE))
+
+
+# Fetch the current price and market cap (USD) of the given coins
+def fetch_spot_market_caps(coin_ids, client=None):
+    client = client or get_client()
+    params = {
+        "ids": ",".join(coin_ids),
+        "vs_currencies": "usd",
+        "include_market_cap": "true"
+    }
+    return client.get_json(SIMPLE_PRICE_ENDPOINT, params=params)
+
+
+# Split coin ids into comma-joined batches that keep the URL under the limit
+def batch_ids(coin_ids, max_length=MAX_URL_LENGTH):
+    batches, current, length = [], [], 0
+    for coin_id in coin_ids:
+        extra = len(coin_id) + (3 if current else 0)  # "%2C" between ids
+        if current and length + extra > max_length:
+            batches.append(current)
+            current, length = [], 0
+            extra = len(coin_id)
+        current.append(coin_id)
+        length += extra
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Fixed-size ring buffer of (timestamp, price, market cap) ticks for one coin,
+# stored in preallocated numpy arrays
+class TickRingBuffer:
+    def __init__(self, capacity=BUFFER_CAPACITY):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype="datetime64[ns]")
+        self.prices = np.full(capacity, np.nan)
+        self.market_caps = np.full(capacity, np.nan)
+        self.next = 0
+        self.size = 0
+
+    def append(self, timestamp, price, market_cap):
+        self.timestamps[self.next] = np.datetime64(timestamp, "ns")
+        self.prices[self.next] = price
+        self.market_caps[self.next] = market_cap
+        self.next = (self.next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    # Append many ticks at once (only the last `capacity` are kept)
+    def extend(self, timestamps, prices, market_caps):
+        for timestamp, price, market_cap in zip(timestamps[-self.capacity:], prices[-self.capacity:], market_caps[-self.capacity:]):
+            self.append(timestamp, price, market_cap)
+
+    # Buffered ticks in time order
+    def arrays(self):
+        start = (self.next - self.size) % self.capacity
+        order = (start + np.arange(self.size)) % self.capacity
+        return self.timestamps[order], self.prices[order], self.market_caps[order]
+
+
+# Last tick of each day per coin, as (Timestamp, Market Cap (USD), Coin)
+# daily points stamped with the day
+def daily_closes(ticks):
+    ticks = ticks.dropna(subset=["Market Cap (USD)"])
+    closes = ticks.assign(Timestamp=ticks["Timestamp"].dt.floor("D"))
+    closes = closes.drop_duplicates(subset=["Coin", "Timestamp"], keep="last")
+    return closes[["Timestamp", "Market Cap (USD)", "Coin"]].reset_index(drop=True)
+
+
+# Polls /simple/price for every tracked coin in URL-sized batches at a fixed
+# cadence, keeps the ticks in one ring buffer per coin, and periodically
+# rewrites the snapshot file from them. Each flush also rolls the day's
+# latest Bitcoin tick into the Bitcoin daily history, so that history keeps
+# growing after it was seeded.
+class SpotPriceIngestor:
+    def __init__(self, coin_names, root=".", client=None, capacity=BUFFER_CAPACITY, flush_every=FLUSH_EVERY):
+        self.coin_names = dict(coin_names)
+        self.root = root
+        self.client = client
+        self.capacity = capacity
+        self.flush_every = flush_every
+        self.buffers = {}
+        self.polls = 0
+        self.flushed_at = {}
+        self.history_store = bitcoin_store(root)
+        self.lock = threading.Lock()
+        self.restore()
+
+    # Refill the buffers from the last snapshot, so a restarted refresher
+    # keeps showing the ticks of the previous process
+    def restore(self):
+        ticks = read_spot_ticks(self.root)
+        names = {name: coin_id for coin_id, name in self.coin_names.items()}
+        with self.lock:
+            for coin, rows in ticks.sort_values("Timestamp").groupby("Coin", sort=False):
+                coin_id = names.get(coin)
+                if coin_id is None:
+                    continue
+                buffer = self.buffers.setdefault(coin_id, TickRingBuffer(self.capacity))
+                buffer.extend(rows["Timestamp"].to_numpy(), rows["Price (USD)"].to_numpy(), rows["Market Cap (USD)"].to_numpy())
+                self.flushed_at[coin_id] = buffer.arrays()[0][-1]
+
+    # One request per batch; returns the number of ticks recorded
+    def poll_once(self):
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        recorded = 0
+        for batch in batch_ids(sorted(self.coin_names)):
+            data = fetch_spot_market_caps(batch, client=self.client)
+            with self.lock:
+                for coin_id, quote in data.items():
+                    if "usd" not in quote:
+                        continue
+                    buffer = self.buffers.setdefault(coin_id, TickRingBuffer(self.capacity))
+                    buffer.append(timestamp, quote["usd"], quote.get("usd_market_cap", np.nan))
+                    recorded += 1
+        self.polls += 1
+        if self.polls % self.flush_every == 0:
+            self.flush()
+        return recorded
+
+    # Buffered ticks as a long frame (optionally only those after `since`)
+    def frame(self, since=None):
+        frames = []
+        with self.lock:
+            for coin_id, buffer in self.buffers.items():
+                timestamps, prices, market_caps = buffer.arrays()
+                if since is not None and coin_id in since:
+                    keep = timestamps > np.datetime64(since[coin_id], "ns")
+                    timestamps, prices, market_caps = timestamps[keep], prices[keep], market_caps[keep]
+                if len(timestamps):
+                    frames.append(pd.DataFrame({
+                        "Timestamp": timestamps,
+                        "Coin": self.coin_names.get(coin_id, coin_id),
+                        "Price (USD)": prices,
+                        "Market Cap (USD)": market_caps,
+                    }))
+        if not frames:
+            return pd.DataFrame(columns=["Timestamp", "Coin", "Price (USD)", "Market Cap (USD)"])
+        return pd.concat(frames, ignore_index=True)
+
+    # Roll the new ticks into the Bitcoin daily history and rewrite the
+    # intraday snapshot
+    def flush(self):
+        new_ticks = self.frame(since=self.flushed_at)
+        if new_ticks.empty:
+            return
+        # The day's close replaces the stored points from that day on (the
+        # previous close, or the intraday point of a seed fetched by the API)
+        closes = daily_closes(new_ticks[new_ticks["Coin"] == BITCOIN_NAME])
+        self.history_store.append(closes, replace_tail=True)
+        write_table(self.frame(), os.path.join(self.root, TICKS_SNAPSHOT))
+        with self.lock:
+            for coin_id, buffer in self.buffers.items():
+                if buffer.size:
+                    self.flushed_at[coin_id] = buffer.arrays()[0][-1]
+
+
+# CoinGecko id -> coin name of every coin tracked by the history store
+def tracked_coins(history_root):
+    metadata = PartitionedStore(history_root).metadata()
+    coins = dict(metadata.get("coin_ids", {}))
+    coins.update(ALWAYS_TRACKED)
+    return coins
+
+
+# Intraday ticks flushed by the ingestor (empty if there are none yet)
+def read_spot_ticks(root=".", columns=None):
+    path = os.path.join(root, TICKS_SNAPSHOT)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["Timestamp", "Coin", "Price (USD)", "Market Cap (USD)"])
+    return read_table(path, columns=columns)
+
+
+# Fetch the last `days` days of Bitcoin market caps
+def fetch_bitcoin_history(client=None, days=365):
+    client = client or get_client()
+    params = {"vs_currency": "usd", "days": str(days), "interval": "daily"}
+    timestamps, market_caps = client.get_market_chart("bitcoin", params)["market_caps"]
+    return pd.DataFrame({
+        "Timestamp": timestamps,
+        "Market Cap (USD)": market_caps
+    })
+
+
+# Seed an empty Bitcoin store from the CSV history, or from the API when
+# there is none (run by the refresher; the dashboards only read the store)
+def seed_bitcoin_store(store, root="."):
+    if store.exists():
+        return
+    csv_path = os.path.join(root, BITCOIN_CSV)
+    if os.path.exists(csv_path):
+        history_df = read_table(csv_path)
+    else:
+        history_df = fetch_bitcoin_history()
+    store.append(history_df.assign(Coin=BITCOIN_NAME))
+
+
+# Fetch the days missing from the Bitcoin store since its last point (the
+# refresher was down, or the store was seeded from an old CSV); the flushed
+# ticks only cover the days the refresher was running. Returns the number
+# of rows written.
+def catch_up_bitcoin_store(store, client=None):
+    latest = store.latest_timestamps().get(BITCOIN_NAME)
+    days = days_to_fetch(latest)
+    if latest is None or days <= 2:
+        return 0
+    history_df = fetch_bitcoin_history(client, days)
+    series = normalize_series(history_df.set_index("Timestamp")["Market Cap (USD)"])
+    rows = pd.DataFrame({"Timestamp": series.index, "Market Cap (USD)": series.to_numpy(), "Coin": BITCOIN_NAME})
+    store.append(rows[rows["Timestamp"] > latest], replace_tail=True)
+    return int((rows["Timestamp"] > latest).sum())
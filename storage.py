@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from assets import meta_path
+from instrumentation import instrumented
+
+# Default on-disk format for datasets written by the fetchers. Parquet is
+# columnar, compressed and memory-mappable; xlsx/csv remain available as
+# export formats and are still read when no Parquet file exists yet.
+STORAGE_FORMAT = os.environ.get("RACECAP_STORAGE_FORMAT", "parquet")
+
+# Formats tried (in order) when looking for an existing dataset
+READ_PREFERENCE = ["parquet", "feather", "xlsx", "csv"]
+
+
+# Parquet backend (pyarrow): memory-mapped reads with column projection
+class ParquetBackend:
+    extension = ".parquet"
+
+    def read(self, path, columns=None):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    def write(self, df, path, **options):
+        df.to_parquet(path, index=False, engine="pyarrow", compression=options.get("compression", "zstd"))
+
+
+# Arrow IPC / Feather backend: uncompressed files can be mapped zero-copy
+class FeatherBackend:
+    extension = ".feather"
+
+    def read(self, path, columns=None):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas()
+
+    def write(self, df, path, **options):
+        df.reset_index(drop=True).to_feather(path, compression=options.get("compression", "uncompressed"))
+
+
+# Excel backend, kept for exports and for reading the legacy history files
+class ExcelBackend:
+    extension = ".xlsx"
+
+    def read(self, path, columns=None):
+        df = pd.read_excel(path, sheet_name=0, usecols=columns)
+        if "Timestamp" in df.columns:
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        return df
+
+    def write(self, df, path, **options):
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            df.to_excel(writer, sheet_name=options.get("sheet_name", "Sheet1"), index=False)
+
+
+# CSV backend, kept for exports and for reading the legacy history files
+class CsvBackend:
+    extension = ".csv"
+
+    def read(self, path, columns=None):
+        df = pd.read_csv(path, usecols=columns)
+        if "Timestamp" in df.columns:
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        return df
+
+    def write(self, df, path, **options):
+        df.to_csv(path, index=False)
+
+
+BACKENDS = {
+    "parquet": ParquetBackend(),
+    "feather": FeatherBackend(),
+    "xlsx": ExcelBackend(),
+    "csv": CsvBackend(),
+}
+
+
+# Register an additional storage backend under the given format name
+def register_backend(name, backend):
+    BACKENDS[name] = backend
+
+
+# Pick the backend for a file from its extension
+def backend_for(path):
+    extension = os.path.splitext(path)[1].lower()
+    for backend in BACKENDS.values():
+        if backend.extension == extension:
+            return backend
+    raise ValueError(f"No storage backend for {path}")
+
+
+# File path of a dataset (name without extension) in the given format
+def dataset_path(name, fmt=None):
+    return name + BACKENDS[fmt or STORAGE_FORMAT].extension
+
+
+# Path of the best existing file for a dataset, or None if there is none
+def find_dataset(name):
+    for fmt in [STORAGE_FORMAT] + READ_PREFERENCE:
+        path = dataset_path(name, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@instrumented("read_table")
+def read_table(path, columns=None):
+    return backend_for(path).read(path, columns=columns)
+
+
+# Write to a temporary file next to the target, then rename it into place,
+# so readers only ever see the previous or the new complete file
+def atomic_write(path, write):
+    directory, filename = os.path.split(os.path.abspath(path))
+    extension = os.path.splitext(filename)[1]
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=".tmp" + extension, dir=directory)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+@instrumented("write_table")
+def write_table(df, path, **options):
+    return atomic_write(path, lambda tmp_path: backend_for(path).write(df, tmp_path, **options))
+
+
+def write_json(data, path):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True, default=str)
+    return atomic_write(path, write)
+
+
+# Read a dataset, optionally projecting a subset of columns. Returns None
+# when the dataset has not been written yet.
+def read_dataset(name, columns=None):
+    path = find_dataset(name)
+    if path is None:
+        return None
+    return read_table(path, columns=columns)
+
+
+# Write a dataset in the default format, plus any requested export formats
+def write_dataset(df, name, fmt=None, exports=(), **options):
+    paths = [write_table(df, dataset_path(name, fmt), **options)]
+    for export_fmt in exports:
+        paths.append(write_table(df, dataset_path(name, export_fmt), **options))
+    return paths
+
+
+# Small JSON summary of a dataset (last update, number of coins...) written
+# by its fetcher, so a dashboard can show its first content without reading
+# the data itself (see assets.load_dataset_meta)
+def write_dataset_meta(name, **fields):
+    fields["written_at"] = datetime.now(timezone.utc).isoformat()
+    return write_json(fields, meta_path(name))
+
+
+# One-shot conversion of existing .xlsx/.csv history files to the default
+# format. Files are converted as they are (wide or long). Two sources of the
+# same dataset (history.xlsx and history.csv) would write the same target,
+# so they are rejected before anything is written.
+def convert(paths, fmt=None):
+    targets = {}
+    for path in paths:
+        target = dataset_path(os.path.splitext(path)[0], fmt)
+        if os.path.abspath(target) == os.path.abspath(path):
+            continue
+        if target in targets:
+            raise ValueError(f"{targets[target]} and {path} would both be converted to {target}; convert only one of them")
+        targets[target] = path
+
+    converted = []
+    for target, path in targets.items():
+        write_table(read_table(path), target)
+        print(f"Converted {path} -> {target}")
+        converted.append(target)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored history files to the columnar storage format.")
+    parser.add_argument("paths", nargs="+", help="Existing .xlsx or .csv files to convert")
+    parser.add_argument("--format", default=STORAGE_FORMAT, choices=sorted(BACKENDS), help="Target format")
+    args = parser.parse_args()
+    try:
+        convert(args.paths, fmt=args.format)
+    except ValueError as error:
+        parser.error(str(error))
@@ -3,6 +3,16 @@ import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
+import sys
+
+# Shared helpers live in the repository root, which this app is deployed
+# from (see README.md)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import load_table_with_metrics, time_slice
+from instrumentation import show_debug_panel, start_run, timed
+from metrics import MARKET_CAP_METRICS
+from rolling import OVERLAYS, stat_column
 
 # Set up Streamlit page configuration with an icon
 st.set_page_config(
@@ -11,92 +21,113 @@ st.set_page_config(
     page_icon="icon.png"
 )
 
-# Load Excel data
-excel_file = "crypto_market_cap_history.xlsx"
-
-@st.cache_data
-def load_data(file):
-    return pd.read_excel(file)
-
-data = load_data(excel_file)
+# Timings of this rerun, shown in the debug panel (open the page with ?debug=1)
+run = start_run("stream_1_dashboard")
+
+# Load the stored history (Parquet by default), reading only the columns the chart uses
+history_dataset = "crypto_market_cap_history"
+COVERAGE_SERIES = [
+    ("Stablecoin Backup (Bitcoin)", "Stable/BTC", "blue"),
+    ("Stablecoin Backup (Altcoins + Ethereum)", "Stable/(Altcoins + Ethereum)", "red"),
+    ("Stablecoin Backup (Bitcoin + Altcoins + Ethereum)", "Stable/Total", "green"),
+]
+DASHBOARD_COLUMNS = ["Timestamp"] + [
+    column
+    for series, _, _ in COVERAGE_SERIES
+    for column in [series] + [stat_column(stat, window, series) for stat, window in OVERLAYS.values()]
+]
+
+# Header first, so the page paints while the data loads
+st.header("Cryptocurrency Market Cap Dashboard")
 
-# Ensure Timestamp column is datetime
-data["Timestamp"] = pd.to_datetime(data["Timestamp"])
+# Shared process-wide cache (see data_loader.py): one copy per process,
+# reloaded only when the stored file changes. The stablecoin backup ratios
+# are precomputed by the fetcher (see metrics.py), and the rows are sorted
+# and indexed by Timestamp so date ranges are found by binary search.
+with timed("load_data"), st.spinner("Loading market data..."):
+    data = load_table_with_metrics(history_dataset, MARKET_CAP_METRICS, columns=DASHBOARD_COLUMNS, time_index=True)
 
 # Add filter options on top of the chart
-st.header("Cryptocurrency Market Cap Dashboard")
 filter_option = st.radio(
     "Select Date Range:",
-    options=["Last 7 Days", "Last 1 Month", "Last 3 Months", "All Time"],
+    options=["Last 7 Days", "Last 1 Month", "Last 3 Months", "All Time", "Custom"],
     index=3,
     horizontal=True
 )
 
 # Determine the date range for filtering
 today = datetime.now()
+end_date = None
 if filter_option == "Last 7 Days":
     start_date = today - timedelta(days=7)
 elif filter_option == "Last 1 Month":
     start_date = today - timedelta(days=30)
 elif filter_option == "Last 3 Months":
     start_date = today - timedelta(days=90)
+elif filter_option == "Custom" and not data.empty:
+    first_day, last_day = data["Timestamp"].iloc[0].date(), data["Timestamp"].iloc[-1].date()
+    custom_range = st.date_input("Date range:", value=(first_day, last_day), min_value=first_day, max_value=last_day)
+    start_date = custom_range[0]
+    end_date = pd.Timestamp(custom_range[-1]) + timedelta(days=1) - timedelta(microseconds=1)
 else:
-    start_date = data["Timestamp"].min()
-
-# Filter the data based on the selected date range
-filtered_data = data[data["Timestamp"] >= start_date]
-
-# Perform stablecoin backup calculations (corrected to show percentage correctly)
-filtered_data["Stablecoin Backup (Bitcoin)"] = (
-    filtered_data["Stablecoin Total Market Cap"] / filtered_data["Bitcoin Market Cap"] * 100
-)
-filtered_data["Stablecoin Backup (Altcoins + Ethereum)"] = (
-    filtered_data["Stablecoin Total Market Cap"] /
-    (filtered_data["Ethereum Market Cap"] + filtered_data["Altcoins Market Cap"]) * 100
-)
-filtered_data["Stablecoin Backup (Bitcoin + Altcoins + Ethereum)"] = (
-    filtered_data["Stablecoin Total Market Cap"] /
-    (filtered_data["Bitcoin Market Cap"] + filtered_data["Ethereum Market Cap"] + filtered_data["Altcoins Market Cap"]) * 100
+    start_date = None
+
+# Select the date range (a slice of the sorted rows, no copy)
+with timed("filter"):
+    filtered_data = time_slice(data, start_date, end_date)
+
+# Rolling stats of the ratios (precomputed by the fetcher, see rolling.py)
+selected_overlays = st.multiselect(
+    "Overlays:",
+    options=list(OVERLAYS),
+    default=[],
+    help="Moving averages share the coverage axis; volatility and drawdown use the right axis."
 )
 
-# Create the chart
-fig = go.Figure()
-fig.add_trace(go.Scatter(
-    x=filtered_data["Timestamp"],
-    y=filtered_data["Stablecoin Backup (Bitcoin)"],
-    mode='lines',
-    name="Stable/BTC",
-    line=dict(color='blue')
-))
-fig.add_trace(go.Scatter(
-    x=filtered_data["Timestamp"],
-    y=filtered_data["Stablecoin Backup (Altcoins + Ethereum)"],
-    mode='lines',
-    name="Stable/(Altcoins + Ethereum)",
-    line=dict(color='red')
-))
-fig.add_trace(go.Scatter(
-    x=filtered_data["Timestamp"],
-    y=filtered_data["Stablecoin Backup (Bitcoin + Altcoins + Ethereum)"],
-    mode='lines',
-    name="Stable/Total",
-    line=dict(color='green')
-))
-
-# Update layout
-fig.update_layout(
-    title=f"Marketcap Stablecoin to Bitcoin or Altcoin Ratios ({filter_option})",
-    xaxis_title="Date",
-    yaxis_title="Stablecoin Coverage (%)",
-    xaxis=dict(title_font=dict(size=16, color='black')),
-    yaxis=dict(title_font=dict(size=16, color='black')),
-    height=600,
-    width=1200,
-    template="plotly_white"
-)
+# Create the chart: one line per ratio, plus its dotted overlays
+with timed("figure"):
+    fig = go.Figure()
+    for series, name, color in COVERAGE_SERIES:
+        fig.add_trace(go.Scatter(
+            x=filtered_data["Timestamp"],
+            y=filtered_data[series],
+            mode='lines',
+            name=name,
+            line=dict(color=color)
+        ))
+        for overlay in selected_overlays:
+            stat, window = OVERLAYS[overlay]
+            fig.add_trace(go.Scatter(
+                x=filtered_data["Timestamp"],
+                y=filtered_data[stat_column(stat, window, series)],
+                mode='lines',
+                name=f"{name} {overlay}",
+                line=dict(color=color, dash='dot'),
+                yaxis='y' if stat == 'MA' else 'y2'
+            ))
+
+    # Update layout
+    fig.update_layout(
+        title=f"Marketcap Stablecoin to Bitcoin or Altcoin Ratios ({filter_option})",
+        xaxis_title="Date",
+        yaxis_title="Stablecoin Coverage (%)",
+        xaxis=dict(title_font=dict(size=16, color='black')),
+        yaxis=dict(title_font=dict(size=16, color='black')),
+        yaxis2=dict(
+            title="Volatility / Drawdown (%)",
+            overlaying="y",
+            side="right",
+            showgrid=False,
+            visible=any(OVERLAYS[overlay][0] != 'MA' for overlay in selected_overlays)
+        ),
+        height=600,
+        width=1200,
+        template="plotly_white"
+    )
 
 # Display chart in Streamlit
-st.plotly_chart(fig, use_container_width=True)
+with timed("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=True)
 
 # Display explanation below the chart
 st.markdown("""
@@ -133,6 +164,9 @@ If you like the content, you can help by donating any amount (e.g., $0.01) to im
 - **Base:** `0x14effaF60778faBF31Ae3D69BD27a520c1dD8bb8`
 """)
 
+# Log this rerun's timings (and show them when debugging)
+show_debug_panel(run)
+
 # Bind to Heroku's dynamic port
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8501))
@@ -1,139 +1,140 @@
-import requests
+import os
+import sys
 import pandas as pd
-import time
 
-# File path for storing data
-excel_file = "crypto_market_cap_history.xlsx"
+# Shared helpers live in the repository root, which this app is deployed
+# from (see README.md)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import FetchCheckpoint
+from coingecko import fetch_concurrently, get_client
+from history import (BASE_COLUMNS, CORE_COIN_COLUMNS, DEFAULT_HISTORY_DAYS, build_market_cap_table, days_to_fetch,
+                     merge_history, normalize_series)
+from instrumentation import finish_run, format_summary, start_run, timed
+from metrics import apply_metrics, first_row_after, market_cap_metrics, metric_columns
+from storage import read_dataset, write_dataset, write_dataset_meta
+from universe import discover_universe
+
+# Dataset for storing data (Parquet by default, see storage.py), one per
+# timestamp bucket so daily and hourly rows never end up in the same table
+HISTORY_DATASETS = {
+    "daily": "crypto_market_cap_history",
+    "hourly": "crypto_market_cap_history_hourly",
+}
 num_coins = 100  # Number of top coins to fetch, excluding stablecoins
 
-# CoinGecko API endpoints
-COINS_MARKET_ENDPOINT = "https://api.coingecko.com/api/v3/coins/markets"
-COIN_MARKET_CHART_ENDPOINT = "https://api.coingecko.com/api/v3/coins/{id}/market_chart"
+# Coins shown in their own columns (BTC, ETH, USDT, USDC, see history.py)
+# are excluded from the altcoins
+EXCLUDED_COINS = set(CORE_COIN_COLUMNS)
 
-# List of excluded coins (BTC, ETH, USDT, USDC)
-EXCLUDED_COINS = {"bitcoin", "ethereum", "tether", "usd-coin"}
+# Only fetch the days missing since the last run unless --full is passed
+FULL_REFRESH = "--full" in sys.argv
+
+# Timestamp bucket of the saved rows: one row per day, or per hour with
+# --hourly (CoinGecko returns hourly points for windows of up to 90 days)
+TIMESTAMP_BUCKET = "hourly" if "--hourly" in sys.argv else "daily"
+HISTORY_MAX_DAYS = 90 if TIMESTAMP_BUCKET == "hourly" else DEFAULT_HISTORY_DAYS
+history_dataset = HISTORY_DATASETS[TIMESTAMP_BUCKET]
+
+# Derived metrics stored with the rows; rolling windows span days whatever
+# the bucket (see rolling.py)
+history_metrics = market_cap_metrics(TIMESTAMP_BUCKET)
+
+# Also write an Excel copy of the data when --export-xlsx is passed
+EXPORT_FORMATS = ["xlsx"] if "--export-xlsx" in sys.argv else []
+
+# Rate-limited CoinGecko client shared by all requests in this run
+client = get_client()
+
+# Function to load the previously saved history (empty on a full refresh)
+def load_existing_history():
+    existing_df = None if FULL_REFRESH else read_dataset(history_dataset)
+    if existing_df is None:
+        return pd.DataFrame(columns=["Timestamp"])
+    return existing_df
 
 # Function to fetch the top N coins by market cap excluding specified coins
+# (paged and cached, see universe.py)
 def fetch_top_coins(n=num_coins):
-    url = COINS_MARKET_ENDPOINT
-    params = {
-        "vs_currency": "usd",
-        "order": "market_cap_desc",
-        "per_page": n * 2,  # Fetch more coins to account for exclusions
-        "page": 1,
-        "sparkline": "false"
-    }
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
-    coins = [coin['id'] for coin in data if coin['id'] not in EXCLUDED_COINS]
-    return coins[:n]  # Return only the requested number of coins
-
-# Function to fetch historical market cap data for a specific coin
-def fetch_historical_market_cap(coin_id, days=365):
-    url = COIN_MARKET_CHART_ENDPOINT.format(id=coin_id)
+    return [coin["id"] for coin in discover_universe(n, exclude=EXCLUDED_COINS, client=client)]
+
+# Function to fetch historical market cap data for a specific coin, as a
+# Series indexed by bucket Timestamp and named after the coin
+def fetch_historical_market_cap(coin_id, days=DEFAULT_HISTORY_DAYS):
     params = {
         "vs_currency": "usd",
-        "days": days,
-        "interval": "daily"
+        "days": days
     }
-    response = requests.get(url, params=params)
-    if response.status_code == 429:
-        print(f"Rate limit exceeded while fetching {coin_id}. Waiting for 60 seconds.")
-        time.sleep(60)
-        response = requests.get(url, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return pd.DataFrame({
-        "Timestamp": pd.to_datetime([entry[0] for entry in data["market_caps"]], unit="ms"),
-        f"{coin_id} Market Cap": [entry[1] for entry in data["market_caps"]]
-    })
-
-# Fetch historical market cap data for Bitcoin, Ethereum, USDT, and USDC
-bitcoin_df = fetch_historical_market_cap("bitcoin")
-ethereum_df = fetch_historical_market_cap("ethereum")
-usdt_df = fetch_historical_market_cap("tether")
-usdc_df = fetch_historical_market_cap("usd-coin")
-
-# Rename columns for consistency
-bitcoin_df.rename(columns={"bitcoin Market Cap": "Bitcoin Market Cap"}, inplace=True)
-ethereum_df.rename(columns={"ethereum Market Cap": "Ethereum Market Cap"}, inplace=True)
-usdt_df.rename(columns={"tether Market Cap": "USDT Market Cap"}, inplace=True)
-usdc_df.rename(columns={"usd-coin Market Cap": "USDC Market Cap"}, inplace=True)
-
-# Merge dataframes on the Timestamp column
-final_df = bitcoin_df.merge(ethereum_df, on="Timestamp", how="outer")
-final_df = final_df.merge(usdt_df, on="Timestamp", how="outer")
-final_df = final_df.merge(usdc_df, on="Timestamp", how="outer")
-
-# Fetch top altcoins (excluding BTC, ETH, USDT, USDC)
-top_coins = fetch_top_coins()
-
-# Initialize an empty DataFrame for altcoins
-altcoins_df = pd.DataFrame()
-
-# Fetch and merge altcoin data
-for index, coin_id in enumerate(top_coins):
-    print(f"Fetching data for {coin_id} ({index + 1}/{len(top_coins)})")
-    coin_df = fetch_historical_market_cap(coin_id)
-    if altcoins_df.empty:
-        altcoins_df = coin_df
-    else:
-        altcoins_df = altcoins_df.merge(coin_df, on="Timestamp", how="outer")
-    time.sleep(2)  # Add delay to avoid rate limits
-
-# Fill missing values with zero in altcoin data
-altcoins_df = altcoins_df.fillna(0)
-
-# Calculate Altcoins Market Cap (excluding BTC, ETH, USDT, USDC)
-altcoin_columns = [col for col in altcoins_df.columns if col not in {"Timestamp"}]
-altcoins_df["Altcoins Market Cap"] = altcoins_df[altcoin_columns].sum(axis=1)
-
-# Merge Altcoins Market Cap into the final DataFrame
-final_df = final_df.merge(altcoins_df[["Timestamp", "Altcoins Market Cap"]], on="Timestamp", how="outer")
-
-# Fill missing values with zero in the final DataFrame
-final_df = final_df.fillna(0)
-
-# Add total stablecoin market cap
-final_df["Stablecoin Total Market Cap"] = final_df["USDT Market Cap"] + final_df["USDC Market Cap"]
-
-# Calculate total market cap excluding stablecoins
-final_df["Total Market Cap Excluding Stablecoins"] = (
-    final_df["Bitcoin Market Cap"] +
-    final_df["Ethereum Market Cap"] +
-    final_df["Altcoins Market Cap"]
-)
-
-# Calculate Bitcoin and Ethereum dominance excluding stablecoins
-final_df["Bitcoin Dominance (%)"] = (
-    final_df["Bitcoin Market Cap"] / final_df["Total Market Cap Excluding Stablecoins"]
-) * 100
-final_df["Ethereum Dominance (%)"] = (
-    final_df["Ethereum Market Cap"] / final_df["Total Market Cap Excluding Stablecoins"]
-) * 100
-
-# Sort the DataFrame by Timestamp
-final_df.sort_values("Timestamp", inplace=True)
-
-# Reset the index after sorting
-final_df.reset_index(drop=True, inplace=True)
-
-# Select and organize columns for the final Excel file
-final_df = final_df[[
-    "Timestamp", "Bitcoin Market Cap", "Ethereum Market Cap", "USDT Market Cap",
-    "USDC Market Cap", "Stablecoin Total Market Cap", "Altcoins Market Cap",
-    "Total Market Cap Excluding Stablecoins", "Bitcoin Dominance (%)", "Ethereum Dominance (%)"
-]]
-
-# Filter the DataFrame to include only rows with timestamps at midnight
-final_df["Timestamp"] = pd.to_datetime(final_df["Timestamp"])  # Ensure Timestamp is in datetime format
-final_df = final_df[final_df["Timestamp"].dt.time == pd.to_datetime("00:00:00").time()]
-
-# Reset the index after filtering
-final_df.reset_index(drop=True, inplace=True)
-
-# Save to Excel
-final_df.to_excel(excel_file, index=False)
-print(f"Historical market cap data (midnight only) saved to {excel_file}")
+    if TIMESTAMP_BUCKET == "daily":
+        params["interval"] = "daily"
+    # The client waits for the shared rate limit and retries 429 responses
+    timestamps, market_caps = client.get_market_chart(coin_id, params)["market_caps"]
+    series = pd.Series(market_caps, index=pd.DatetimeIndex(timestamps, name="Timestamp"), name=coin_id)
+
+    # Normalize right away so every coin shares the same bucket timestamps
+    # (the latest, intraday point becomes the current bucket's value)
+    return normalize_series(series, TIMESTAMP_BUCKET)
+
+# Timings and API counters of this run, printed and logged at the end
+# (see instrumentation.py)
+run = start_run("stream_1_get_crypto_data")
+
+# Only request the days after the latest stored row
+existing_df = load_existing_history()
+history_days = days_to_fetch(existing_df["Timestamp"].max() if not existing_df.empty else None, max_days=HISTORY_MAX_DAYS)
+print(f"Fetching the last {history_days} days of market cap data")
+
+# Checkpoint of this run: each coin is saved as soon as it arrives, so a run
+# that dies halfway resumes with the coins that are still missing
+checkpoint = FetchCheckpoint("stream_1", {
+    "num_coins": num_coins,
+    "days": history_days,
+    "bucket": TIMESTAMP_BUCKET,
+})
+
+# Fetch top altcoins (excluding BTC, ETH, USDT, USDC). The list is saved in
+# the checkpoint, so a resumed run keeps the coins it started with even if
+# the universe has changed since.
+with timed("universe"):
+    top_coins = checkpoint.plan(fetch_top_coins)
+coin_ids = list(CORE_COIN_COLUMNS) + top_coins
+pending_coin_ids = checkpoint.pending(coin_ids)
+if checkpoint.resumed:
+    print(f"Resuming the previous run: {len(coin_ids) - len(pending_coin_ids)} of {len(coin_ids)} coins already fetched")
+
+# Fetch the pending coins concurrently (paced by the client's rate limit)
+with timed("fetch"):
+    for index, (coin_id, series, error) in enumerate(fetch_concurrently(lambda coin_id: fetch_historical_market_cap(coin_id, history_days), pending_coin_ids)):
+        if error is not None:
+            raise error
+        print(f"Fetched data for {coin_id} ({index + 1}/{len(pending_coin_ids)})")
+        checkpoint.save(coin_id, series.reset_index())
+
+series_by_coin = {
+    coin_id: coin_df.set_index("Timestamp")[coin_id]
+    for coin_id, coin_df in checkpoint.results().items()
+}
+
+# Align all coins and compute the totals
+with timed("merge"):
+    new_df = build_market_cap_table(series_by_coin, top_coins)
+
+    # Merge the new days into the stored history (the refetched days replace the stored ones)
+    final_df = merge_history(existing_df, new_df, coin_column=None)
+
+# Derived metrics: stored rows keep their values, only the new rows are computed
+with timed("metrics"):
+    first_new = first_row_after(final_df, new_df["Timestamp"].min()) if not new_df.empty else len(final_df)
+    final_df = apply_metrics(final_df, history_metrics, first_new)
+    final_df = final_df[BASE_COLUMNS + metric_columns(history_metrics)]
+
+# Save the data (and the optional Excel export)
+with timed("store"):
+    saved_paths = write_dataset(final_df, history_dataset, exports=EXPORT_FORMATS)
+    write_dataset_meta(history_dataset, last_update=final_df["Timestamp"].max().isoformat(), rows=len(final_df))
+print(f"Historical market cap data ({TIMESTAMP_BUCKET}) saved to {', '.join(saved_paths)}")
+
+# The results are saved now, so the next run starts from scratch
+checkpoint.clear()
+print(format_summary(finish_run(run)))
 
@@ -0,0 +1,136 @@
+import asyncio
+import gzip
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import api_server
+from ranking import RankingIndex
+
+
+def history():
+    return pd.DataFrame({
+        "Timestamp": list(pd.date_range("2024-01-01", periods=4, freq="D")) * 2,
+        "Coin": ["Bitcoin"] * 4 + ["Ethereum"] * 4,
+        "Market Cap (USD)": [1.0, 2.0, 3.0, 4.0, 10.0, 20.0, 30.0, 40.0],
+        "Category": "Top 50 Coins",
+    })
+
+
+@pytest.fixture
+def api(monkeypatch):
+    signature = {"history": 1}
+    monkeypatch.setattr(api_server, "load_ranking_index", lambda: RankingIndex(history()))
+    monkeypatch.setattr(api_server, "_history_signature", lambda: signature["history"])
+    api_server._responses.clear()
+    yield signature
+    api_server._responses.clear()
+
+
+# Run requests against the app in a test server: requests(client) is a
+# coroutine function returning the results to check
+def call(requests):
+    async def run():
+        async with TestClient(TestServer(api_server.create_app())) as client:
+            return await requests(client)
+    return asyncio.run(run())
+
+
+def get(path, headers=None):
+    async def request(client):
+        response = await client.get(path, headers=headers or {})
+        return response.status, response.headers, await response.read()
+    return call(request)
+
+
+def records(body):
+    return [(row["Timestamp"][:19], row["Market Cap (USD)"]) for row in json.loads(body)]
+
+
+def test_history_in_rank_order(api):
+    status, headers, body = get("/history?coin=Bitcoin,Ethereum&from=2024-01-03")
+    assert status == 200 and headers["Content-Type"].startswith("application/json")
+    assert [row["Coin"] for row in json.loads(body)] == ["Ethereum", "Ethereum", "Bitcoin", "Bitcoin"]
+
+
+@pytest.mark.parametrize("bound", ["2024-01-02T00:00:00Z", "2024-01-02T02:00:00+02:00", "2024-01-02"])
+def test_time_zone_bounds_are_converted_to_utc(api, bound):
+    status, _, body = get(f"/history?coin=Bitcoin&from={bound.replace('+', '%2B')}")
+    assert status == 200
+    assert records(body) == [("2024-01-02T00:00:00", 2.0), ("2024-01-03T00:00:00", 3.0), ("2024-01-04T00:00:00", 4.0)]
+
+
+# One point a day through 2024: the expected number of buckets per rule
+RESAMPLED_ROWS = {"daily": 366, "weekly": 53, "monthly": 12, "quarterly": 4, "yearly": 1}
+
+
+@pytest.mark.parametrize("resample", list(api_server.RESAMPLE_RULES))
+@pytest.mark.parametrize("path", ["/history?coin=Bitcoin", "/dominance?", "/coverage?"])
+def test_every_resample_rule_is_served(api, monkeypatch, resample, path):
+    days = pd.date_range("2024-01-01", "2024-12-31", freq="D")
+    values = [float(value) for value in range(1, len(days) + 1)]
+    monkeypatch.setattr(api_server, "load_ranking_index", lambda: RankingIndex(pd.DataFrame({
+        "Timestamp": days, "Coin": "Bitcoin", "Market Cap (USD)": values, "Category": "Top 50 Coins",
+    })))
+    table = pd.DataFrame({"Timestamp": days, **{column: values for column in api_server.DOMINANCE_COLUMNS + api_server.COVERAGE_COLUMNS}})
+    table.index = pd.DatetimeIndex(days)
+    monkeypatch.setattr(api_server, "load_table_with_metrics", lambda name, metrics, columns, time_index: table[columns])
+    monkeypatch.setattr(api_server, "_stream_1_signature", lambda: 1)
+
+    status, _, body = get(f"{path}&resample={resample}")
+    assert status == 200
+    rows = json.loads(body)
+    assert len(rows) == RESAMPLED_ROWS[resample]
+    assert rows[-1]["Timestamp"][:10] == ("2025-01-05" if resample == "weekly" else "2024-12-31")
+    assert list(rows[-1].values())[-1] == float(len(days))
+
+
+@pytest.mark.parametrize("query, status", [
+    ("coin=Bitcoin&from=yesterday", 400),
+    ("coin=Bitcoin&to=NaT", 400),
+    ("coin=Bitcoin&resample=hourly", 400),
+    ("coin=Bitcoin&resample=M", 400),
+    ("from=2024-01-01", 400),
+    ("coin=Bitcoin,Unknown", 404),
+])
+def test_invalid_queries_are_answered_with_json_errors(api, query, status):
+    response_status, _, body = get(f"/history?{query}")
+    assert response_status == status
+    assert "error" in json.loads(body)
+
+
+def test_etag_revalidation(api):
+    async def requests(client):
+        first = await client.get("/coins")
+        etag = first.headers["ETag"]
+        again = await client.get("/coins", headers={"If-None-Match": etag})
+        api["history"] = 2  # the data changed
+        changed = await client.get("/coins", headers={"If-None-Match": etag})
+        return first.status, again.status, changed.status, changed.headers["ETag"] != etag
+    assert call(requests) == (200, 304, 200, True)
+
+
+def test_gzip_and_arrow_encodings(api):
+    status, headers, body = get("/history?coin=Bitcoin", headers={"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert len(json.loads(body)) == 4  # decompressed by the client
+    assert headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(api_server._responses[(headers["ETag"], True)]))) == 4
+
+    status, headers, body = get("/history?coin=Bitcoin&format=arrow")
+    assert headers["Content-Type"] == api_server.ARROW_CONTENT_TYPE
+    assert pa.ipc.open_stream(body).read_pandas()["Market Cap (USD)"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_large_responses_are_streamed(api, monkeypatch):
+    monkeypatch.setattr(api_server, "STREAM_ROWS", 3)
+    status, _, body = get("/history?coin=Bitcoin,Ethereum")
+    assert status == 200
+    assert [value for _, value in records(body)] == [10.0, 20.0, 30.0, 40.0, 1.0, 2.0, 3.0, 4.0]
+    assert not api_server._responses  # streamed responses are not cached
+
+    _, _, body = get("/history?coin=Bitcoin,Ethereum", headers={"Accept": api_server.ARROW_CONTENT_TYPE})
+    assert len(pa.ipc.open_stream(body).read_pandas()) == 8
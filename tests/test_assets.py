@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+from assets import load_asset, load_dataset_meta, meta_path
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_first_paint_imports_stay_light():
+    code = "import sys, assets, instrumentation; print(sorted({'pandas', 'numpy', 'pyarrow', 'requests'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+
+def test_dataset_meta_is_reread_after_it_changes(tmp_path):
+    name = str(tmp_path / "history")
+    assert load_dataset_meta(name) == {}
+    with open(meta_path(name), "w") as f:
+        json.dump({"last_update": "2024-01-01"}, f)
+    assert load_dataset_meta(name) == {"last_update": "2024-01-01"}
+    with open(meta_path(name), "w") as f:
+        json.dump({"last_update": "2024-01-02T00:00:00", "rows": 2}, f)
+    assert load_dataset_meta(name)["last_update"] == "2024-01-02T00:00:00"
+
+
+def test_load_asset(tmp_path):
+    path = tmp_path / "header.html"
+    path.write_text("<h1>racecap</h1>")
+    assert load_asset(str(path)) == "<h1>racecap</h1>"
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backfill
+from backfill import BACKFILL_START, backfill_coins, backfill_windows
+from instrumentation import finish_run
+from partitioned_store import PartitionedStore
+
+
+def test_windows_are_aligned_on_the_backfill_start_newest_first():
+    windows = backfill_windows("2014-06-01", "2016-01-10", window_days=365)
+    origin = pd.Timestamp(BACKFILL_START)
+    assert windows[0] == (origin + pd.Timedelta(days=2 * 365), pd.Timestamp("2016-01-10"))
+    assert windows[-1] == (origin + pd.Timedelta(days=365), origin + pd.Timedelta(days=2 * 365))
+    assert windows[-1][0] <= pd.Timestamp("2014-06-01")
+    assert all(newer[0] == older[1] for newer, older in zip(windows, windows[1:]))
+
+
+def test_windows_keep_their_starts_from_one_day_to_the_next():
+    today = backfill_windows("2017-01-01", "2020-03-01", window_days=100)
+    tomorrow = backfill_windows("2017-01-01", "2020-03-02", window_days=100)
+    assert [start for start, _ in today] == [start for start, _ in tomorrow]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PartitionedStore(str(tmp_path / "history"))
+
+
+def universe(*coins):
+    return lambda n: [{"id": coin_id, "name": coin_id.title()} for coin_id in coins]
+
+
+def test_coins_are_taken_by_market_cap_rank_not_by_id(store, monkeypatch):
+    store.update_metadata(coin_ids={"aave": "Aave", "bitcoin": "Bitcoin", "ethereum": "Ethereum"},
+                          ranked_coin_ids=["bitcoin", "ethereum", "aave"])
+    monkeypatch.setattr(backfill, "discover_universe", lambda n: pytest.fail("the store's ranking is enough"))
+    assert list(backfill_coins(store, n=2)) == ["bitcoin", "ethereum"]
+    assert backfill_coins(store, ["aave"]) == {"aave": "Aave"}
+
+
+def test_coins_fall_back_to_the_market_ranking(store, monkeypatch):
+    store.update_metadata(coin_ids={"aave": "Aave", "bitcoin": "Bitcoin"})
+    monkeypatch.setattr(backfill, "discover_universe", universe("bitcoin", "tether", "aave"))
+    assert backfill_coins(store, n=2) == {"bitcoin": "Bitcoin", "tether": "Tether"}
+    with pytest.raises(ValueError, match="Unknown coin ids: dogecoin"):
+        backfill_coins(store, ["bitcoin", "dogecoin"])
+
+
+# Daily market caps of coins listed on the given dates; windows ending
+# before a coin's listing come back empty
+class FakeClient:
+    def __init__(self, listings):
+        self.listings = {coin_id: pd.Timestamp(date) for coin_id, date in listings.items()}
+        self.requests = []
+
+    def get_market_chart_range(self, coin_id, start, end):
+        self.requests.append((coin_id, start, end))
+        days = pd.date_range(max(start, self.listings[coin_id]), end, freq="D")
+        return {"market_caps": (days.to_numpy(), np.arange(1.0, len(days) + 1))}
+
+
+def sequential(fetch, items):
+    for item in items:
+        yield item, fetch(item), None
+
+
+def test_windows_before_a_coins_listing_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    until = pd.Timestamp.now("UTC").tz_localize(None).floor("D") - pd.Timedelta(days=1)
+    listing = until - pd.Timedelta(days=500)
+    client = FakeClient({"bitcoin": "2013-04-28", "newcoin": listing})
+    monkeypatch.setattr(backfill, "get_client", lambda: client)
+    monkeypatch.setattr(backfill, "fetch_concurrently", sequential)
+    monkeypatch.setattr(backfill, "discover_universe", universe("bitcoin", "newcoin"))
+    monkeypatch.setattr(backfill, "finish_run", lambda run: finish_run(run, log_path=None))
+
+    since = until - pd.Timedelta(days=4 * 365)
+    windows = backfill_windows(since, until)
+    assert backfill.backfill(["bitcoin", "newcoin"], since=since) == {"Bitcoin", "Newcoin"}
+
+    # The first empty window of the new coin is the last one requested for it
+    newcoin_starts = [start for coin_id, start, _ in client.requests if coin_id == "newcoin"]
+    assert len(newcoin_starts) == sum(end > listing for _, end in windows) + 1
+    assert len([request for request in client.requests if request[0] == "bitcoin"]) == len(windows)
+
+    store = PartitionedStore(backfill.HISTORY_DATASET)
+    assert store.earliest_timestamps() == {"Bitcoin": since, "Newcoin": listing}
+    assert not os.path.exists(os.path.join(".fetch_checkpoints", "backfill"))  # every window is done
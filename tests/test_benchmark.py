@@ -0,0 +1,38 @@
+import pytest
+
+from benchmark import NOISE_FLOOR, REGRESSION_THRESHOLD, find_regressions
+
+
+def results(**medians):
+    return {"stages": {stage: {"median": median} for stage, median in medians.items()}}
+
+
+def test_only_stages_slower_than_the_threshold_are_flagged():
+    baseline = results(fetch=1.0, merge=1.0, store=1.0, load=0.5, figure=0.2)
+    current = results(
+        fetch=1.0 * (1 + REGRESSION_THRESHOLD) + 0.01,  # just over the threshold
+        merge=1.0 * (1 + REGRESSION_THRESHOLD) - 0.01,  # just under it
+        store=0.5,                                      # faster
+        load=0.5 * (1 + REGRESSION_THRESHOLD),          # exactly at it
+        figure=0.4,                                     # twice as slow
+    )
+    assert find_regressions(current, baseline) == [
+        ("fetch", 1.0, pytest.approx(1.26)),
+        ("figure", 0.2, 0.4),
+    ]
+
+
+def test_custom_threshold():
+    baseline, current = results(merge=1.0), results(merge=1.1)
+    assert find_regressions(current, baseline, threshold=0.05) == [("merge", 1.0, 1.1)]
+    assert find_regressions(current, baseline, threshold=0.2) == []
+
+
+def test_slowdowns_within_the_noise_floor_are_ignored():
+    baseline = results(filter=0.001)
+    assert find_regressions(results(filter=0.001 + NOISE_FLOOR / 2), baseline) == []
+    assert find_regressions(results(filter=0.001 + NOISE_FLOOR * 2), baseline) == [("filter", 0.001, 0.001 + NOISE_FLOOR * 2)]
+
+
+def test_stages_missing_from_the_baseline_are_skipped():
+    assert find_regressions(results(fetch=1.0, overlays=5.0), results(fetch=1.0)) == []
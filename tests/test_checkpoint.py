@@ -0,0 +1,55 @@
+import json
+import time
+
+import pandas as pd
+
+from checkpoint import FetchCheckpoint
+
+PARAMS = {"number_of_coins": 50, "chart_params": {"days": "30"}}
+
+
+def coin_frame(value):
+    return pd.DataFrame({"Timestamp": pd.date_range("2024-01-01", periods=2), "Market Cap (USD)": [value, value]})
+
+
+def test_interrupted_run_resumes_with_pending_items(tmp_path):
+    first = FetchCheckpoint("run", PARAMS, directory=str(tmp_path))
+    assert first.plan(lambda: ["bitcoin", "ethereum", "tether"]) == ["bitcoin", "ethereum", "tether"]
+    first.save("bitcoin", coin_frame(1.0))
+    first.skip(["tether"])
+    assert not FetchCheckpoint("other", PARAMS, directory=str(tmp_path)).resumed
+
+    resumed = FetchCheckpoint("run", dict(PARAMS), directory=str(tmp_path))
+    assert resumed.resumed
+    # The planned items are kept even if the source list changed since
+    assert resumed.plan(lambda: ["solana"]) == ["bitcoin", "ethereum", "tether"]
+    assert resumed.pending(["bitcoin", "ethereum", "tether"]) == ["ethereum"]
+    results = resumed.results()
+    assert results["tether"] is None
+    pd.testing.assert_frame_equal(results["bitcoin"], coin_frame(1.0))
+
+
+def test_changed_fingerprint_starts_a_fresh_run(tmp_path):
+    FetchCheckpoint("run", PARAMS, directory=str(tmp_path)).save("bitcoin", coin_frame(1.0))
+    fresh = FetchCheckpoint("run", dict(PARAMS, number_of_coins=100), directory=str(tmp_path))
+    assert not fresh.resumed
+    assert fresh.results() == {}
+    assert not (tmp_path / "run" / "bitcoin.parquet").exists()
+
+
+def test_old_checkpoint_is_discarded(tmp_path):
+    FetchCheckpoint("run", PARAMS, directory=str(tmp_path)).save("bitcoin")
+    assert FetchCheckpoint("run", PARAMS, directory=str(tmp_path), max_age=3600).resumed
+    manifest_path = tmp_path / "run" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest["started_at"] = time.time() - 7200
+    manifest_path.write_text(json.dumps(manifest))
+    assert not FetchCheckpoint("run", PARAMS, directory=str(tmp_path), max_age=3600).resumed
+
+
+def test_clear_removes_the_checkpoint(tmp_path):
+    checkpoint = FetchCheckpoint("run", PARAMS, directory=str(tmp_path))
+    checkpoint.save("bitcoin", coin_frame(1.0))
+    checkpoint.clear()
+    assert not (tmp_path / "run").exists()
+    assert not FetchCheckpoint("run", PARAMS, directory=str(tmp_path)).resumed
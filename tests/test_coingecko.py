@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+from coingecko import CoinGeckoClient, TokenBucket, fetch_concurrently, parse_retry_after
+from mock_coingecko import MockCoinGecko
+
+
+# Clock that only moves when the code under test sleeps
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def fake_bucket(rate=1.0, capacity=1):
+    clock = FakeClock()
+    return TokenBucket(rate=rate, capacity=capacity, clock=clock, sleep=clock.sleep), clock
+
+
+@pytest.fixture
+def server():
+    with MockCoinGecko(coins=10) as mock:
+        yield mock
+
+
+def test_token_bucket_allows_burst_then_paces_at_rate():
+    bucket, clock = fake_bucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0.0
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_token_bucket_pause_blocks_every_caller():
+    bucket, clock = fake_bucket(rate=10.0, capacity=5)
+    bucket.pause(30)
+    bucket.acquire()
+    assert clock.now >= 30
+    assert clock.sleeps[0] == pytest.approx(30)
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("-5") == 0
+    assert parse_retry_after(None, default=7) == 7
+    assert parse_retry_after("soon", default=7) == 7
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=90)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(90, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0
+
+
+def test_client_waits_retry_after_then_succeeds(server):
+    server.rate_limited = 2
+    bucket, clock = fake_bucket(rate=4.0, capacity=10)
+    client = CoinGeckoClient(base_url=server.url, bucket=bucket, cache_dir=None)
+    data = client.get_json("/simple/price", params={"ids": "bitcoin", "vs_currencies": "usd"})
+    assert "bitcoin" in data
+    assert server.requests == 3
+    # Each 429 (Retry-After: 1) paused the bucket for a second, after which
+    # it refilled at its own rate
+    assert clock.sleeps == [1.0, 0.25, 1.0, 0.25]
+
+
+def test_client_gives_up_after_max_retries(server):
+    server.rate_limited = 100
+    bucket, clock = fake_bucket(rate=4.0, capacity=10)
+    client = CoinGeckoClient(base_url=server.url, bucket=bucket, max_retries=2, cache_dir=None)
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        client.get("/simple/price", params={"ids": "bitcoin", "vs_currencies": "usd"})
+    assert error.value.response.status_code == 429
+    assert server.requests == 3
+    assert clock.now == pytest.approx(2.5)
+
+
+def test_fetch_concurrently_yields_errors_per_item(server):
+    bucket, _ = fake_bucket(rate=1024.0, capacity=1024)
+    client = CoinGeckoClient(base_url=server.url, bucket=bucket, cache_dir=None)
+    params = {"vs_currency": "usd", "days": "30", "interval": "daily"}
+
+    def fetch(coin_id):
+        return client.get_market_chart(coin_id, params)["market_caps"]
+
+    results = {item: (result, error) for item, result, error in fetch_concurrently(fetch, ["bitcoin", "ethereum", "missing-coin"])}
+    assert set(results) == {"bitcoin", "ethereum", "missing-coin"}
+    for coin_id in ("bitcoin", "ethereum"):
+        timestamps, market_caps = results[coin_id][0]
+        assert results[coin_id][1] is None
+        assert len(timestamps) == len(market_caps) >= 30
+    assert results["missing-coin"][0] is None
+    error = results["missing-coin"][1]
+    assert isinstance(error, requests.exceptions.HTTPError)
+    assert error.response.status_code == 404
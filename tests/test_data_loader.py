@@ -0,0 +1,134 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_loader
+from data_loader import cached, file_signature, invalidate, time_slice
+
+
+def frame(time_index):
+    days = pd.date_range("2024-01-01", periods=5, freq="D")
+    df = pd.DataFrame({"Timestamp": days, "Value": range(5)})
+    if time_index:
+        df.index = pd.DatetimeIndex(days)
+    return df
+
+
+@pytest.mark.parametrize("time_index", [True, False])
+@pytest.mark.parametrize("start, end, expected", [
+    ("2024-01-02", "2024-01-04", [1, 2, 3]),  # both bounds are inclusive
+    ("2024-01-02 12:00", "2024-01-03 23:59", [2]),
+    (None, "2024-01-02", [0, 1]),
+    ("2024-01-04", None, [3, 4]),
+    (None, None, [0, 1, 2, 3, 4]),
+    ("2023-01-01", "2030-01-01", [0, 1, 2, 3, 4]),
+    ("2024-01-02 06:00", "2024-01-02 18:00", []),  # between two rows
+    ("2025-01-01", None, []),
+    (None, "2023-12-31", []),
+    ("2024-01-04", "2024-01-02", []),
+])
+def test_time_slice_bounds(time_index, start, end, expected):
+    assert time_slice(frame(time_index), start, end)["Value"].tolist() == expected
+
+
+def test_time_slice_of_an_empty_frame():
+    empty = pd.DataFrame({"Timestamp": pd.Series([], dtype="datetime64[ns]"), "Value": []})
+    assert time_slice(empty, "2024-01-01", "2024-12-31").empty
+    empty.index = pd.DatetimeIndex(empty["Timestamp"])
+    assert time_slice(empty, None, "2024-12-31").empty
+    # The placeholder the loaders return before a dataset exists
+    assert time_slice(pd.DataFrame(columns=["Timestamp", "Value"]), "2024-01-01", "2024-12-31").empty
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(data_loader.time, "monotonic", clock)
+    invalidate()
+    yield clock
+    invalidate()
+
+
+# Loader and signature that count their calls
+class Source:
+    def __init__(self):
+        self.version = 1
+        self.loads = self.checks = 0
+
+    def load(self):
+        self.loads += 1
+        return {"version": self.version}
+
+    def signature(self):
+        self.checks += 1
+        return self.version
+
+
+def test_hit_within_the_ttl_skips_the_loader_and_the_signature(clock):
+    source = Source()
+    first = cached("key", source.load, source.signature, ttl=10)
+    clock.now += 9
+    assert cached("key", source.load, source.signature, ttl=10) is first
+    assert (source.loads, source.checks) == (1, 1)
+
+
+def test_expired_entry_with_the_same_signature_is_kept(clock):
+    source = Source()
+    first = cached("key", source.load, source.signature, ttl=10)
+    clock.now += 11
+    assert cached("key", source.load, source.signature, ttl=10) is first
+    assert (source.loads, source.checks) == (1, 2)
+    # The check restarts the TTL
+    clock.now += 9
+    cached("key", source.load, source.signature, ttl=10)
+    assert source.checks == 2
+
+
+def test_changed_signature_reloads_once_the_ttl_has_expired(clock):
+    source = Source()
+    cached("key", source.load, source.signature, ttl=10)
+    source.version = 2
+    clock.now += 5
+    assert cached("key", source.load, source.signature, ttl=10) == {"version": 1}
+    clock.now += 6
+    assert cached("key", source.load, source.signature, ttl=10) == {"version": 2}
+    assert source.loads == 2
+
+
+def test_file_signature_tracks_the_file(clock, tmp_path):
+    path = str(tmp_path / "data.csv")
+    assert file_signature(path) is None
+    with open(path, "w") as f:
+        f.write("a")
+    source = Source()
+    cached("file", source.load, lambda: file_signature(path), ttl=0)
+    cached("file", source.load, lambda: file_signature(path), ttl=0)
+    assert source.loads == 1
+    with open(path, "w") as f:
+        f.write("ab")
+    os.utime(path, ns=(0, 0))
+    cached("file", source.load, lambda: file_signature(path), ttl=0)
+    assert source.loads == 2
+
+
+def test_invalidate_drops_one_entry_or_all(clock):
+    first, second = Source(), Source()
+    cached("first", first.load, first.signature)
+    cached("second", second.load, second.signature)
+    invalidate("first")
+    cached("first", first.load, first.signature)
+    cached("second", second.load, second.signature)
+    assert (first.loads, second.loads) == (2, 1)
+    invalidate()
+    cached("first", first.load, first.signature)
+    cached("second", second.load, second.signature)
+    assert (first.loads, second.loads) == (3, 2)
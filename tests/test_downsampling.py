@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import downsampling
+from downsampling import downsample_arrays, downsample_frame, downsample_indices, lttb_indices, minmax_indices
+
+
+def series(n, seed=0):
+    x = pd.date_range("2020-01-01", periods=n, freq="h").to_numpy()
+    y = np.random.default_rng(seed).normal(size=n).cumsum()
+    return x, y
+
+
+@pytest.mark.parametrize("method", [lttb_indices, minmax_indices])
+@pytest.mark.parametrize("n, threshold", [(10, 10), (10, 50), (5, 2)])
+def test_short_series_are_kept_whole(method, n, threshold):
+    x, y = series(n)
+    assert method(x, y, threshold).tolist() == list(range(n))
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 100), (1001, 3), (5000, 1200), (1200, 1199)])
+def test_lttb_keeps_endpoints_and_one_point_per_bucket(n, threshold):
+    x, y = series(n)
+    indices = lttb_indices(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert indices.min() >= 0 and indices.max() < n
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x, y = series(2000)
+    y[777] = 1e6
+    assert 777 in lttb_indices(x, y, 100)
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 100), (1001, 4), (999, 997)])
+def test_minmax_keeps_the_extremes_in_order(n, threshold):
+    x, y = series(n)
+    indices = minmax_indices(x, y, threshold)
+    assert indices.min() >= 0 and indices.max() < n
+    assert np.all(np.diff(indices) > 0)
+    assert len(indices) <= threshold
+    assert np.argmin(y) in indices and np.argmax(y) in indices
+
+
+def test_downsample_arrays_returns_short_series_unchanged():
+    x, y = series(100)
+    plot_x, plot_y = downsample_arrays(x, y, points=100)
+    assert plot_x is x and plot_y is y
+
+
+def test_downsample_indices_are_cached_per_series_and_width(monkeypatch):
+    calls = []
+
+    def counting(x, y, threshold):
+        calls.append(threshold)
+        return lttb_indices(x, y, threshold)
+
+    monkeypatch.setitem(downsampling.METHODS, "counting", counting)
+    x, y = series(3000)
+    first = downsample_indices(x, y, 200, method="counting")
+    again = downsample_indices(x.copy(), y.copy(), 200, method="counting")
+    assert again is first
+    downsample_indices(x, y, 300, method="counting")
+    y[10] += 1
+    downsample_indices(x, y, 200, method="counting")
+    assert calls == [200, 300, 200]
+
+
+def test_downsample_frame_selects_rows():
+    x, y = series(3000)
+    df = pd.DataFrame({"Timestamp": x, "Market Cap (USD)": y})
+    plot_df = downsample_frame(df, "Timestamp", "Market Cap (USD)", points=300)
+    assert len(plot_df) == 300
+    assert plot_df.index[0] == 0 and plot_df.index[-1] == 2999
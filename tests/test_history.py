@@ -0,0 +1,73 @@
+import warnings
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from history import BASE_COLUMNS, build_market_cap_table, days_to_fetch, merge_history, normalize_series
+
+
+def test_normalize_series_keeps_the_latest_point_of_each_bucket():
+    index = pd.DatetimeIndex(["2024-01-01 00:00", "2024-01-02 00:00", "2024-01-02 13:45"])
+    series = pd.Series([1.0, 2.0, 2.5], index=index, name="bitcoin")
+    normalized = normalize_series(series)
+    assert normalized.index.tolist() == [pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-02")]
+    assert normalized.tolist() == [1.0, 2.5]
+    assert normalized.name == "bitcoin"
+
+
+def test_normalize_series_hourly():
+    index = pd.DatetimeIndex(["2024-01-01 00:05", "2024-01-01 00:55", "2024-01-01 01:02"])
+    series = pd.Series([1.0, 2.0, 3.0], index=index)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        normalized = normalize_series(series, "hourly")
+    assert normalized.index.tolist() == [pd.Timestamp("2024-01-01 00:00"), pd.Timestamp("2024-01-01 01:00")]
+    assert normalized.tolist() == [2.0, 3.0]
+
+
+@pytest.mark.parametrize("latest, expected", [
+    (None, 365),
+    (datetime(2024, 1, 9, 0, 0), 3),
+    (datetime(2024, 1, 1, 0, 0), 11),
+    (datetime(2020, 1, 1), 365),
+])
+def test_days_to_fetch(latest, expected):
+    assert days_to_fetch(latest, now=datetime(2024, 1, 10, 6, 0)) == expected
+
+
+def test_merge_history_replaces_the_refetched_tail_per_coin():
+    existing = pd.DataFrame({
+        "Timestamp": pd.to_datetime(["2024-01-01 00:00", "2024-01-02 00:00", "2024-01-02 12:00", "2024-01-01 00:00"]),
+        "Coin": ["Bitcoin", "Bitcoin", "Bitcoin", "Ethereum"],
+        "Market Cap (USD)": [1.0, 2.0, 2.5, 5.0],
+    })
+    new = pd.DataFrame({
+        "Timestamp": pd.to_datetime(["2024-01-02", "2024-01-03"]),
+        "Coin": ["Bitcoin", "Bitcoin"],
+        "Market Cap (USD)": [2.2, 3.0],
+    })
+    merged = merge_history(existing, new)
+    assert merged[merged["Coin"] == "Bitcoin"]["Market Cap (USD)"].tolist() == [1.0, 2.2, 3.0]
+    assert merged[merged["Coin"] == "Ethereum"]["Market Cap (USD)"].tolist() == [5.0]
+
+
+def test_build_market_cap_table_aligns_coins_and_totals():
+    def series(coin_id, days, values):
+        return pd.Series(values, index=pd.DatetimeIndex(pd.to_datetime(days), name="Timestamp"), name=coin_id)
+
+    days = ["2024-01-01", "2024-01-02"]
+    series_by_coin = {
+        "bitcoin": series("bitcoin", days, [100.0, 110.0]),
+        "ethereum": series("ethereum", days, [50.0, 55.0]),
+        "tether": series("tether", days, [10.0, 11.0]),
+        "usd-coin": series("usd-coin", ["2024-01-02"], [5.0]),
+        "solana": series("solana", days, [3.0, 4.0]),
+        "dogecoin": series("dogecoin", ["2024-01-01"], [1.0]),
+    }
+    table = build_market_cap_table(series_by_coin, ["solana", "dogecoin"])
+    assert list(table.columns) == BASE_COLUMNS
+    assert table["Timestamp"].tolist() == list(pd.to_datetime(days))
+    assert table["USDC Market Cap"].tolist() == [0.0, 5.0]
+    assert table["Stablecoin Total Market Cap"].tolist() == [10.0, 16.0]
+    assert table["Altcoins Market Cap"].tolist() == [4.0, 4.0]
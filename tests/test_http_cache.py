@@ -0,0 +1,54 @@
+import os
+import time
+
+import requests
+
+from http_cache import STALE_GRACE, ResponseCache, cache_ttl
+
+RANGE_URL = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart/range"
+CHART_URL = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"
+
+
+def response(content=b'{"market_caps": []}', etag='"abc"'):
+    result = requests.Response()
+    result.status_code = 200
+    result._content = content
+    result.headers["ETag"] = etag
+    return result
+
+
+def entry_files(directory):
+    return sorted(name for _, _, names in os.walk(directory) for name in names)
+
+
+def test_put_get_round_trip_with_validators(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(CHART_URL, {"days": "30", "vs_currency": "usd"}, response())
+    entry = cache.get(CHART_URL, {"vs_currency": "usd", "days": "30"})
+    assert entry.content == b'{"market_caps": []}'
+    assert entry.validators() == {"If-None-Match": '"abc"'}
+    assert cache.get(CHART_URL, {"vs_currency": "usd", "days": "31"}) is None
+
+
+def test_prune_deletes_entries_past_their_ttl_and_grace(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(CHART_URL, {"days": "30"}, response())
+    cache.put(RANGE_URL, {"from": "0", "to": "1"}, response())
+    assert len(entry_files(tmp_path)) == 4
+
+    # Expired but still within the grace period: kept for revalidation
+    assert cache.prune(now=time.time() + cache_ttl(CHART_URL) + STALE_GRACE / 2) == 0
+    # The market_chart entry is past its grace period, the range one is not
+    assert cache.prune(now=time.time() + cache_ttl(CHART_URL) + STALE_GRACE + 1) == 1
+    assert cache.get(CHART_URL, {"days": "30"}) is None
+    assert cache.get(RANGE_URL, {"from": "0", "to": "1"}) is not None
+    assert len(entry_files(tmp_path)) == 2
+
+
+def test_put_prunes_at_most_once_per_interval(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), prune_interval=3600)
+    calls = []
+    monkeypatch.setattr(cache, "prune", lambda: calls.append(1))
+    for days in range(5):
+        cache.put(CHART_URL, {"days": str(days)}, response())
+    assert calls == [1]
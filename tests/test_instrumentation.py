@@ -0,0 +1,38 @@
+import json
+import threading
+
+import instrumentation
+from instrumentation import count, finish_run, in_current_run, start_run, timed
+
+
+def test_run_records_timings_and_counters_from_workers(tmp_path):
+    run = start_run("test")
+    with timed("stage"):
+        count("calls")
+    worker = threading.Thread(target=in_current_run(lambda: count("calls", 2)))
+    worker.start()
+    worker.join()
+    summary = finish_run(run, log_path=str(tmp_path / "metrics.jsonl"))
+    assert summary["counters"] == {"calls": 3}
+    assert summary["timings"]["stage"]["calls"] == 1
+    assert json.loads((tmp_path / "metrics.jsonl").read_text())["run"] == "test"
+
+
+def test_unfinished_run_is_not_logged_when_the_next_one_starts(tmp_path, monkeypatch):
+    log_path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(instrumentation, "METRICS_LOG", str(log_path))
+    start_run("stopped")
+    run = start_run("next")
+    finish_run(run, log_path=str(log_path))
+    assert [json.loads(line)["run"] for line in log_path.read_text().splitlines()] == ["next"]
+
+
+def test_log_is_rotated_past_its_size_limit(tmp_path, monkeypatch):
+    log_path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(instrumentation, "METRICS_LOG_MAX_BYTES", 200)
+    for _ in range(3):
+        finish_run(start_run("run-with-a-long-enough-name"), log_path=str(log_path))
+    rotated = (tmp_path / "metrics.jsonl.1").read_text().splitlines()
+    current = log_path.read_text().splitlines()
+    assert len(rotated) + len(current) == 3
+    assert log_path.stat().st_size < 400
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics import MARKET_CAP_METRICS, apply_metrics, first_row_after, metric_columns, ratio, total
+
+BASE_COLUMNS = [
+    "Bitcoin Market Cap", "Ethereum Market Cap", "USDT Market Cap",
+    "USDC Market Cap", "Stablecoin Total Market Cap", "Altcoins Market Cap",
+]
+
+
+def market_cap_table(days, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"Timestamp": pd.date_range("2023-01-01", periods=days)})
+    for scale, column in zip([1e12, 4e11, 9e10, 3e10, 0, 6e11], BASE_COLUMNS):
+        df[column] = scale * np.exp(rng.normal(0, 0.02, days).cumsum())
+    df["Stablecoin Total Market Cap"] = df["USDT Market Cap"] + df["USDC Market Cap"]
+    return df
+
+
+def test_pointwise_metrics():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": [3.0, 0.0]})
+    result = apply_metrics(df, [total("a+b", ["a", "b"]), ratio("a/(a+b)", "a", "a+b")])
+    assert result["a+b"].tolist() == [4.0, 2.0]
+    assert result["a/(a+b)"].tolist() == [25.0, 100.0]
+    # The input frame is not modified
+    assert list(df.columns) == ["a", "b"]
+
+
+def test_incremental_update_matches_a_full_recompute():
+    full_df = market_cap_table(400)
+    expected = apply_metrics(full_df, MARKET_CAP_METRICS)
+
+    # Metrics stored for the first 300 days, then 100 new days (the first of
+    # which replaces the stored intraday row) are appended
+    stored = apply_metrics(full_df.iloc[:300], MARKET_CAP_METRICS)
+    stored.loc[stored.index[-1], BASE_COLUMNS] *= 1.01
+    stored = pd.concat([stored.iloc[:-1], full_df.iloc[299:]], ignore_index=True)
+    first_new = first_row_after(stored, full_df["Timestamp"].iloc[299])
+    assert first_new == 299
+    updated = apply_metrics(stored, MARKET_CAP_METRICS, first_new)
+
+    columns = metric_columns(MARKET_CAP_METRICS)
+    np.testing.assert_allclose(updated[columns].to_numpy(), expected[columns].to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+def test_incremental_update_only_computes_new_rows():
+    df = market_cap_table(50)
+    stored = apply_metrics(df, MARKET_CAP_METRICS)
+    stored["Bitcoin Dominance (%)"] = -1.0
+    updated = apply_metrics(stored, MARKET_CAP_METRICS, first_new=45)
+    assert (updated["Bitcoin Dominance (%)"].iloc[:45] == -1.0).all()
+    assert updated["Bitcoin Dominance (%)"].iloc[45:].tolist() == pytest.approx(
+        apply_metrics(df, MARKET_CAP_METRICS)["Bitcoin Dominance (%)"].iloc[45:].tolist())
+
+
+def test_missing_metric_columns_are_computed_for_every_row():
+    df = market_cap_table(20)
+    updated = apply_metrics(df, MARKET_CAP_METRICS, first_new=15)
+    assert updated["Bitcoin Dominance (%)"].notna().all()
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+import coingecko
+from coingecko import parse_market_chart
+
+SERIES = ("prices", "market_caps", "total_volumes")
+
+
+# Series of a payload decoded with json.loads, in parse_market_chart's form
+def reference(content, name):
+    points = json.loads(content).get(name) or []
+    timestamps = np.array([point[0] for point in points], dtype=np.int64).astype("datetime64[ms]").astype("datetime64[ns]")
+    values = np.array([np.nan if point[1] is None else point[1] for point in points], dtype=np.float64)
+    return timestamps, values
+
+
+def assert_matches_json(content, series=SERIES):
+    chart = parse_market_chart(content, series)
+    assert list(chart) == list(series)
+    for name in series:
+        timestamps, values = chart[name]
+        expected_timestamps, expected_values = reference(content, name)
+        assert timestamps.dtype == np.dtype("datetime64[ns]") and values.dtype == np.float64
+        np.testing.assert_array_equal(timestamps, expected_timestamps)
+        np.testing.assert_array_equal(values, expected_values)
+
+
+def payload(indent=None, separators=None, **series):
+    return json.dumps(series, indent=indent, separators=separators).encode()
+
+
+POINTS = [[1704067200000, 42000.5], [1704153600000, 43000.25], [1704240000000, 41000.0]]
+
+PAYLOADS = {
+    "normal": payload(prices=POINTS, market_caps=POINTS, total_volumes=POINTS),
+    "nulls": payload(prices=POINTS, market_caps=[[1704067200000, None], [1704153600000, 5.0]], total_volumes=[[1704067200000, None]]),
+    "empty": payload(prices=[], market_caps=POINTS, total_volumes=[]),
+    "missing": payload(market_caps=POINTS),
+    "compact": payload(separators=(",", ":"), prices=POINTS, market_caps=POINTS, total_volumes=POINTS),
+    "pretty": payload(indent=4, prices=POINTS, market_caps=POINTS, total_volumes=POINTS),
+    "exponents": payload(prices=[[1704067200000, -1.5e-07], [1704153600000, 2.5E+12]],
+                         market_caps=[[1704067200000, 1.2345678901234e+21], [1704153600000, -3]],
+                         total_volumes=[[1704067200000, 0], [1704153600000, -0.0]]),
+}
+
+
+@pytest.mark.parametrize("name", sorted(PAYLOADS))
+def test_parse_market_chart_matches_json(name, monkeypatch):
+    monkeypatch.setattr(coingecko, "decode_json", lambda content: pytest.fail("the fast path should parse it"))
+    assert_matches_json(PAYLOADS[name])
+
+
+def test_pretty_printed_payload_with_tabs_and_crlf():
+    content = b'{\r\n\t"market_caps": [\r\n\t\t[ 1704067200000 , 1.5 ],\r\n\t\t[1704153600000,null]\r\n\t]\r\n}'
+    assert_matches_json(content, ("market_caps",))
+
+
+@pytest.mark.parametrize("content", [
+    b'{"market_caps": [[1704067200000, "42000.5"], [1704153600000, "43000"]]}',  # quoted numbers
+    b'{"market_caps": [[1704067200000, 42000.5, 1], [1704153600000, 43000, 2]]}',  # odd numbers per point
+])
+def test_unexpected_shapes_fall_back_to_the_json_decoder(content, monkeypatch):
+    calls = []
+
+    def decode(content):
+        calls.append(content)
+        return json.loads(content)
+    monkeypatch.setattr(coingecko, "decode_json", decode)
+    timestamps, values = parse_market_chart(content)["market_caps"]
+    assert calls == [content]
+    np.testing.assert_array_equal(timestamps, np.array([1704067200000, 1704153600000], dtype="datetime64[ms]"))
+    np.testing.assert_array_equal(values, [42000.5, 43000.0])
+
+
+def test_unterminated_array_falls_back_and_raises():
+    with pytest.raises(ValueError):
+        parse_market_chart(b'{"market_caps": [[1704067200000, 42000.5]')
@@ -0,0 +1,103 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from partitioned_store import PartitionedStore, long_to_wide, wide_to_long
+
+
+def rows(coin, start, values, freq="D"):
+    return pd.DataFrame({
+        "Timestamp": pd.date_range(start, periods=len(values), freq=freq),
+        "Coin": coin,
+        "Market Cap (USD)": [float(v) for v in values],
+    })
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PartitionedStore(str(tmp_path / "store"))
+
+
+def test_append_partitions_by_coin_and_month(store):
+    written = store.append(pd.concat([rows("Bitcoin", "2024-01-30", [1, 2, 3]), rows("Bitcoin Cash", "2024-02-01", [4])]))
+    assert sorted(written) == ["Bitcoin/2024-01", "Bitcoin/2024-02", "Bitcoin_Cash/2024-02"]
+    assert store.version == 1
+    assert store.latest_timestamps() == {"Bitcoin": pd.Timestamp("2024-02-01"), "Bitcoin Cash": pd.Timestamp("2024-02-01")}
+    df = store.read(coins=["Bitcoin"], start="2024-01-31")
+    assert df["Market Cap (USD)"].tolist() == [2.0, 3.0]
+
+
+def test_append_replaces_rows_with_the_same_timestamp(store):
+    store.append(rows("Bitcoin", "2024-01-01", [1, 2, 3]))
+    store.append(rows("Bitcoin", "2024-01-03", [30, 40]))
+    df = store.read()
+    assert df["Market Cap (USD)"].tolist() == [1.0, 2.0, 30.0, 40.0]
+    assert store.load_manifest()["partitions"]["Bitcoin/2024-01"]["rows"] == 4
+
+
+def test_append_replace_tail_drops_the_superseded_intraday_point(store):
+    first = rows("Bitcoin", "2024-01-01", [1, 2, 3])
+    intraday = pd.DataFrame({"Timestamp": [pd.Timestamp("2024-01-03 15:00")], "Coin": ["Bitcoin"], "Market Cap (USD)": [3.5]})
+    store.append(pd.concat([first, intraday]))
+    # The refetched window starts on the 3rd and no longer has the 15:00 point
+    store.append(rows("Bitcoin", "2024-01-03", [31, 41]), replace_tail=True)
+    df = store.read()
+    assert df["Timestamp"].tolist() == list(pd.date_range("2024-01-01", periods=4))
+    assert df["Market Cap (USD)"].tolist() == [1.0, 2.0, 31.0, 41.0]
+
+
+def test_append_replace_tail_keeps_other_coins(store):
+    store.append(pd.concat([rows("Bitcoin", "2024-01-01", [1, 2, 3]), rows("Ethereum", "2024-01-01", [5, 6, 7])]))
+    store.append(rows("Bitcoin", "2024-01-02", [20]), replace_tail=True)
+    df = store.read()
+    assert df[df["Coin"] == "Bitcoin"]["Market Cap (USD)"].tolist() == [1.0, 20.0]
+    assert df[df["Coin"] == "Ethereum"]["Market Cap (USD)"].tolist() == [5.0, 6.0, 7.0]
+
+
+def test_locked_is_reentrant_within_a_thread(store):
+    with store.locked():
+        with store.locked():
+            store.append(rows("Bitcoin", "2024-01-01", [1]))
+        store.update_metadata(coin_ids={"bitcoin": "Bitcoin"})
+    assert store.version == 2
+    assert store.metadata() == {"coin_ids": {"bitcoin": "Bitcoin"}}
+
+
+def test_locked_blocks_other_threads_until_released(store):
+    entered = threading.Event()
+
+    def writer():
+        with store.locked():
+            entered.set()
+
+    with store.locked():
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(0.2)
+        assert not entered.is_set()
+    thread.join(5)
+    assert entered.is_set()
+
+
+def test_wide_long_round_trip():
+    wide = pd.DataFrame({
+        "Timestamp": pd.date_range("2024-01-01", periods=3),
+        "Ethereum": [4.0, 5.0, 6.0],
+        "Bitcoin": [1.0, None, 3.0],
+    })
+    long_df = wide_to_long(wide)
+    # Missing values are not stored
+    assert len(long_df) == 5
+    back = long_to_wide(long_df)
+    assert list(back.columns) == ["Timestamp", "Bitcoin", "Ethereum"]
+    pd.testing.assert_frame_equal(back, wide[["Timestamp", "Bitcoin", "Ethereum"]], check_dtype=False)
+
+
+def test_long_wide_round_trip_through_the_store(store):
+    long_df = pd.concat([rows("Bitcoin", "2024-01-30", [1, 2, 3]), rows("Ethereum", "2024-01-31", [4, 5])])
+    store.append(long_df)
+    back = wide_to_long(long_to_wide(store.read()))
+    expected = long_df.sort_values(["Coin", "Timestamp"]).reset_index(drop=True)
+    back = back.sort_values(["Coin", "Timestamp"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(back, expected, check_dtype=False)
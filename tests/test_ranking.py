@@ -0,0 +1,121 @@
+import pandas as pd
+import pytest
+
+import data_loader
+from data_loader import load_ranking_index, publish_ranked_view, ranked_view
+from data_plane import attach, source_signature
+from partitioned_store import PartitionedStore
+from ranking import RankingIndex
+from storage import write_table
+
+
+def rows(coin, start, values):
+    return pd.DataFrame({
+        "Timestamp": pd.date_range(start, periods=len(values), freq="D"),
+        "Coin": coin,
+        "Market Cap (USD)": [float(v) for v in values],
+    })
+
+
+def history():
+    return pd.concat([
+        rows("Bitcoin", "2024-01-01", [10, 20, 30]),
+        rows("Ethereum", "2024-01-02", [5, 40]),
+        rows("Dogecoin", "2024-01-01", [1, 2, 3]),
+    ], ignore_index=True)
+
+
+def ticks(*entries):
+    return pd.DataFrame({
+        "Timestamp": [pd.Timestamp(timestamp) for timestamp, _, _ in entries],
+        "Coin": [coin for _, coin, _ in entries],
+        "Price (USD)": 1.0,
+        "Market Cap (USD)": [float(value) for _, _, value in entries],
+    })
+
+
+@pytest.fixture
+def published(tmp_path, monkeypatch):
+    name = str(tmp_path / "history")
+    categories_path = str(tmp_path / "categories.csv")
+    PartitionedStore(name).append(history())
+    PartitionedStore(name).update_metadata(universe=["Bitcoin", "Ethereum", "Dogecoin"])
+    write_table(pd.DataFrame({"Coin": ["Bitcoin", "Ethereum"], "Category": ["Layer 1", "Smart Contracts"]}), categories_path)
+    plane = str(tmp_path / "plane")
+    attached = []
+
+    def attach_from_plane(view, columns=None, source=None):
+        frame = attach(view, columns, plane, source)
+        attached.append(frame)
+        return frame
+    monkeypatch.setattr(data_loader, "attach", attach_from_plane)
+    monkeypatch.setattr(data_loader, "load_spot_ticks", lambda root=".": ticks())
+    data_loader.invalidate()
+    yield name, categories_path, plane, attached
+    data_loader.invalidate()
+
+
+def test_ranking_orders_coins_by_latest_value():
+    ranking = RankingIndex(history())
+    assert ranking.coins == ["Ethereum", "Bitcoin", "Dogecoin"]
+    assert ranking.top(2) == ["Ethereum", "Bitcoin"]
+    assert ranking.order(["Dogecoin", "Unknown", "Ethereum"]) == ["Ethereum", "Dogecoin"]
+    assert ranking.rows("Bitcoin")["Market Cap (USD)"].tolist() == [10.0, 20.0, 30.0]
+    assert ranking.select(["Dogecoin", "Ethereum"])["Market Cap (USD)"].tolist() == [5.0, 40.0, 1.0, 2.0, 3.0]
+    assert ranking.last_update == pd.Timestamp("2024-01-03")
+
+
+def test_ticks_rerank_and_extend_the_coins_rows():
+    ranking = RankingIndex(history(), ticks=ticks(
+        ("2024-01-03 12:00", "Bitcoin", 50),
+        ("2024-01-02 12:00", "Dogecoin", 99),  # older than the stored point
+        ("2024-01-03 12:00", "Unknown", 1000),
+    ))
+    assert ranking.coins == ["Bitcoin", "Ethereum", "Dogecoin"]
+    assert ranking.rows("Bitcoin")["Market Cap (USD)"].tolist() == [10.0, 20.0, 30.0, 50.0]
+    assert ranking.rows("Dogecoin")["Market Cap (USD)"].tolist() == [1.0, 2.0, 3.0]
+    selected = ranking.select(["Ethereum", "Bitcoin"])
+    assert selected["Market Cap (USD)"].tolist() == [10.0, 20.0, 30.0, 50.0, 5.0, 40.0]
+    assert selected["Coin"].cat.ordered
+    assert ranking.last_update == pd.Timestamp("2024-01-03 12:00")
+
+
+def test_ranked_view_is_published_and_mapped(published):
+    name, categories_path, plane, attached = published
+    assert publish_ranked_view(name, categories_path, plane) == 1
+    frame = attach(ranked_view(name), directory=plane, source=source_signature(name, categories_path))
+    assert frame["Coin"].cat.categories.tolist() == ["Ethereum", "Bitcoin", "Dogecoin"]
+    assert frame["Category"].dtype == "category"
+
+    ranking = load_ranking_index(name, categories_path)
+    assert ranking.frame["Coin"].cat.ordered
+    assert ranking.frame is attached[-1]  # the mapped frame itself, not a copy
+    expected = RankingIndex(data_loader.with_categories(history(), data_loader.read_categories(categories_path)))
+    assert ranking.coins == expected.coins
+    assert ranking.latest["Category"].to_dict() == {"Ethereum": "Smart Contracts", "Bitcoin": "Layer 1", "Dogecoin": "Top 50 Coins"}
+    for coin in expected.coins:
+        pd.testing.assert_frame_equal(ranking.rows(coin).reset_index(drop=True), expected.rows(coin).reset_index(drop=True),
+                                      check_dtype=False, check_categorical=False)
+
+
+def test_stale_ranked_view_is_not_used(published):
+    name, categories_path, plane, attached = published
+    publish_ranked_view(name, categories_path, plane)
+    write_table(pd.DataFrame({"Coin": ["Bitcoin"], "Category": ["Store of Value"]}), categories_path)
+    assert attach(ranked_view(name), directory=plane, source=source_signature(name, categories_path)) is None
+    ranking = load_ranking_index(name, categories_path)
+    assert ranking.latest.loc["Bitcoin", "Category"] == "Store of Value"
+    assert attached[-1] is None
+
+
+def test_ticks_extend_the_mapped_ranked_view(published, monkeypatch):
+    name, categories_path, plane, attached = published
+    publish_ranked_view(name, categories_path, plane)
+    monkeypatch.setattr(data_loader, "load_spot_ticks", lambda root=".": ticks(("2024-01-04", "Dogecoin", 100)))
+    ranking = load_ranking_index(name, categories_path)
+    assert ranking.frame is attached[-1]
+    assert ranking.coins == ["Dogecoin", "Ethereum", "Bitcoin"]
+    dogecoin = ranking.rows("Dogecoin")
+    assert dogecoin["Market Cap (USD)"].tolist() == [1.0, 2.0, 3.0, 100.0]
+    assert dogecoin["Category"].tolist() == ["Top 50 Coins"] * 4
+    assert ranking.select(["Bitcoin", "Dogecoin"])["Coin"].tolist() == ["Dogecoin"] * 4 + ["Bitcoin"] * 3
@@ -0,0 +1,120 @@
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+import refresher
+from refresher import CronSchedule, acquire_lock, run_with_retries
+
+
+def runs(expression, start, count=3):
+    schedule, times = CronSchedule(expression), []
+    for _ in range(count):
+        start = schedule.next_after(start)
+        times.append(start)
+    return times
+
+
+@pytest.mark.parametrize("expression, start, expected", [
+    ("*/15 * * * *", datetime(2024, 1, 1, 10, 7), [datetime(2024, 1, 1, 10, 15), datetime(2024, 1, 1, 10, 30), datetime(2024, 1, 1, 10, 45)]),
+    ("5,35 * * * *", datetime(2024, 1, 1, 10, 5), [datetime(2024, 1, 1, 10, 35), datetime(2024, 1, 1, 11, 5), datetime(2024, 1, 1, 11, 35)]),
+    ("0 9-17/4 * * *", datetime(2024, 1, 1, 10, 0), [datetime(2024, 1, 1, 13, 0), datetime(2024, 1, 1, 17, 0), datetime(2024, 1, 2, 9, 0)]),
+    ("30 23 31 12 *", datetime(2024, 6, 1), [datetime(2024, 12, 31, 23, 30), datetime(2025, 12, 31, 23, 30), datetime(2026, 12, 31, 23, 30)]),
+    ("0 0 * * 1-5", datetime(2024, 1, 5, 12, 0), [datetime(2024, 1, 8), datetime(2024, 1, 9), datetime(2024, 1, 10)]),
+])
+def test_steps_ranges_and_lists(expression, start, expected):
+    assert runs(expression, start) == expected
+
+
+def test_next_run_is_strictly_after():
+    assert CronSchedule("* * * * *").next_after(datetime(2024, 1, 1, 10, 0, 30)) == datetime(2024, 1, 1, 10, 1)
+
+
+def test_restricted_day_of_month_and_day_of_week_match_either():
+    # The 13th, or any Friday (2024-01-05 and 2024-01-12 are Fridays)
+    assert runs("0 0 13 * 5", datetime(2024, 1, 1)) == [datetime(2024, 1, 5), datetime(2024, 1, 12), datetime(2024, 1, 13)]
+
+
+def test_step_day_field_is_not_restricted():
+    # Standard cron treats a day field starting with * as unrestricted, so
+    # */2 with a weekday means odd days that are Mondays
+    assert runs("0 0 */2 * 1", datetime(2024, 1, 1)) == [datetime(2024, 1, 15), datetime(2024, 1, 29), datetime(2024, 2, 5)]
+    # and */7 (Sunday only) with the 13th means a 13th that is a Sunday
+    assert runs("0 0 13 * */7", datetime(2024, 1, 1), 2) == [datetime(2024, 10, 13), datetime(2025, 4, 13)]
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "* * * * 7", "5-1 * * * *"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def failing(times):
+    calls = []
+
+    def job():
+        calls.append(len(calls))
+        if len(calls) <= times:
+            raise RuntimeError("boom")
+    return job, calls
+
+
+def test_retries_back_off_with_increasing_delays(monkeypatch):
+    monkeypatch.setattr(refresher.random, "uniform", lambda low, high: 0)
+    job, calls = failing(2)
+    delays = []
+    assert run_with_retries("job", job, sleep=delays.append)
+    assert len(calls) == 3
+    assert delays == [refresher.RETRY_BASE_DELAY, refresher.RETRY_BASE_DELAY * 2]
+
+
+def test_retries_give_up_after_max_attempts_with_jitter():
+    job, calls = failing(refresher.MAX_ATTEMPTS)
+    delays = []
+    assert not run_with_retries("job", job, sleep=delays.append)
+    assert len(calls) == refresher.MAX_ATTEMPTS
+    assert len(delays) == refresher.MAX_ATTEMPTS - 1
+    for attempt, delay in enumerate(delays):
+        base = min(refresher.RETRY_MAX_DELAY, refresher.RETRY_BASE_DELAY * 2 ** attempt)
+        assert base <= delay <= base * 1.5
+    assert delays == sorted(delays)
+
+
+def second_instance_gets_lock(path):
+    code = f"import refresher, sys; sys.exit(0 if refresher.acquire_lock({path!r}) is not None else 1)"
+    return subprocess.run([sys.executable, "-c", code], cwd=refresher.ROOT_DIR).returncode == 0
+
+
+def test_second_instance_is_blocked_while_the_lock_is_held(tmp_path):
+    path = str(tmp_path / "refresher.lock")
+    lock = acquire_lock(path)
+    assert lock is not None
+    assert not second_instance_gets_lock(path)
+    lock.close()
+    assert second_instance_gets_lock(path)
+
+
+class FakeIngestor:
+    def __init__(self):
+        self.polls = self.flushes = 0
+
+    def poll_once(self):
+        self.polls += 1
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_once_flushes_the_spot_prices_on_exit(tmp_path, monkeypatch):
+    ingestor = FakeIngestor()
+
+    def job():
+        refresher._spot_ingestor = ingestor
+        ingestor.poll_once()
+    monkeypatch.setattr(refresher, "_spot_ingestor", None)
+    monkeypatch.setitem(refresher.JOBS, "spot_prices", ("* * * * *", job, False))
+    monkeypatch.setattr(refresher, "acquire_lock", lambda: acquire_lock(str(tmp_path / "refresher.lock")))
+    monkeypatch.setattr(refresher, "publish_datasets", lambda datasets: None)
+    assert refresher.main(["--once", "--only", "spot_prices"]) == 0
+    assert (ingestor.polls, ingestor.flushes) == (1, 1)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import RollingStats, RollingWindow, rolling_stats, stat_column, update_rolling_stats
+
+
+def random_walk(n, seed=0, level=1e12):
+    rng = np.random.default_rng(seed)
+    return level * np.exp(rng.normal(0, 0.03, n).cumsum())
+
+
+def expected_stats(values, window):
+    series = pd.Series(values)
+    changes = (series / series.shift() - 1) * 100
+    return {
+        "MA": series.rolling(window).mean().to_numpy(),
+        "Volatility": changes.rolling(window).std().to_numpy(),
+        "Drawdown": ((series / series.rolling(window).max() - 1) * 100).to_numpy(),
+    }
+
+
+@pytest.mark.parametrize("windows", [(7, 30, 90), (1, 2)])
+def test_rolling_stats_match_pandas_rolling(windows):
+    # Long enough for many fsum resyncs of every window
+    values = random_walk(2000)
+    stats = pd.DataFrame(rolling_stats(values, windows), columns=RollingStats(windows).columns())
+    for window in windows:
+        for stat, expected in expected_stats(values, window).items():
+            np.testing.assert_allclose(stats[stat_column(stat, window)], expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_hourly_windows_span_days():
+    values = random_walk(24 * 10)
+    stats = pd.DataFrame(rolling_stats(values, (1, 7), bucket="hourly"), columns=RollingStats((1, 7)).columns())
+    for window in (1, 7):
+        for stat, expected in expected_stats(values, window * 24).items():
+            np.testing.assert_allclose(stats[stat_column(stat, window)], expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_rolling_window_resync_removes_drift():
+    window = RollingWindow(3)
+    # Adding and dropping large values loses the small ones without a resync
+    for value in [1e16, 1.0, 1.0, 1.0, 2.0, 3.0]:
+        window.push(value)
+    assert window.mean() == 2.0
+    assert window.std() == pytest.approx(1.0)
+    assert window.max() == 3.0
+
+
+def test_rolling_window_skips_missing_values():
+    window = RollingWindow(2)
+    for value in [1.0, float("nan"), 3.0]:
+        window.push(value)
+    assert window.full and window.mean() == 2.0
+
+
+def history(days, coin="Bitcoin", seed=0):
+    return pd.DataFrame({
+        "Timestamp": pd.date_range("2023-01-01", periods=days),
+        "Coin": coin,
+        "Market Cap (USD)": random_walk(days, seed),
+    })
+
+
+def test_update_rolling_stats_matches_a_full_recompute():
+    full_df = pd.concat([history(300), history(300, "Ethereum", seed=1)], ignore_index=True)
+    expected = update_rolling_stats(full_df)
+
+    # First run up to day 200 with an intraday point on day 200, which the
+    # next run replaces with the day's final value
+    first = full_df[full_df["Timestamp"] < "2023-07-20"]
+    intraday = first.groupby("Coin").tail(1).assign(Timestamp=pd.Timestamp("2023-07-20 13:00"), **{"Market Cap (USD)": 1.0})
+    existing = update_rolling_stats(pd.concat([first, intraday], ignore_index=True))
+    assert existing.groupby("Coin")["Timestamp"].max().tolist() == [pd.Timestamp("2023-07-20")] * 2
+
+    recent = full_df[full_df["Timestamp"] >= "2023-03-01"]
+    updated = update_rolling_stats(recent, existing)
+    pd.testing.assert_frame_equal(updated, expected, rtol=1e-9)
@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+
+from coingecko import CoinGeckoClient, TokenBucket
+from mock_coingecko import MockCoinGecko
+from spot_prices import BITCOIN_NAME, TICKS_SNAPSHOT, SpotPriceIngestor, batch_ids, bitcoin_store, read_spot_ticks
+
+
+def test_batch_ids_keeps_urls_under_the_limit():
+    ids = [f"coin-{i}" for i in range(500)]
+    batches = batch_ids(ids, max_length=200)
+    assert [coin_id for batch in batches for coin_id in batch] == ids
+    assert all(len("%2C".join(batch)) <= 200 for batch in batches)
+
+
+def test_flush_writes_the_snapshot_and_the_daily_close_only(tmp_path):
+    with MockCoinGecko(coins=10) as server:
+        client = CoinGeckoClient(base_url=server.url, bucket=TokenBucket(rate=1000, capacity=1000), cache_dir=None)
+        coins = {"bitcoin": BITCOIN_NAME, "ethereum": "Ethereum", "coin-7": "Coin 7"}
+        ingestor = SpotPriceIngestor(coins, root=str(tmp_path), client=client, capacity=3, flush_every=2)
+        for _ in range(4):
+            assert ingestor.poll_once() == 3
+
+    ticks = read_spot_ticks(str(tmp_path))
+    assert sorted(ticks["Coin"].unique()) == ["Bitcoin", "Coin 7", "Ethereum"]
+    assert ticks.groupby("Coin").size().max() == 3
+    # Ticks are only kept in the snapshot: nothing else is written per tick
+    assert sorted(os.listdir(tmp_path)) == sorted([TICKS_SNAPSHOT, "bitcoin_market_cap_history"])
+
+    history = bitcoin_store(str(tmp_path)).read()
+    assert len(history) == 1
+    assert history["Timestamp"].iloc[0] == ticks["Timestamp"].max().floor("D")
+    last_bitcoin = ticks[ticks["Coin"] == BITCOIN_NAME].iloc[-1]
+    assert history["Market Cap (USD)"].iloc[0] == last_bitcoin["Market Cap (USD)"]
+
+
+def test_restarted_ingestor_restores_the_snapshot(tmp_path):
+    ticks = pd.DataFrame({
+        "Timestamp": pd.date_range("2024-01-01", periods=5, freq="min"),
+        "Coin": BITCOIN_NAME,
+        "Price (USD)": [1.0, 2.0, 3.0, 4.0, 5.0],
+        "Market Cap (USD)": [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+    ticks.to_parquet(tmp_path / TICKS_SNAPSHOT, index=False)
+    ingestor = SpotPriceIngestor({"bitcoin": BITCOIN_NAME}, root=str(tmp_path), capacity=3)
+    restored = ingestor.frame()
+    assert restored["Price (USD)"].tolist() == [3.0, 4.0, 5.0]
+    # Restored ticks were flushed by the previous process
+    assert ingestor.frame(since=ingestor.flushed_at).empty
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_loader
+from partitioned_store import wide_to_long
+from storage import BACKENDS, convert, dataset_path, find_dataset, read_dataset, read_table, write_dataset, write_table
+
+
+def wide():
+    return pd.DataFrame({
+        "Timestamp": pd.date_range("2024-01-01", periods=3, freq="D"),
+        "Bitcoin": [1.0, 2.0, 3.0],
+        "Ethereum": [10.0, None, 30.0],
+    })
+
+
+def long():
+    return pd.DataFrame({
+        "Timestamp": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-01"]),
+        "Market Cap (USD)": [1.0, 2.0, 10.0],
+        "Coin": ["Bitcoin", "Bitcoin", "Ethereum"],
+    })
+
+
+@pytest.mark.parametrize("fmt", sorted(BACKENDS))
+def test_every_backend_round_trips_a_table(tmp_path, fmt):
+    path = str(tmp_path / ("table" + BACKENDS[fmt].extension))
+    write_table(wide(), path)
+    pd.testing.assert_frame_equal(read_table(path), wide(), check_dtype=False)
+    assert read_table(path, columns=["Timestamp", "Bitcoin"]).columns.tolist() == ["Timestamp", "Bitcoin"]
+    assert os.listdir(tmp_path) == [os.path.basename(path)]  # no temporary file left behind
+
+
+def test_datasets_are_found_by_format_preference(tmp_path):
+    name = str(tmp_path / "history")
+    assert find_dataset(name) is None and read_dataset(name) is None
+    write_table(long(), dataset_path(name, "csv"))
+    assert find_dataset(name) == dataset_path(name, "csv")
+    write_dataset(long(), name, exports=["xlsx"])
+    assert find_dataset(name) == dataset_path(name, "parquet")
+    assert os.path.exists(dataset_path(name, "xlsx"))
+
+
+@pytest.mark.parametrize("source, fmt", [(wide, "xlsx"), (long, "csv"), (long, "xlsx")])
+def test_convert_keeps_wide_and_long_files_readable(tmp_path, source, fmt):
+    name = str(tmp_path / "crypto_market_cap_history")
+    write_table(source(), dataset_path(name, fmt))
+    assert convert([dataset_path(name, fmt)]) == [dataset_path(name, "parquet")]
+    pd.testing.assert_frame_equal(read_dataset(name), source(), check_dtype=False)
+
+    # The history loader (and the fetcher's first-run import) take either layout
+    market_cap_df = data_loader.read_market_cap_long(name)
+    expected = wide_to_long(source())
+    assert sorted(zip(market_cap_df["Coin"], market_cap_df["Market Cap (USD)"])) == sorted(zip(expected["Coin"], expected["Market Cap (USD)"]))
+    assert len(market_cap_df) == (5 if source is wide else 3)  # the missing Ethereum point is dropped
+
+
+def test_convert_rejects_two_sources_of_the_same_dataset(tmp_path):
+    name = str(tmp_path / "history")
+    write_table(wide(), dataset_path(name, "xlsx"))
+    write_table(long(), dataset_path(name, "csv"))
+    with pytest.raises(ValueError, match="would both be converted to"):
+        convert([dataset_path(name, "xlsx"), dataset_path(name, "csv")])
+    assert find_dataset(name) == dataset_path(name, "xlsx")  # nothing was written
+    assert convert([dataset_path(name, "csv")], fmt="feather") == [dataset_path(name, "feather")]
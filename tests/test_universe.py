@@ -0,0 +1,69 @@
+import pytest
+
+from coingecko import CoinGeckoClient, TokenBucket
+from mock_coingecko import MockCoinGecko, coin_at
+from universe import discover_universe
+
+
+# Mock whose ranking shifts between page requests: every page after the
+# first starts with the last coin of the previous page
+class ShiftingMockCoinGecko(MockCoinGecko):
+    def respond(self, path, query):
+        if path.endswith("/coins/markets") and int(query.get("page", ["1"])[0]) > 1:
+            query = dict(query, page=[str(int(query["page"][0]) - 1)])
+            coins = super().respond(path, query)
+            return coins[-1:] + super().respond(path, dict(query, page=[str(int(query["page"][0]) + 1)]))[:-1]
+        return super().respond(path, query)
+
+
+def client_for(mock):
+    return CoinGeckoClient(base_url=mock.url, bucket=TokenBucket(rate=1000, capacity=1000), cache_dir=None)
+
+
+@pytest.fixture
+def server():
+    with MockCoinGecko(coins=1000) as mock:
+        yield mock
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "universe.json")
+
+
+def test_pages_above_250_coins_skip_the_excluded_ones_in_rank_order(server, cache_path):
+    exclude = {"tether", "coin-10", "coin-260"}
+    coins = discover_universe(300, exclude=exclude, client=client_for(server), cache_path=cache_path)
+    expected = [coin_at(i)[0] for i in range(1000) if coin_at(i)[0] not in exclude][:300]
+    assert [coin["id"] for coin in coins] == expected
+    assert [coin["market_cap_rank"] for coin in coins] == sorted(coin["market_cap_rank"] for coin in coins)
+    assert set(coins[0]) == {"id", "name", "symbol", "market_cap", "market_cap_rank"}
+
+
+def test_second_call_is_served_from_the_cache(server, cache_path):
+    client = client_for(server)
+    first = discover_universe(300, exclude={"tether"}, client=client, cache_path=cache_path)
+    requests = server.requests
+    assert discover_universe(300, exclude={"tether"}, client=client, cache_path=cache_path) == first
+    assert server.requests == requests
+
+    # Another size or exclusion set, or an expired entry, is fetched again
+    discover_universe(20, exclude={"tether"}, client=client, cache_path=cache_path)
+    assert server.requests == requests + 1
+    assert discover_universe(300, exclude={"tether"}, client=client, cache_path=cache_path, ttl=0) == first
+    assert server.requests == requests + 3
+
+
+def test_a_small_universe_is_returned_whole(cache_path):
+    with MockCoinGecko(coins=120) as mock:
+        coins = discover_universe(300, exclude={"bitcoin"}, client=client_for(mock), cache_path=cache_path)
+    assert len(coins) == 119 and coins[0]["id"] == "ethereum"
+
+
+def test_coins_seen_on_two_pages_are_kept_once_and_the_list_filled_up():
+    with ShiftingMockCoinGecko(coins=1000) as mock:
+        coins = discover_universe(500, client=client_for(mock), cache_path=None)
+        assert mock.requests == 3  # the two planned pages left it one coin short
+    ids = [coin["id"] for coin in coins]
+    assert len(ids) == len(set(ids)) == 500
+    assert ids == [coin_at(i)[0] for i in range(500)]
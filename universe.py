@@ -0,0 +1,91 @@
+import math
+import os
+import time
+
+from coingecko import COIN_MARKETS_ENDPOINT, decode_json, fetch_concurrently, get_client
+from storage import write_json
+
+# Largest page /coins/markets returns
+MAX_PER_PAGE = 250
+
+# File caching the ranked universes, shared by the history and spot-price
+# jobs, and how long (seconds) a cached universe is reused
+UNIVERSE_CACHE = os.environ.get(
+    "RACECAP_UNIVERSE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".universe_cache.json")
+)
+UNIVERSE_TTL = float(os.environ.get("RACECAP_UNIVERSE_TTL", "3600"))
+
+# Fields kept for every coin of a universe
+COIN_FIELDS = ["id", "name", "symbol", "market_cap", "market_cap_rank"]
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            return decode_json(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+# One page of /coins/markets, ranked by market cap
+def fetch_markets_page(page, per_page=MAX_PER_PAGE, category=None, client=None):
+    client = client or get_client()
+    params = {
+        "vs_currency": "usd",
+        "order": "market_cap_desc",
+        "per_page": per_page,
+        "page": page,
+        "sparkline": "false"
+    }
+    if category:
+        params["category"] = category
+    return client.get_json(COIN_MARKETS_ENDPOINT, params=params)
+
+
+# Coins of the fetched pages in page order. Rankings can shift between page
+# requests, so a coin that moved to the next page is kept once.
+def _ranked_coins(pages):
+    coins, seen = [], set()
+    for page in sorted(pages):
+        for coin in pages[page]:
+            if coin["id"] not in seen:
+                seen.add(coin["id"])
+                coins.append(coin)
+    return coins
+
+
+# The top n coins by market cap (dicts with COIN_FIELDS, in rank order),
+# skipping the excluded coin ids and optionally limited to a CoinGecko
+# category. Pages are requested concurrently and filtered as they arrive;
+# more pages are requested only if exclusions (or coins seen on two pages)
+# left the universe short. The result is cached for ttl seconds.
+def discover_universe(n, exclude=(), category=None, client=None, ttl=UNIVERSE_TTL, cache_path=UNIVERSE_CACHE):
+    exclude = set(exclude)
+    key = f"{n}|{','.join(sorted(exclude))}|{category or ''}"
+    cache = _load_cache(cache_path) if cache_path else {}
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry["fetched_at"] < ttl:
+        return entry["coins"]
+
+    per_page = min(MAX_PER_PAGE, n + len(exclude))
+    pages = {}
+    next_page, exhausted = 1, False
+    while not exhausted and len(_ranked_coins(pages)) < n:
+        needed = n - len(_ranked_coins(pages))
+        batch = range(next_page, next_page + max(1, math.ceil((needed + len(exclude)) / per_page)))
+        next_page = batch[-1] + 1
+        for page, data, error in fetch_concurrently(lambda page: fetch_markets_page(page, per_page, category, client), batch):
+            if error is not None:
+                raise error
+            if len(data) < per_page:
+                exhausted = True
+            pages[page] = [
+                {field: coin.get(field) for field in COIN_FIELDS}
+                for coin in data if coin["id"] not in exclude
+            ]
+    coins = _ranked_coins(pages)[:n]
+    if cache_path:
+        cache[key] = {"fetched_at": time.time(), "coins": coins}
+        write_json(cache, cache_path)
+    return coins
@@ -1,100 +1,104 @@
+import os
+
 import streamlit as st
-import requests
 import pandas as pd
-from datetime import datetime
 import plotly.graph_objects as go
-import time
-import os
+
+from data_loader import cached, file_signature, invalidate, load_spot_ticks
+from downsampling import DEFAULT_POINTS, downsample_frame
+from instrumentation import show_debug_panel, start_run, timed
+from spot_prices import BITCOIN_CSV, BITCOIN_NAME, TICKS_SNAPSHOT, bitcoin_store
+from storage import read_table
 
 # Set up Streamlit page configuration
 st.set_page_config(page_title="Bitcoin Market Cap Dashboard", layout="wide")
 
-# File path for storing data
-csv_file = "bitcoin_market_cap_365_days.csv"
-
-# Function to fetch historical data (last 365 days) and save to CSV
-def fetch_historical_data():
-    url = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"
-    parameters = {
-        "vs_currency": "usd",
-        "days": "365",
-        "interval": "daily"
-    }
-    response = requests.get(url, params=parameters)
-    data = response.json()
-
-    if 'market_caps' in data:
-        timestamps = [entry[0] for entry in data['market_caps']]
-        market_caps = [entry[1] for entry in data['market_caps']]
-        df = pd.DataFrame({
-            "Timestamp": pd.to_datetime(timestamps, unit='ms'),
-            "Market Cap (USD)": market_caps
-        })
-        df.to_csv(csv_file, index=False)
-        return df
-    else:
-        st.error("Failed to fetch historical data.")
-        return pd.DataFrame(columns=["Timestamp", "Market Cap (USD)"])
-
-# Function to fetch the latest market cap and add to DataFrame
-def fetch_latest_market_cap():
-    url = "https://api.coingecko.com/api/v3/simple/price"
-    parameters = {
-        "ids": "bitcoin",
-        "vs_currencies": "usd",
-        "include_market_cap": "true"
-    }
-    response = requests.get(url, params=parameters)
-    data = response.json()
-    if "bitcoin" in data and "usd_market_cap" in data["bitcoin"]:
-        market_cap = data["bitcoin"]["usd_market_cap"]
-        timestamp = datetime.now()
-        return {"Timestamp": timestamp, "Market Cap (USD)": market_cap}
-    return None
-
-# Load or fetch historical data
-if os.path.exists(csv_file):
-    df = pd.read_csv(csv_file)
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-else:
-    df = fetch_historical_data()
+# Timings of this rerun, shown in the debug panel (open the page with ?debug=1)
+run = start_run("web_dash")
+
+# Partitioned store holding the daily history. Live ticks are polled by the
+# refresher process (refresher.py, job "spot_prices") and flushed to a
+# snapshot file, so rendering this page never waits on the CoinGecko API.
+# Until a refresher has written the store on this filesystem (a Heroku web
+# dyno never sees the clock dyno's files), the committed CSV history is
+# shown instead.
+store = bitcoin_store()
+
+# How often the cached history is checked for new ticks (seconds)
+HISTORY_CHECK_TTL = 60
+
+# Function to load the stored daily history of Bitcoin followed by the
+# intraday ticks newer than its last point
+def load_history():
+    history_df = store.read(coins=[BITCOIN_NAME]) if store.exists() else read_table(BITCOIN_CSV)
+    history_df = history_df[["Timestamp", "Market Cap (USD)"]]
+    ticks_df = load_spot_ticks()
+    ticks_df = ticks_df[(ticks_df["Coin"] == BITCOIN_NAME) & (ticks_df["Timestamp"] > history_df["Timestamp"].max())]
+    ticks_df = ticks_df.dropna(subset=["Market Cap (USD)"])
+    return pd.concat([history_df, ticks_df[history_df.columns]], ignore_index=True)
 
 # Streamlit header and description
 st.title("Real-Time Bitcoin Market Cap Dashboard")
 st.write("This dashboard displays the historical and real-time market cap of Bitcoin.")
 
-# Update data every minute (simulating real-time updates)
-latest_data = fetch_latest_market_cap()
-if latest_data:
-    df = df.append(latest_data, ignore_index=True)
-    df.to_csv(csv_file, index=False)
+# The refresher seeds the store (from the CSV history) when it starts; this
+# page only reads the store or the CSV
+if not store.exists() and not os.path.exists(BITCOIN_CSV):
+    st.warning("No data available yet. Start the refresher (python refresher.py) to collect it.")
+    st.stop()
+
+# Load the history from the shared cache in data_loader.py; it is re-read
+# only after the store, the CSV or the tick snapshot has changed
+signature = lambda: (file_signature(store.manifest_path), file_signature(BITCOIN_CSV), file_signature(TICKS_SNAPSHOT))
+with timed("load_data"):
+    df = cached("bitcoin_history", load_history, signature, ttl=HISTORY_CHECK_TTL)
+latest_data = df.iloc[-1]
 
 # Display the latest market cap
 st.subheader("Latest Bitcoin Market Cap (USD)")
 st.metric(label="Market Cap", value=f"${latest_data['Market Cap (USD)']:,}")
 
+# Date range to display. The series grows with every tick, so it is
+# downsampled to about one point per pixel within this range; zooming in on
+# a shorter range brings back full resolution.
+first_date, last_date = df['Timestamp'].min().date(), df['Timestamp'].max().date()
+if first_date < last_date:
+    zoom_start, zoom_end = st.slider(
+        "Zoom to Dates",
+        min_value=first_date,
+        max_value=last_date,
+        value=(first_date, last_date),
+        format="YYYY-MM-DD"
+    )
+    with timed("filter"):
+        df = df[(df['Timestamp'] >= pd.Timestamp(zoom_start)) & (df['Timestamp'] < pd.Timestamp(zoom_end) + pd.Timedelta(days=1))]
+with timed("downsample"):
+    plot_df = downsample_frame(df.sort_values('Timestamp'), 'Timestamp', 'Market Cap (USD)', points=DEFAULT_POINTS)
+
 # Plot the data using Plotly
-fig = go.Figure()
-fig.add_trace(go.Scatter(
-    x=df['Timestamp'],
-    y=df['Market Cap (USD)'],
-    mode='lines+markers',
-    name='Bitcoin Market Cap (USD)'
-))
-
-fig.update_layout(
-    title="Bitcoin Market Cap Over Time",
-    xaxis_title="Time",
-    yaxis_title="Market Cap (USD)",
-    template="plotly_white"
-)
-
-st.plotly_chart(fig, use_container_width=True)
-
-# Add a refresh button to update the data manually
+with timed("figure"):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=plot_df['Timestamp'],
+        y=plot_df['Market Cap (USD)'],
+        mode='lines+markers',
+        name='Bitcoin Market Cap (USD)'
+    ))
+
+    fig.update_layout(
+        title="Bitcoin Market Cap Over Time",
+        xaxis_title="Time",
+        yaxis_title="Market Cap (USD)",
+        template="plotly_white"
+    )
+
+with timed("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=True)
+
+# Log this rerun's timings (and show them when debugging)
+show_debug_panel(run)
+
+# Add a refresh button to reload the latest stored data
 if st.button("Refresh Data"):
-    latest_data = fetch_latest_market_cap()
-    if latest_data:
-        df = df.append(latest_data, ignore_index=True)
-        df.to_csv(csv_file, index=False)
-        st.experimental_rerun()
+    invalidate("bitcoin_history")
+    st.experimental_rerun()